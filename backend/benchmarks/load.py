@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+import seed_data
+from benchmarks.stats import Result
+
+
+@dataclass(frozen=True)
+class Call:
+    method: str
+    url: str
+    params: Dict = field(default_factory=dict)
+    json: Optional[Dict] = None
+    expected_status: int = 200
+
+
+async def drive(client: httpx.AsyncClient, name: str, calls: List[Call], concurrency: int) -> Result:
+    """Issue ``calls`` in order from ``concurrency`` workers; latency is per call"""
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(calls)
+
+    async def worker():
+        nonlocal errors
+        for call in pending:
+            started = time.perf_counter()
+            response = await client.request(call.method, call.url, params=call.params, json=call.json)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != call.expected_status:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return Result.from_latencies(name, "load", latencies, time.perf_counter() - started, len(calls), errors)
+
+
+def catalog_browsing(rng: random.Random, products: List[Dict], categories: List[str], count: int) -> List[Call]:
+    """Visitors opening the catalog, filtering, searching and viewing products"""
+    words = sorted({word for product in products for word in product["name"].split() if len(word) > 3})
+    calls = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.25:
+            calls.append(Call("GET", "/api/products"))
+        elif roll < 0.5:
+            params = {"category": rng.choice(categories), "sort": rng.choice(["price-asc", "price-desc", "name"])}
+            calls.append(Call("GET", "/api/products", params={**params, "limit": 20}))
+        elif roll < 0.65:
+            calls.append(Call("GET", "/api/products/search", params={"q": rng.choice(words)[:rng.randint(3, 8)]}))
+        elif roll < 0.7:
+            calls.append(Call("GET", "/api/products/categories"))
+        else:
+            calls.append(Call("GET", f"/api/products/{rng.choice(products)['id']}"))
+    return calls
+
+
+def cart_save_burst(rng: random.Random, products: List[Dict], sessions: int, edits: int) -> List[Call]:
+    """Many sessions saving and editing carts at once"""
+    session_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(sessions)]
+    calls = []
+    for session_id in session_ids:
+        items = [
+            {"product_id": product["id"], "quantity": rng.randint(1, 3)}
+            for product in rng.sample(products, rng.randint(1, 5))
+        ]
+        calls.append(Call("POST", "/api/cart/save", json={"session_id": session_id, "items": items}))
+    for _ in range(edits):
+        session_id = rng.choice(session_ids)
+        calls.append(Call(
+            "POST", f"/api/cart/{session_id}/items", json={"product_id": rng.choice(products)["id"], "quantity": 1}
+        ))
+    return calls
+
+
+def checkout_qr(rng: random.Random, banks: List[str], tiers: List[int], count: int) -> List[Call]:
+    """Checkout pages loading every bank's QR code, then the chosen bank's"""
+    calls = []
+    for _ in range(count):
+        amount = rng.choice(tiers)
+        calls.append(Call("GET", f"/api/qr-codes/{amount}"))
+        calls.append(Call("GET", f"/api/qr-code/{rng.choice(banks)}/{amount}"))
+    return calls
+
+
+async def run(app, seed: int, scale: int, concurrency: int) -> List[Result]:
+    rng = random.Random(seed)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            products = (await client.get("/api/products")).json()
+            categories = (await client.get("/api/products/categories")).json()["categories"]
+            qr_table = seed_data.qr_table()
+
+            scenarios = [
+                ("catalog_browsing", catalog_browsing(rng, products, categories, 200 * scale)),
+                ("cart_save_burst", cart_save_burst(rng, products, 50 * scale, 150 * scale)),
+                ("checkout_qr", checkout_qr(rng, list(qr_table.banks), list(qr_table.tiers), 100 * scale)),
+            ]
+            results = []
+            for name, calls in scenarios:
+                await drive(client, name, calls[: max(1, len(calls) // 10)], concurrency)  # warm-up
+                results.append(await drive(client, name, calls, concurrency))
+            return results
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+from typing import Callable, List
+
+from pydantic import TypeAdapter
+
+import seed_data
+from benchmarks.stats import Result
+from catalog import CatalogCache
+from http_cache import dumps_json
+
+SAMPLES = 200
+
+
+def measure(name: str, fn: Callable[[], object], batch: int, samples: int = SAMPLES) -> Result:
+    """Times ``samples`` batches of ``batch`` calls; latencies are per call"""
+    for _ in range(batch):
+        fn()  # warm up caches and lazy imports
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(samples):
+        batch_started = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        latencies.append((time.perf_counter() - batch_started) / batch)
+    return Result.from_latencies(name, "micro", latencies, time.perf_counter() - started, samples * batch)
+
+
+def run(server) -> List[Result]:
+    qr_table = seed_data.qr_table()
+    banks, tiers = qr_table.banks, qr_table.tiers
+    products_data = seed_data.products()
+    products = [server.Product(**data) for data in products_data]
+    documents = [product.model_dump() for product in products]
+
+    def qr_lookups():
+        for bank in banks:
+            for amount in tiers:
+                server.get_qr_code(bank, amount)
+
+    def validate_products():
+        for document in documents:
+            server.Product(**document)
+
+    def dump_products():
+        json.dumps([product.model_dump(mode="json") for product in products], ensure_ascii=False)
+
+    def dump_products_json():
+        for product in products:
+            product.model_dump_json()
+
+    # Full-catalog response body, as built per request before and after the
+    # in-memory snapshot: validate documents, re-validate against
+    # response_model, encode with the stdlib vs. slice pre-dumped dicts and
+    # encode with orjson
+    response_model = TypeAdapter(List[server.Product])
+
+    def legacy_catalog_response():
+        models = [server.Product(**document) for document in documents]
+        value = response_model.validate_python([model.model_dump(by_alias=True) for model in models])
+        content = response_model.dump_python(value, mode="json")
+        json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    cache = CatalogCache(None, server.Product)
+    cache.install(documents)
+    snapshot = asyncio.run(cache.current())
+
+    def snapshot_catalog_response():
+        items, _, _ = snapshot.query(sort="price-asc")
+        dumps_json(items)
+
+    lookups = len(banks) * len(tiers)
+    return [
+        scale(measure("get_qr_code", qr_lookups, batch=20), lookups),
+        scale(measure("product_validate", validate_products, batch=5), len(documents)),
+        scale(measure("product_serialize_dict_json", dump_products, batch=5), len(products)),
+        scale(measure("product_serialize_model_dump_json", dump_products_json, batch=5), len(products)),
+        measure("catalog_response_legacy_pipeline", legacy_catalog_response, batch=2),
+        measure("catalog_response_snapshot_orjson", snapshot_catalog_response, batch=10),
+    ]
+
+
+def scale(result: Result, per_call: int) -> Result:
+    """Report a loop over ``per_call`` items as per-item throughput and latency"""
+    return Result(
+        name=result.name,
+        kind=result.kind,
+        count=result.count * per_call,
+        errors=result.errors,
+        throughput=result.throughput * per_call,
+        p50_ms=result.p50_ms / per_call,
+        p95_ms=result.p95_ms / per_call,
+        p99_ms=result.p99_ms / per_call,
+    )
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+from benchmarks.stats import Result
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Imports the app and runs its startup, reporting seconds since the script began
+READY_SCRIPT = """
+import time
+started = time.perf_counter()
+import asyncio, os
+if not os.environ.get("BENCHMARK_MONGO_URL"):
+    import mongomock_motor, motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+import server
+
+async def main():
+    async with server.app.router.lifespan_context(server.app):
+        print(time.perf_counter() - started)
+
+asyncio.run(main())
+"""
+
+
+def environment(mongo_url: str) -> dict:
+    env = dict(os.environ, DB_NAME=os.environ.get('BENCHMARK_DB_NAME', 'benchmarks'), BENCHMARK_MONGO_URL=mongo_url)
+    env['MONGO_URL'] = mongo_url or 'mongodb://stand-in'
+    if not mongo_url:
+        env['MONGO_MIN_POOL_SIZE'] = '0'
+    return env
+
+
+def import_times(stderr: str) -> List[Tuple[str, float]]:
+    """Modules imported at the top level or directly by one, with cumulative
+    seconds, from ``-X importtime`` output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1 and cumulative.strip().isdigit():
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return modules
+
+
+def measure_import(mongo_url: str, runs: int) -> Tuple[Result, List[Tuple[str, float]]]:
+    """Cold ``import server`` in fresh interpreters; also returns the heaviest imports of the last run"""
+    seconds, modules = [], []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import server"],
+            cwd=BACKEND_DIR, env=environment(mongo_url), capture_output=True, text=True, check=True,
+        )
+        modules = import_times(completed.stderr)
+        seconds.append(dict(modules)["server"])
+    return Result.from_latencies("startup_import_server", "startup", seconds, sum(seconds), runs), modules
+
+
+def measure_ready(mongo_url: str, runs: int) -> Result:
+    """Seconds from interpreter start to the app having run its startup"""
+    seconds = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", READY_SCRIPT],
+            cwd=BACKEND_DIR, env=environment(mongo_url), capture_output=True, text=True, check=True,
+        )
+        seconds.append(float(completed.stdout.strip().splitlines()[-1]))
+    return Result.from_latencies("startup_ready", "startup", seconds, sum(seconds), runs)
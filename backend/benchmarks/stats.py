@@ -0,0 +1,71 @@
+import json
+import math
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class Result:
+    """Throughput and latency percentiles of one benchmark"""
+    name: str
+    kind: str
+    count: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @classmethod
+    def from_latencies(cls, name: str, kind: str, latencies: List[float], elapsed: float, count: int, errors: int = 0) -> "Result":
+        latencies = sorted(latencies)
+        return cls(
+            name=name,
+            kind=kind,
+            count=count,
+            errors=errors,
+            throughput=count / elapsed if elapsed else 0.0,
+            p50_ms=percentile(latencies, 0.50) * 1000,
+            p95_ms=percentile(latencies, 0.95) * 1000,
+            p99_ms=percentile(latencies, 0.99) * 1000,
+        )
+
+
+def write_results(path: Path, results: List[Result], meta: Dict):
+    data = {"meta": meta, "results": {result.name: asdict(result) for result in results}}
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n")
+
+
+def load_results(path: Path) -> Dict[str, Dict]:
+    return json.loads(path.read_text())["results"]
+
+
+def regressions(results: List[Result], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Benchmarks whose throughput dropped, or p95 latency grew, by more than ``threshold``.
+
+    p95 rather than p99: with a few thousand calls per scenario the tail
+    beyond it is a handful of samples and too noisy to gate on.
+    """
+    found = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous is None:
+            continue
+        if result.errors > previous.get("errors", 0):
+            found.append(f"{result.name}: {result.errors} errors (baseline {previous.get('errors', 0)})")
+        if result.throughput < previous["throughput"] * (1 - threshold):
+            found.append(
+                f"{result.name}: throughput {result.throughput:.0f}/s vs baseline {previous['throughput']:.0f}/s"
+            )
+        if result.p95_ms > previous["p95_ms"] * (1 + threshold):
+            found.append(f"{result.name}: p95 {result.p95_ms:.4f} ms vs baseline {previous['p95_ms']:.4f} ms")
+    return found
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks and in-process load scenarios for the API, compared with a
+stored baseline.
+
+Runs from backend/ against mongomock-motor by default, or against a real
+(e.g. throwaway) mongod with --mongo-url:
+
+    python -m benchmarks.suite                       # compare with baseline.json
+    python -m benchmarks.suite --update-baseline     # record a new baseline
+    python -m benchmarks.suite --mongo-url mongodb://localhost:27017 --output results.json
+
+Exits with status 1 when a benchmark's throughput drops, or its p95
+latency grows, by more than --threshold relative to the baseline, or when
+cold startup (``import server``, and import through app startup) takes
+longer than --import-budget-ms / --ready-budget-ms. Baselines are
+machine-specific: record and compare them on the same host.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import platform
+import sys
+from pathlib import Path
+
+from benchmarks import load, micro, startup
+from benchmarks.stats import load_results, regressions, write_results
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+
+def import_server(mongo_url: str):
+    """Import the app against ``mongo_url``, or mongomock-motor when it is empty"""
+    os.environ['DB_NAME'] = os.environ.get('BENCHMARK_DB_NAME', 'benchmarks')
+    if mongo_url:
+        os.environ['MONGO_URL'] = mongo_url
+    else:
+        import mongomock_motor
+        import motor.motor_asyncio
+
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+        os.environ['MONGO_URL'] = 'mongodb://stand-in'
+        os.environ['MONGO_MIN_POOL_SIZE'] = '0'  # there is no pool to warm
+    import server
+
+    logging.getLogger().setLevel(logging.WARNING)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="", help="MongoDB to run against (default: mongomock-motor)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", type=Path, help="also write this run's results here")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=int, default=5, help="multiplier for load scenario sizes")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1000, help="max median cold import of server")
+    parser.add_argument("--ready-budget-ms", type=float, default=1500, help="max median time until startup completes")
+    args = parser.parse_args()
+
+    results = []
+    heaviest = []
+    if not args.skip_startup:
+        # Fresh interpreters, before this one imports the app
+        import_result, modules = startup.measure_import(args.mongo_url, args.startup_runs)
+        results += [import_result, startup.measure_ready(args.mongo_url, args.startup_runs)]
+        heaviest = sorted(
+            (module for module in modules if module[0] != "server"), key=lambda module: module[1], reverse=True
+        )[:8]
+
+    server = import_server(args.mongo_url)
+    results += micro.run(server)
+    if not args.skip_load:
+        results += asyncio.run(load.run(server.app, args.seed, args.scale, args.concurrency))
+
+    print(f"{'benchmark':<36} {'ops/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for result in results:
+        print(
+            f"{result.name:<36} {result.throughput:>12.0f} {result.p50_ms:>9.4f} "
+            f"{result.p95_ms:>9.4f} {result.p99_ms:>9.4f} {result.errors:>7}"
+        )
+
+    if heaviest:
+        print("heaviest imports: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in heaviest))
+
+    budgets = {"startup_import_server": args.import_budget_ms, "startup_ready": args.ready_budget_ms}
+    over_budget = [
+        f"{result.name}: p50 {result.p50_ms:.0f} ms over the {budgets[result.name]:.0f} ms budget"
+        for result in results
+        if result.name in budgets and result.p50_ms > budgets[result.name]
+    ]
+    for line in over_budget:
+        print(f"OVER BUDGET {line}")
+
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "mongo": args.mongo_url or "mongomock-motor",
+        "seed": args.seed,
+        "scale": args.scale,
+        "concurrency": args.concurrency,
+    }
+    if args.output:
+        write_results(args.output, results, meta)
+    if args.update_baseline:
+        write_results(args.baseline, results, meta)
+        print(f"Baseline written to {args.baseline}")
+        return 1 if over_budget else 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; record one with --update-baseline")
+        return 1 if over_budget else 0
+
+    found = regressions(results, load_results(args.baseline), args.threshold)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    return 1 if found or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
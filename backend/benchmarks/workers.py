@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Requests/sec of the production launch (gunicorn.conf.py) with 1..N workers.
+
+Starts gunicorn once per worker count against the MongoDB from .env, drives
+a fixed mix of read endpoints with concurrent keep-alive clients and prints
+one line per run. Run it on the target host, from backend/:
+
+    python -m benchmarks.workers --max-workers 4 --duration 15 --concurrency 64
+
+The load generator shares the machine, so leave it a core: on an N-core host
+measure up to N-1 workers.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ENDPOINTS = (
+    "/api/products",
+    "/api/products?min_price=1000&max_price=20000&sort=price-asc&limit=20",
+    "/api/products/search?q=сайт",
+    "/api/products/categories",
+    "/api/qr-codes/1000",
+)
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "server:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+async def drive(base_url: str, duration: float, concurrency: int) -> tuple:
+    """Returns (completed requests, failed requests) over ``duration`` seconds"""
+    completed = failed = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        async def client_loop(offset: int):
+            nonlocal completed, failed
+            i = offset
+            while time.monotonic() < deadline:
+                try:
+                    response = await client.get(ENDPOINTS[i % len(ENDPOINTS)])
+                    if response.status_code == 200:
+                        completed += 1
+                    else:
+                        failed += 1
+                except httpx.TransportError:
+                    failed += 1
+                i += 1
+
+        await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    return completed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    baseline = None
+    print(f"{'workers':>7} {'req/s':>10} {'scaling':>8} {'errors':>7}")
+    for workers in range(1, args.max_workers + 1):
+        server = start_server(workers, args.port)
+        try:
+            asyncio.run(wait_ready(base_url))
+            asyncio.run(drive(base_url, args.warmup, args.concurrency))
+            completed, failed = asyncio.run(drive(base_url, args.duration, args.concurrency))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        rate = completed / args.duration
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>10.0f} {rate / baseline:>7.2f}x {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class CartVersionConflict(Exception):
+    """The client edited a cart version that is no longer current"""
+
+    def __init__(self, expected: int, current: int):
+        super().__init__(f"Expected cart version {expected}, current version is {current}")
+        self.expected = expected
+        self.current = current
+
+
+@dataclass
+class PendingCart:
+    """Changes to one cart accepted but not yet written to Mongo.
+
+    Either ``items`` holds a full replacement of the cart contents (later
+    deltas are folded into it), or the delta maps describe per-product
+    operations. A product id appears in at most one of the delta maps.
+
+    ``base`` is the stored version the changes were made against; the write
+    only applies while the stored cart is still at that version.
+    """
+    version: int
+    base: int = 0
+    since: float = field(default_factory=time.monotonic)
+    items: Optional[Dict[str, int]] = None
+    increments: Dict[str, int] = field(default_factory=dict)
+    quantities: Dict[str, int] = field(default_factory=dict)
+    removed: Set[str] = field(default_factory=set)
+
+    def replace(self, items: Dict[str, int]):
+        self.items = {product_id: quantity for product_id, quantity in items.items() if quantity > 0}
+        self.increments.clear()
+        self.quantities.clear()
+        self.removed.clear()
+
+    def add(self, product_id: str, quantity: int):
+        if self.items is not None:
+            self.set_quantity(product_id, self.items.get(product_id, 0) + quantity)
+        elif product_id in self.quantities:
+            self.set_quantity(product_id, self.quantities[product_id] + quantity)
+        elif product_id in self.removed:
+            self.set_quantity(product_id, quantity)
+        else:
+            self.increments[product_id] = self.increments.get(product_id, 0) + quantity
+
+    def set_quantity(self, product_id: str, quantity: int):
+        if quantity <= 0:
+            self.remove(product_id)
+        elif self.items is not None:
+            self.items[product_id] = quantity
+        else:
+            self.increments.pop(product_id, None)
+            self.removed.discard(product_id)
+            self.quantities[product_id] = quantity
+
+    def remove(self, product_id: str):
+        if self.items is not None:
+            self.items.pop(product_id, None)
+            return
+        self.increments.pop(product_id, None)
+        self.quantities.pop(product_id, None)
+        self.removed.add(product_id)
+
+    def merge(self, later: "PendingCart"):
+        """Fold in a change set accepted on top of this one"""
+        if later.items is not None:
+            self.replace(later.items)
+        else:
+            for product_id in later.removed:
+                self.remove(product_id)
+            for product_id, quantity in later.quantities.items():
+                self.set_quantity(product_id, quantity)
+            for product_id, quantity in later.increments.items():
+                self.add(product_id, quantity)
+        self.version = later.version
+
+    def operations(self, session_id: str, now: datetime) -> List[UpdateOne]:
+        """Bulk write operations applying this change set in one round trip.
+
+        The first operation moves the cart from ``base`` to ``version`` and
+        tags it with a fresh ``write_id``; the rest only match that tag, so
+        if another process moved the cart on first, nothing is written.
+        """
+        write_id = uuid.uuid4().hex
+        set_fields = {"updated_at": now, "version": self.version, "write_id": write_id}
+        on_insert = {"id": str(uuid.uuid4()), "session_id": session_id, "created_at": now}
+        if self.items is not None:
+            set_fields["items"] = [
+                {"product_id": product_id, "quantity": quantity} for product_id, quantity in self.items.items()
+            ]
+        else:
+            on_insert["items"] = []
+        if self.base:
+            base_selector = {"session_id": session_id, "version": self.base}
+        else:
+            # A new cart, or one stored before carts had versions
+            base_selector = {"session_id": session_id, "version": {"$in": [0, None]}}
+        operations = [UpdateOne(
+            base_selector, {"$set": set_fields, "$setOnInsert": on_insert}, upsert=not self.base
+        )]
+
+        selector = {"session_id": session_id, "write_id": write_id}
+
+        for product_id in self.removed:
+            operations.append(UpdateOne(selector, {"$pull": {"items": {"product_id": product_id}}}))
+        for updates, operator in ((self.quantities, "$set"), (self.increments, "$inc")):
+            for product_id, quantity in updates.items():
+                # Make sure the line exists, then update it through the positional operator
+                operations.append(UpdateOne(
+                    {**selector, "items.product_id": {"$ne": product_id}},
+                    {"$push": {"items": {"product_id": product_id, "quantity": 0}}},
+                ))
+                operations.append(UpdateOne(
+                    {**selector, "items.product_id": product_id},
+                    {operator: {"items.$.quantity": quantity}},
+                ))
+        if self.increments:
+            operations.append(UpdateOne(selector, {"$pull": {"items": {"quantity": {"$lte": 0}}}}))
+        return operations
+
+
+class CartWriteBuffer:
+    """Write-behind buffer that coalesces cart changes per session.
+
+    Changes are accepted immediately and merged into one pending change set
+    per session; a background task writes each set with a single
+    ``bulk_write`` once it is ``window`` seconds old. Every accepted change
+    bumps the cart version, and callers may pass the version they edited to
+    get a ``CartVersionConflict`` instead of overwriting a newer cart.
+
+    Versions are checked against this process's pending changes, and again
+    by the write itself, which only applies to the stored version the
+    changes were made against. A change set another process got ahead of
+    is dropped (counted in ``conflicts``) and the stored version is moved
+    past any number both processes handed out, so the clients' next edits
+    get a conflict and reload. A failed write is retried with any changes
+    accepted since.
+
+    Other processes only see a change once it is written, up to about
+    ``window`` seconds later; ``read`` waits for a version a client was
+    given by any process.
+    """
+
+    def __init__(self, collection, window: float = 0.3):
+        self._collection = collection
+        self._window = window
+        self._pending: Dict[str, PendingCart] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # Held while a session's changes are written, so a flush of one
+        # session never waits behind writes of others
+        self._write_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.conflicts = 0
+
+    @staticmethod
+    def _lock(locks: "weakref.WeakValueDictionary[str, asyncio.Lock]", session_id: str) -> asyncio.Lock:
+        lock = locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            locks[session_id] = lock
+        return lock
+
+    async def current_version(self, session_id: str) -> int:
+        """Latest accepted version, including changes not yet written"""
+        if session_id in self._pending:
+            return self._pending[session_id].version
+        if session_id in self._in_flight:
+            return self._in_flight[session_id]
+        cart = await self._collection.find_one({"session_id": session_id}, {"_id": 0, "version": 1})
+        return cart.get("version", 0) if cart else 0
+
+    async def apply(
+        self,
+        session_id: str,
+        change: Callable[[PendingCart], None],
+        expected_version: Optional[int] = None,
+    ) -> int:
+        """Accept ``change`` for ``session_id`` and return the new cart version"""
+        async with self._lock(self._session_locks, session_id):
+            current = await self.current_version(session_id)
+            if expected_version is not None and expected_version != current:
+                raise CartVersionConflict(expected_version, current)
+
+            pending = self._pending.get(session_id)
+            if pending is None:
+                pending = self._pending[session_id] = PendingCart(version=current, base=current)
+            change(pending)
+            pending.version = current + 1
+            return pending.version
+
+    async def flush_session(self, session_id: str):
+        """Write out pending changes for one session, e.g. before reading it"""
+        if session_id not in self._pending and session_id not in self._in_flight:
+            return
+        await self._flush_one(session_id)
+
+    async def flush(self, max_age: float = 0.0):
+        """Write out every pending change set at least ``max_age`` seconds old"""
+        async with self._flush_lock:
+            deadline = time.monotonic() - max_age
+            due = [session_id for session_id, pending in self._pending.items() if pending.since <= deadline]
+            if due:
+                await asyncio.gather(*(self._flush_one(session_id) for session_id in due))
+
+    async def _flush_one(self, session_id: str):
+        # Also waits for a write of the session already in flight
+        async with self._lock(self._write_locks, session_id):
+            pending = self._take(session_id)
+            if pending is not None:
+                await self._write(session_id, pending)
+
+    async def read(self, session_id: str, projection: Dict, min_version: Optional[int] = None) -> Optional[Dict]:
+        """Stored cart with this process's pending changes written first.
+
+        ``min_version`` is a version the client was given, possibly by another
+        process whose changes are still buffered there; the read waits up to
+        two write windows for it to be stored, then raises
+        ``CartVersionConflict``. ``projection`` must include ``version``.
+        """
+        await self.flush_session(session_id)
+        deadline = time.monotonic() + 2 * self._window
+        while True:
+            cart = await self._collection.find_one({"session_id": session_id}, projection)
+            version = (cart or {}).get("version") or 0
+            if min_version is None or version >= min_version:
+                return cart
+            if time.monotonic() >= deadline:
+                raise CartVersionConflict(min_version, version)
+            await asyncio.sleep(self._window / 4)
+
+    def _take(self, session_id: str) -> Optional[PendingCart]:
+        """Move a change set from pending to in flight without an await in between,
+        so ``current_version`` never falls back to the stored, older version"""
+        pending = self._pending.pop(session_id, None)
+        if pending is not None:
+            self._in_flight[session_id] = pending.version
+        return pending
+
+    async def _write(self, session_id: str, pending: PendingCart):
+        try:
+            result = await self._collection.bulk_write(pending.operations(session_id, datetime.utcnow()), ordered=True)
+            stored = result.matched_count + result.upserted_count > 0
+        except BulkWriteError as e:
+            # Inserting a new cart collided with one created elsewhere: a conflict, not a failure
+            errors = e.details.get("writeErrors", [])
+            if not any(error.get("index") == 0 and error.get("code") == DUPLICATE_KEY for error in errors):
+                self._retry_later(session_id, pending, e)
+                return
+            stored = False
+        except Exception as e:
+            self._retry_later(session_id, pending, e)
+            return
+        finally:
+            self._in_flight.pop(session_id, None)
+        if not stored:
+            await self._reject(session_id, pending)
+
+    def _retry_later(self, session_id: str, pending: PendingCart, error: Exception):
+        logger.error("Failed to write cart %s (version %d), retrying: %s", session_id, pending.version, error)
+        later = self._pending.pop(session_id, None)
+        if later is not None:
+            pending.merge(later)
+        pending.since = time.monotonic()
+        self._pending[session_id] = pending
+
+    async def _reject(self, session_id: str, pending: PendingCart):
+        self.conflicts += 1
+        logger.warning(
+            "Cart %s changed elsewhere since version %d; dropped changes up to version %d",
+            session_id, pending.base, pending.version,
+        )
+        # Changes accepted on top of the dropped ones can't apply either
+        dropped = pending.version
+        later = self._pending.get(session_id)
+        if later is not None and later.base == pending.version:
+            dropped = later.version
+            del self._pending[session_id]
+        # The other process may have handed out the same version numbers; move
+        # the stored cart past them so every client holding one gets a conflict
+        try:
+            await self._collection.update_one(
+                {"session_id": session_id, "version": {"$gt": pending.base, "$lte": dropped}},
+                {"$set": {"version": dropped + 1}},
+            )
+        except Exception as e:
+            logger.error("Failed to advance version of cart %s: %s", session_id, e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error("Shutting down with %d unwritten cart change sets", len(self._pending))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self._window / 2)
+            try:
+                await self.flush(max_age=self._window)
+            except Exception as e:
+                logger.error("Cart flush failed: %s", e)
+
+
+@dataclass
+class MaintenanceReport:
+    """Outcome of one cart maintenance run"""
+    expired: int = 0
+    empty: int = 0
+    batches: int = 0
+    duration: float = 0.0
+
+    @property
+    def reclaimed(self) -> int:
+        return self.expired + self.empty
+
+
+class CartMaintenance:
+    """Background job that deletes abandoned and empty carts.
+
+    Matching carts are deleted in batches of ``batch_size`` ids with a
+    ``pause`` between batches, so a large backlog is drained gradually
+    instead of competing with live cart traffic.
+    """
+
+    def __init__(
+        self,
+        collection,
+        max_age: timedelta,
+        empty_grace: timedelta,
+        interval: float = 3600.0,
+        batch_size: int = 500,
+        pause: float = 0.1,
+    ):
+        self._collection = collection
+        self._max_age = max_age
+        self._empty_grace = empty_grace
+        self._interval = interval
+        self._batch_size = batch_size
+        self._pause = pause
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[MaintenanceReport] = None
+
+    async def run_once(self) -> MaintenanceReport:
+        report = MaintenanceReport()
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        report.expired = await self._delete_batched(
+            {"updated_at": {"$lt": now - self._max_age}}, report
+        )
+        report.empty = await self._delete_batched(
+            {"updated_at": {"$lt": now - self._empty_grace}, "items": {"$size": 0}}, report
+        )
+        report.duration = time.perf_counter() - started
+        self.last_report = report
+        logger.info(
+            "Cart maintenance reclaimed %d carts (%d expired, %d empty) in %d batches, %.3fs",
+            report.reclaimed, report.expired, report.empty, report.batches, report.duration,
+        )
+        return report
+
+    async def _delete_batched(self, query: Dict, report: MaintenanceReport) -> int:
+        deleted = 0
+        while True:
+            batch = await self._collection.find(query, {"_id": 1}).limit(self._batch_size).to_list(self._batch_size)
+            if not batch:
+                return deleted
+            result = await self._collection.delete_many(
+                {"_id": {"$in": [document["_id"] for document in batch]}, **query}
+            )
+            deleted += result.deleted_count
+            report.batches += 1
+            if len(batch) < self._batch_size:
+                return deleted
+            await asyncio.sleep(self._pause)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintenance_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Cart maintenance failed: %s", e)
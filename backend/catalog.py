@@ -0,0 +1,303 @@
+import asyncio
+import bisect
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from catalog_watch import read_catalog_version
+from http_cache import EncodedPayload
+from search import FIELD_WEIGHTS, SearchIndex
+
+logger = logging.getLogger(__name__)
+
+SORT_ORDERS = ("name", "price-asc", "price-desc", "popular")
+
+
+class CatalogIndex:
+    """Precomputed lookup structures over one catalog snapshot.
+
+    Products are referred to by their position in the snapshot, so filters can
+    be combined as integer set intersections and then emitted in a presorted
+    order without sorting per request.
+    """
+
+    def __init__(self, products: Tuple):
+        by_category: Dict[str, List[int]] = {}
+        for position, product in enumerate(products):
+            by_category.setdefault(product.category, []).append(position)
+        self.by_category: Dict[str, Tuple[int, ...]] = {
+            category: tuple(positions) for category, positions in by_category.items()
+        }
+
+        by_price = sorted(range(len(products)), key=lambda position: products[position].price)
+        self.price_order: Tuple[int, ...] = tuple(by_price)
+        self.prices: Tuple[int, ...] = tuple(products[position].price for position in by_price)
+        self.name_order: Tuple[int, ...] = tuple(
+            sorted(range(len(products)), key=lambda position: products[position].name.casefold())
+        )
+        self.position_by_id: Dict[str, int] = {product.id: position for position, product in enumerate(products)}
+        self.size = len(products)
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self.by_category)
+
+    def price_range(self, min_price: Optional[int], max_price: Optional[int]) -> Tuple[int, ...]:
+        """Positions of products priced within [min_price, max_price]"""
+        start = 0 if min_price is None else bisect.bisect_left(self.prices, min_price)
+        stop = self.size if max_price is None else bisect.bisect_right(self.prices, max_price)
+        return self.price_order[start:stop]
+
+    def ordered(self, sort: Optional[str]) -> Iterable[int]:
+        if sort == "name":
+            return self.name_order
+        if sort == "price-asc":
+            return self.price_order
+        if sort in ("price-desc", "popular"):
+            # Popularity is not tracked yet; like the client, fall back to price
+            return reversed(self.price_order)
+        return range(self.size)
+
+    def select(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        matching: Optional[Iterable[str]] = None,
+        sort: Optional[str] = None,
+    ) -> List[int]:
+        """Positions of all matching products in the requested order"""
+        candidates = None
+        if category is not None:
+            candidates = set(self.by_category.get(category, ()))
+        if min_price is not None or max_price is not None:
+            in_range = self.price_range(min_price, max_price)
+            candidates = set(in_range) if candidates is None else candidates.intersection(in_range)
+        if matching is not None:
+            pool = {self.position_by_id[product_id] for product_id in matching if product_id in self.position_by_id}
+            candidates = pool if candidates is None else candidates & pool
+
+        order = self.ordered(sort)
+        if candidates is None:
+            return list(order)
+        return [position for position in order if position in candidates]
+
+
+def project(item: dict, fields: Optional[Iterable[str]]) -> dict:
+    if fields is None:
+        return item
+    include = set(fields) | {"id"}
+    return {name: value for name, value in item.items() if name in include}
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of the catalog at one version"""
+    version: int
+    products: Tuple
+    # JSON-ready dicts in product order, dumped once per snapshot; callers must not mutate them
+    items: Tuple[dict, ...] = ()
+    by_id: Dict[str, object] = field(default_factory=dict)
+    payload: Optional[EncodedPayload] = None
+    index: Optional[CatalogIndex] = None
+    search: Optional[SearchIndex] = None
+    _product_payloads: Dict[str, EncodedPayload] = field(default_factory=dict, repr=False)
+
+    def get(self, product_id: str):
+        return self.by_id.get(product_id)
+
+    def item(self, product_id: str, fields: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """JSON-ready dict for one product, limited to ``fields`` (plus id) when given"""
+        position = self.index.position_by_id.get(product_id)
+        if position is None:
+            return None
+        return project(self.items[position], fields)
+
+    def product_payload(self, product_id: str) -> Optional[EncodedPayload]:
+        """Serialized body for a single product, built on first request"""
+        payload = self._product_payloads.get(product_id)
+        if payload is None:
+            item = self.item(product_id)
+            if item is None:
+                return None
+            payload = EncodedPayload.from_json(item)
+            self._product_payloads[product_id] = payload
+        return payload
+
+    def price_items(self, items: Iterable[dict]) -> Tuple[List[dict], int, List[str]]:
+        """Join cart lines with the catalog; returns (lines, total, missing product ids)"""
+        lines, missing, total = [], [], 0
+        for item in items:
+            product_id, quantity = item["product_id"], item["quantity"]
+            product = self.by_id.get(product_id)
+            if product is None:
+                missing.append(product_id)
+                lines.append({"product_id": product_id, "quantity": quantity, "available": False})
+                continue
+            subtotal = product.price * quantity
+            total += subtotal
+            lines.append({
+                "product_id": product_id,
+                "quantity": quantity,
+                "available": True,
+                "name": product.name,
+                "price": product.price,
+                "icon": product.icon,
+                "subtotal": subtotal,
+            })
+        return lines, total, missing
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        q: Optional[str] = None,
+        **filters,
+    ):
+        """Filter, sort and page the snapshot; returns (items, total, next_offset)"""
+        matching = self.search.matches(q) if q else None
+        positions = self.index.select(matching=matching, **filters)
+        total = len(positions)
+        stop = total if limit is None else min(offset + limit, total)
+        page = positions[offset:stop]
+
+        items = [project(self.items[position], fields) for position in page]
+        next_offset = stop if stop < total else None
+        return items, total, next_offset
+
+
+class CatalogCache:
+    """In-memory copy of the products collection, indexed by product id.
+
+    Readers always see a complete snapshot; a reload builds a new snapshot and
+    swaps it in, bumping ``version`` only when the catalog contents changed.
+
+    With ``versions`` (the ``catalog_version`` collection), each reload first
+    reads the catalog version into ``source_version``, so a catalog watcher
+    can tell whether writes happened after the load.
+    """
+
+    def __init__(self, collection, model, refresh_interval: float = 60.0, versions=None):
+        self._collection = collection
+        self._versions = versions
+        self.source_version: Optional[int] = None
+        self._model = model
+        self._refresh_interval = refresh_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._documents: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[int], Awaitable[None]]] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    async def current(self) -> CatalogSnapshot:
+        """Return the live snapshot, loading it first if the cache is cold"""
+        if self._snapshot is None:
+            await self.refresh()
+        return self._snapshot
+
+    def add_listener(self, listener: Callable[[int], Awaitable[None]]):
+        """Register a coroutine called with the new version after each change"""
+        self._listeners.append(listener)
+
+    async def refresh(self) -> int:
+        """Reload the catalog from Mongo and return the resulting version"""
+        version = await self._reload()
+        if version is not None:
+            for listener in self._listeners:
+                try:
+                    await listener(version)
+                except Exception as e:
+                    logger.warning("Catalog listener %r failed: %s", listener, e)
+        return self.version
+
+    async def _reload(self) -> Optional[int]:
+        """Swap in a new snapshot; returns its version, or None if nothing changed"""
+        async with self._lock:
+            source_version = await read_catalog_version(self._versions) if self._versions is not None else None
+            # Sorted, so an unchanged catalog compares equal whatever order Mongo returns it in
+            documents = await self._collection.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+            return self.install(documents, source_version)
+
+    def install(self, documents: List[dict], source_version: Optional[int] = None) -> Optional[int]:
+        """Build and swap in a snapshot from raw product documents.
+
+        ``source_version`` is the catalog version read before the documents.
+        Synchronous so it can also run before the event loop exists, e.g. in
+        the gunicorn master before workers fork and share the result.
+        """
+        if source_version is not None:
+            self.source_version = source_version
+        if self._snapshot is not None and documents == self._documents:
+            return None
+
+        products = tuple(self._model(**document) for document in documents)
+        items = tuple(product.model_dump(mode="json") for product in products)
+        search = self._build_search(products)
+        self._snapshot = CatalogSnapshot(
+            version=self.version + 1,
+            products=products,
+            items=items,
+            by_id={product.id: product for product in products},
+            payload=EncodedPayload.from_json(list(items)),
+            index=CatalogIndex(products),
+            search=search,
+        )
+        self._documents = documents
+        logger.info("Catalog cache loaded %d products (version %d)", len(products), self._snapshot.version)
+        return self._snapshot.version
+
+    def _build_search(self, products: Tuple) -> SearchIndex:
+        """Search index for a new snapshot: a copy of the current one with only
+        the products that were added, changed or removed re-indexed, so readers
+        of older snapshots keep searching the catalog they were given"""
+        if self._snapshot is not None:
+            previous, search = self._snapshot.by_id, self._snapshot.search.copy()
+        else:
+            previous, search = {}, SearchIndex()
+        current = {product.id: product for product in products}
+        for product_id in previous.keys() - current.keys():
+            search.remove(product_id)
+        for product_id, product in current.items():
+            if product_id not in search or previous.get(product_id) != product:
+                search.add(product_id, product.model_dump(include=set(FIELD_WEIGHTS)))
+        return search
+
+    def invalidate(self):
+        """Ask the background refresher to reload the catalog now"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the previous snapshot until Mongo is reachable again
+                logger.warning("Catalog refresh failed, serving version %d: %s", self.version, e)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Upsert products from a JSON array, NDJSON or CSV feed of any size.
+
+Rows are validated against the Product model in chunks, diffed against the
+stored catalog by a stable key (``name`` by default, since seeded products
+get random ids) and only inserts and changed fields are written, with one
+unordered bulk_write per chunk. Running servers reload the catalog through
+catalog_watch.
+
+Usage: python catalog_import.py products.csv [--key name] [--chunk-size 500] [--dry-run]
+
+In CSV feeds, list fields (features, technologies) are either a JSON
+array or values separated by "|".
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, get_origin
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from catalog_watch import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "ndjson", "csv")
+KEYS = ("name", "id")
+MAX_REPORTED_ERRORS = 50
+READ_SIZE = 64 * 1024
+
+# Rows are (row number, parsed row); an undecodable row is passed on as the
+# exception so it is reported with the others instead of ending the import
+Row = Tuple[int, object]
+
+
+class ImportFormatError(ValueError):
+    """The feed cannot be parsed any further"""
+
+
+def detect_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> Optional[str]:
+    if content_type:
+        content_type = content_type.split(";")[0].strip().lower()
+        if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+            return "ndjson"
+        if content_type in ("text/csv", "application/csv"):
+            return "csv"
+        if content_type == "application/json":
+            return "json"
+    if filename:
+        suffix = Path(filename).suffix.lower()
+        if suffix in (".ndjson", ".jsonl"):
+            return "ndjson"
+        if suffix in (".json", ".csv"):
+            return suffix[1:]
+    return None
+
+
+def iter_ndjson(text: TextIO) -> Iterator[Row]:
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+def iter_json(text: TextIO, read_size: int = READ_SIZE) -> Iterator[Row]:
+    """Elements of a top-level JSON array, decoded one at a time from ``read_size`` reads"""
+    decoder = json.JSONDecoder()
+    buffer = text.read(read_size).lstrip()
+    if not buffer.startswith("["):
+        raise ImportFormatError("JSON feed must be an array of products")
+    position, number, exhausted = 1, 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            if position >= len(buffer):
+                raise ValueError("unexpected end of input")
+            value, end = decoder.raw_decode(buffer, position)
+        except ValueError as e:
+            if exhausted:
+                raise ImportFormatError(f"Invalid JSON after row {number}: {e}")
+            more = text.read(read_size)
+            exhausted = not more
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+        number += 1
+        yield number, value
+        # Keep only the undecoded tail so memory stays bounded by the largest row
+        buffer, position = buffer[end:], 0
+
+
+def iter_csv(text: TextIO, list_fields: Iterable[str] = ()) -> Iterator[Row]:
+    list_fields = set(list_fields)
+    reader = csv.DictReader(text)
+    for row in reader:
+        parsed = {}
+        for name, value in row.items():
+            if name is None or value is None:
+                continue
+            value = value.strip()
+            if name in list_fields:
+                if value.startswith("["):
+                    try:
+                        value = json.loads(value)
+                    except ValueError as e:
+                        parsed = ValueError(f"{name}: {e}")
+                        break
+                else:
+                    value = [item.strip() for item in value.split("|") if item.strip()]
+            elif value == "":
+                # Leave optional fields unset rather than empty
+                continue
+            parsed[name] = value
+        yield reader.line_num, parsed
+
+
+def list_fields(model) -> List[str]:
+    return [name for name, info in model.model_fields.items() if get_origin(info.annotation) in (list, List)]
+
+
+def read_rows(text: TextIO, format: str, model) -> Iterator[Row]:
+    if format == "ndjson":
+        return iter_ndjson(text)
+    if format == "csv":
+        return iter_csv(text, list_fields(model))
+    if format == "json":
+        return iter_json(text)
+    raise ImportFormatError(f"Unknown format {format!r}; expected one of {', '.join(FORMATS)}")
+
+
+@dataclass
+class ImportReport:
+    """Outcome of one catalog import"""
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    chunks: int = 0
+    duration: float = 0.0
+    dry_run: bool = False
+    # Set when the feed became unreadable; rows before it were still applied
+    stopped: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return not self.dry_run and (self.inserted > 0 or self.updated > 0)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.duration if self.duration else 0.0
+
+    def error(self, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), "rows_per_second": round(self.rows_per_second, 1)}
+
+
+def describe(error: Exception) -> str:
+    """One-line description of why a row was rejected"""
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, detail['loc'])) or 'row'}: {detail['msg']}" for detail in error.errors())
+    return str(error)
+
+
+class CatalogImporter:
+    """Applies a feed of product rows to the products collection.
+
+    Only one chunk of rows and the stored documents it matches are held in
+    memory at a time. Within a chunk a later row with the same key wins;
+    across chunks rows are applied in order.
+
+    With ``key="name"`` a matched product keeps its id, so carts referring
+    to it stay valid; new products get the id from the row or a fresh one.
+    """
+
+    def __init__(self, collection, model, key: str = "name", chunk_size: int = 500, dry_run: bool = False):
+        if key not in KEYS:
+            raise ValueError(f"Unknown key {key!r}; expected one of {', '.join(KEYS)}")
+        self._collection = collection
+        self._model = model
+        self._key = key
+        self._chunk_size = chunk_size
+        self._dry_run = dry_run
+
+    async def run(self, rows: Iterable[Row]) -> ImportReport:
+        report = ImportReport(dry_run=self._dry_run)
+        started = time.perf_counter()
+        chunk: List[Row] = []
+        try:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self._chunk_size:
+                    await self._apply(chunk, report)
+                    chunk = []
+        except ImportFormatError as e:
+            report.stopped = str(e)
+            logger.warning("Catalog import stopped after %d rows: %s", report.rows + len(chunk), e)
+        if chunk:
+            await self._apply(chunk, report)
+        report.duration = time.perf_counter() - started
+        logger.info(
+            "Catalog import: %d rows, %d inserted, %d updated, %d unchanged, %d invalid, %d failed in %.2fs (%.0f rows/s)%s",
+            report.rows, report.inserted, report.updated, report.unchanged, report.invalid, report.failed,
+            report.duration, report.rows_per_second, " [dry run]" if self._dry_run else "",
+        )
+        return report
+
+    def _validate(self, chunk: List[Row], report: ImportReport) -> Dict[str, dict]:
+        documents: Dict[str, dict] = {}
+        for number, row in chunk:
+            report.rows += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                if not isinstance(row, dict):
+                    raise ValueError("expected an object")
+                document = self._model(**row).model_dump()
+            except (ValueError, TypeError) as e:
+                report.invalid += 1
+                report.error(f"row {number}: {describe(e)}")
+                continue
+            if document[self._key] in documents:
+                report.duplicates += 1
+            documents[document[self._key]] = document
+        return documents
+
+    async def _apply(self, chunk: List[Row], report: ImportReport):
+        report.chunks += 1
+        documents = self._validate(chunk, report)
+        if not documents:
+            return
+        stored = {
+            document[self._key]: document
+            async for document in self._collection.find({self._key: {"$in": list(documents)}}, {"_id": 0})
+        }
+
+        # keys[i] is the row key of operations[i], for reporting write errors
+        operations, keys, inserts = [], [], 0
+        for key, document in documents.items():
+            current = stored.get(key)
+            if current is None:
+                operations.append(UpdateOne({self._key: key}, {"$setOnInsert": document}, upsert=True))
+                keys.append(key)
+                inserts += 1
+                continue
+            changes = {name: value for name, value in document.items() if name != "id" and current.get(name) != value}
+            if changes:
+                operations.append(UpdateOne({self._key: key}, {"$set": changes}))
+                keys.append(key)
+            else:
+                report.unchanged += 1
+
+        if self._dry_run or not operations:
+            report.inserted += inserts
+            report.updated += len(operations) - inserts
+            return
+        try:
+            result = (await self._collection.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+            for error in result.get("writeErrors", []):
+                report.failed += 1
+                report.error(f"{self._key} {keys[error['index']]!r}: {error.get('errmsg')}")
+        report.inserted += result.get("nUpserted", 0)
+        report.updated += result.get("nModified", 0)
+        # Matched but not modified: another writer got there first
+        report.unchanged += len(operations) - result.get("nUpserted", 0) - result.get("nModified", 0) - len(
+            result.get("writeErrors", [])
+        )
+
+
+async def import_catalog(db, model, rows: Iterable[Row], **options) -> ImportReport:
+    """Import ``rows`` into ``db.products`` and tell other processes when anything changed"""
+    report = await CatalogImporter(db.products, model, **options).run(rows)
+    if report.changed:
+        await bump_catalog_version(db.catalog_version)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--key", choices=KEYS, default="name", help="field matching rows to stored products")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="validate and diff without writing")
+    args = parser.parse_args()
+
+    format = args.format or detect_format(args.path.name)
+    if format is None:
+        parser.error("cannot tell the format from the file name; pass --format")
+
+    # Reads MONGO_URL / DB_NAME (and .env) like the server does
+    import server
+
+    async def run() -> ImportReport:
+        await server.database.connect()
+        try:
+            with open(args.path, encoding="utf-8-sig", newline="") as text:
+                return await import_catalog(
+                    server.db, server.Product, read_rows(text, format, server.Product),
+                    key=args.key, chunk_size=args.chunk_size, dry_run=args.dry_run,
+                )
+        finally:
+            server.database.close()
+
+    report = asyncio.run(run())
+    print(json.dumps(report.as_dict(), indent=2, ensure_ascii=False))
+    return 1 if report.stopped or report.invalid or report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_ID = "catalog"
+
+# Server error codes for change streams that cannot be opened or resumed
+NOT_A_REPLICA_SET = 40573
+HISTORY_LOST = 286
+FATAL_ERROR = 280
+
+
+async def bump_catalog_version(versions) -> int:
+    """Record a catalog write so watchers that poll notice it; returns the new version.
+
+    Anything that writes ``products`` should call this after the write, so
+    processes on a standalone mongod (no change streams) pick it up.
+    """
+    document = await versions.find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return document["version"]
+
+
+async def read_catalog_version(versions) -> int:
+    """Current catalog version; 0 before the first bump"""
+    document = await versions.find_one({"_id": CATALOG_VERSION_ID}, {"version": 1})
+    return document["version"] if document else 0
+
+
+async def change_streams_supported(client) -> bool:
+    """Change streams need a replica set or a sharded cluster"""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception as e:
+        logger.info("Could not determine MongoDB topology, polling for catalog changes: %s", e)
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+class CatalogWatcher:
+    """Tells this process when ``products`` changed, wherever the write came from.
+
+    Follows a change stream on the products collection when the server
+    supports one, keeping its resume token so a dropped connection resumes
+    where it left off instead of missing writes. On a standalone mongod it
+    polls the ``catalog_version`` document bumped by ``bump_catalog_version``
+    every ``poll_interval`` seconds instead.
+
+    Changes the stream delivers back to back within ``debounce`` seconds
+    (e.g. a bulk import) are reported with a single ``on_change`` call.
+
+    ``loaded_version`` returns the catalog version the loaded catalog was
+    read at, so the first poll also reports writes made between that load
+    (e.g. the preload in the gunicorn master) and the watcher starting.
+    """
+
+    def __init__(
+        self,
+        products,
+        versions,
+        on_change: Callable[[], None],
+        loaded_version: Optional[Callable[[], Optional[int]]] = None,
+        mode: str = "auto",
+        poll_interval: float = 1.0,
+        debounce: float = 0.2,
+        retry_delay: float = 1.0,
+    ):
+        self._products = products
+        self._versions = versions
+        self._on_change = on_change
+        self._loaded_version = loaded_version
+        self._requested_mode = mode
+        self._poll_interval = poll_interval
+        self._debounce = debounce
+        self._retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+        self._seen_version: Optional[int] = None
+        self.mode: Optional[str] = None
+        self.resume_token: Optional[dict] = None
+        self.notifications = 0
+        self.last_change_at: Optional[float] = None
+
+    def _notify(self, reason: str):
+        self.notifications += 1
+        self.last_change_at = time.time()
+        logger.info("Catalog changed (%s), reloading", reason)
+        try:
+            self._on_change()
+        except Exception as e:
+            logger.warning("Catalog change handler failed: %s", e)
+
+    async def _choose_mode(self) -> str:
+        if self._requested_mode != "auto":
+            return self._requested_mode
+        if await change_streams_supported(self._products.database.client):
+            return "change_stream"
+        return "poll"
+
+    async def _watch(self):
+        """Follow one change stream until it fails"""
+        options = {"resume_after": self.resume_token} if self.resume_token else {}
+        async with self._products.watch(max_await_time_ms=int(self._poll_interval * 1000), **options) as stream:
+            if not options:
+                # A fresh stream does not cover writes made before it opened
+                self._notify("change stream opened")
+            while stream.alive:
+                change = await stream.try_next()
+                self.resume_token = stream.resume_token
+                if change is None:
+                    continue
+                kinds = {change["operationType"]}
+                deadline = time.monotonic() + self._debounce
+                try:
+                    while change is not None and time.monotonic() < deadline:
+                        change = await stream.try_next()
+                        self.resume_token = stream.resume_token
+                        if change is not None:
+                            kinds.add(change["operationType"])
+                finally:
+                    # The token is already past these changes, so report them even if the stream broke
+                    self._notify("change stream: " + ", ".join(sorted(kinds)))
+
+    async def _watch_loop(self):
+        """Follow the change stream, reopening it on errors; returns only when the server has none"""
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                if e.code == NOT_A_REPLICA_SET:
+                    logger.warning("Change streams unavailable, polling for catalog changes: %s", e)
+                    return
+                if e.code in (HISTORY_LOST, FATAL_ERROR):
+                    # The token is too old to resume from; start over with a full reload
+                    logger.warning("Catalog change stream cannot resume, starting a new one: %s", e)
+                    self.resume_token = None
+                else:
+                    logger.warning("Catalog change stream failed: %s", e)
+            except PyMongoError as e:
+                logger.warning("Catalog change stream interrupted, resuming: %s", e)
+            await asyncio.sleep(self._retry_delay)
+
+    async def poll_once(self):
+        version = await read_catalog_version(self._versions)
+        if self._seen_version is None and self._loaded_version is not None:
+            self._seen_version = self._loaded_version()
+        if self._seen_version is not None and version != self._seen_version:
+            self._notify(f"catalog_version {self._seen_version} -> {version}")
+        self._seen_version = version
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.warning("Catalog version poll failed: %s", e)
+            await asyncio.sleep(self._poll_interval)
+
+    async def _run(self):
+        self.mode = await self._choose_mode()
+        if self.mode == "change_stream":
+            await self._watch_loop()
+            self.mode = "poll"
+        await self._poll_loop()
+
+    def start(self):
+        if self._task is None and self._requested_mode != "off":
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+try:
+    import zstandard
+except ImportError:  # wire compression is optional
+    zstandard = None
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+logger = logging.getLogger(__name__)
+
+
+def available_compressors() -> List[str]:
+    """Wire compressors in order of preference, limited to what is installed"""
+    compressors = []
+    if zstandard is not None:
+        compressors.append("zstd")
+    if snappy is not None:
+        compressors.append("snappy")
+    compressors.append("zlib")
+    return compressors
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    max_pool_size: int = 100
+    min_pool_size: int = 10
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: int = 20000
+    wait_queue_timeout_ms: int = 2000
+    max_idle_time_ms: int = 300000
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        return cls(
+            max_pool_size=int(os.environ.get('MONGO_MAX_POOL_SIZE', cls.max_pool_size)),
+            min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', cls.min_pool_size)),
+            server_selection_timeout_ms=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', cls.server_selection_timeout_ms)),
+            connect_timeout_ms=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', cls.connect_timeout_ms)),
+            socket_timeout_ms=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', cls.socket_timeout_ms)),
+            wait_queue_timeout_ms=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', cls.wait_queue_timeout_ms)),
+            max_idle_time_ms=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', cls.max_idle_time_ms)),
+        )
+
+    def client_options(self) -> Dict:
+        return {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "compressors": available_compressors(),
+        }
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool counters fed by pymongo's pool events.
+
+    Events arrive on pymongo's threads, so updates take a lock; they are a
+    handful of integer operations per checkout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_timeouts = 0
+        self.pool_clears = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "pool_clears": self.pool_clears,
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+
+class Database:
+    """The process-wide Motor client with a tuned pool and its lifecycle.
+
+    The client is created up front (Motor connects lazily) so modules can
+    bind collections at import time; ``lifespan`` verifies the server is
+    reachable and opens ``min_pool_size`` connections before the app starts
+    taking traffic, so first requests don't pay for connection setup.
+    """
+
+    def __init__(self, url: str, name: str, settings: Optional[PoolSettings] = None, **client_options):
+        self.settings = settings or PoolSettings()
+        self.pool = PoolMonitor()
+        self.client = AsyncIOMotorClient(
+            url,
+            event_listeners=[self.pool, *client_options.pop("event_listeners", [])],
+            **{**self.settings.client_options(), **client_options},
+        )
+        self.db = self.client[name]
+
+    async def ping(self) -> float:
+        """Round trip to the server in seconds"""
+        started = time.perf_counter()
+        await self.client.admin.command("ping")
+        return time.perf_counter() - started
+
+    async def connect(self, attempts: int = 5, delay: float = 1.0):
+        """Wait until the server answers, retrying with backoff; raises when it never does"""
+        for attempt in range(1, attempts + 1):
+            try:
+                latency = await self.ping()
+                logger.info("Connected to MongoDB (ping %.1f ms)", latency * 1000)
+                return
+            except PyMongoError as e:
+                if attempt == attempts:
+                    raise
+                logger.warning("MongoDB not reachable (attempt %d/%d): %s", attempt, attempts, e)
+                await asyncio.sleep(delay * 2 ** (attempt - 1))
+
+    async def prewarm(self, timeout: float = 5.0):
+        """Open ``min_pool_size`` connections now rather than on first use"""
+        target = self.settings.min_pool_size
+        if target <= 0:
+            return
+        # Concurrent pings check out several connections at once; pymongo's
+        # pool maintenance tops the pool up to minPoolSize in the background
+        await asyncio.gather(*(self.ping() for _ in range(target)))
+        deadline = time.monotonic() + timeout
+        while self.pool.open < target and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        logger.info("MongoDB pool warmed: %d/%d connections open", self.pool.open, target)
+
+    def stats(self) -> Dict:
+        """Pool utilization and wait-queue counters"""
+        stats = self.pool.snapshot()
+        stats["max_pool_size"] = self.settings.max_pool_size
+        stats["min_pool_size"] = self.settings.min_pool_size
+        stats["utilization"] = stats["checked_out"] / self.settings.max_pool_size if self.settings.max_pool_size else 0.0
+        return stats
+
+    @asynccontextmanager
+    async def lifespan(self, attempts: int = 5):
+        """Connect and pre-warm on enter, close the client on exit"""
+        await self.connect(attempts=attempts)
+        try:
+            await self.prewarm()
+        except PyMongoError as e:
+            logger.warning("MongoDB pool pre-warm failed: %s", e)
+        try:
+            yield self
+        finally:
+            self.close()
+
+    def close(self):
+        self.client.close()
+
+    @classmethod
+    def from_env(cls, **client_options) -> "Database":
+        return cls(os.environ['MONGO_URL'], os.environ['DB_NAME'], PoolSettings.from_env(), **client_options)
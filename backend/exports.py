@@ -0,0 +1,152 @@
+import csv
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from http_cache import dumps_json
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+CURSOR_FIELD = "_cursor"
+CURSOR_SEPARATOR = "_"
+
+
+class InvalidExportCursor(ValueError):
+    """The resume cursor was not produced by this export"""
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """A collection that can be exported, and the keys its rows are ordered and resumed by.
+
+    ``order`` is either ``("_id",)`` or ``("updated_at", "_id")``; the latter
+    allows incremental exports of documents changed since a point in time.
+    The sort must be backed by an index so the server streams it instead of
+    sorting in memory.
+    """
+    collection: str
+    columns: Tuple[str, ...]
+    order: Tuple[str, ...] = ("_id",)
+
+    @property
+    def incremental(self) -> bool:
+        return self.order[0] == "updated_at"
+
+    def cursor(self, document: Dict) -> str:
+        """Opaque resume position after ``document``"""
+        if self.incremental:
+            return f"{document['updated_at'].isoformat()}{CURSOR_SEPARATOR}{document['_id']}"
+        return str(document["_id"])
+
+    def resume_filter(self, cursor: str) -> Dict:
+        """Query for the documents after ``cursor``"""
+        try:
+            if not self.incremental:
+                return {"_id": {"$gt": parse_id(cursor)}}
+            updated_at, _, document_id = cursor.rpartition(CURSOR_SEPARATOR)
+            updated_at = datetime.fromisoformat(updated_at)
+        except ValueError:
+            raise InvalidExportCursor(f"Invalid cursor for {self.collection}: {cursor!r}")
+        document_id = parse_id(document_id)
+        return {"$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": document_id}},
+        ]}
+
+
+def parse_id(value: str):
+    # ObjectId also accepts any 12-character string; only take its hex form
+    return ObjectId(value) if len(value) == 24 and ObjectId.is_valid(value) else value
+
+
+def export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [export_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: export_value(item) for key, item in value.items()}
+    return value
+
+
+def csv_cell(value) -> str:
+    """Scalars as text, lists of scalars joined with "|" as catalog_import reads them, the rest as JSON"""
+    if value is None:
+        return ""
+    if isinstance(value, list) and all(not isinstance(item, (list, dict)) for item in value):
+        return "|".join(str(item) for item in value)
+    if isinstance(value, (list, dict)):
+        return dumps_json(value).decode("utf-8")
+    return str(value)
+
+
+async def export_batches(
+    collection,
+    spec: ExportSpec,
+    batch_size: int = 500,
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+) -> AsyncIterator[List[Dict]]:
+    """Documents in ``spec.order``, ``batch_size`` at a time, each with its resume cursor.
+
+    The Mongo cursor fetches the next batch only when the previous one has
+    been consumed, so a slow client holds back the query instead of
+    documents piling up in memory.
+    """
+    conditions = []
+    if cursor:
+        conditions.append(spec.resume_filter(cursor))
+    if since is not None:
+        conditions.append({"updated_at": {"$gte": since}})
+    query = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+    documents = collection.find(query).sort([(key, 1) for key in spec.order]).batch_size(batch_size)
+    batch = []
+    async for document in documents:
+        row = {name: export_value(value) for name, value in document.items()}
+        row[CURSOR_FIELD] = spec.cursor(document)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_export(batches: AsyncIterator[List[Dict]], spec: ExportSpec, format: str) -> AsyncIterator[bytes]:
+    """Encode export batches as NDJSON lines or CSV rows, one chunk per batch"""
+    columns = ("_id", *spec.columns, CURSOR_FIELD)
+    exported = 0
+    try:
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            async for batch in batches:
+                writer.writerows([csv_cell(row.get(column)) for column in columns] for row in batch)
+                exported += len(batch)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        else:
+            async for batch in batches:
+                exported += len(batch)
+                yield b"".join(dumps_json(row) + b"\n" for row in batch)
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body and resumes from its last row
+        logger.error("Export of %s failed after %d rows: %s", spec.collection, exported, e)
+        raise
+    logger.info("Exported %d %s rows as %s", exported, spec.collection, format)
@@ -0,0 +1,55 @@
+"""
+Production launch settings: gunicorn managing uvicorn workers.
+
+Usage (from backend/): gunicorn -c gunicorn.conf.py server:app
+
+The app is imported once in the master (``preload_app``). Before forking,
+the master creates the indexes and applies the seed catalog once, so workers
+don't race to seed the database. It also loads the catalog, so workers
+share the catalog snapshot and the QR table copy-on-write.
+
+Because the app is preloaded, ``kill -HUP <master>`` only restarts the
+workers from the code already in the master, and ``when_ready`` does not run
+again. To deploy new code, ``kill -USR2 <master>`` starts a new master (which
+imports the code and prepares the database) alongside the old one; once it
+serves, ``kill -QUIT <old master>`` stops the old master gracefully.
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Picks uvloop and httptools when they are installed (uvicorn[standard])
+worker_class = "uvicorn.workers.UvicornWorker"
+
+backlog = int(os.environ.get('BACKLOG', '2048'))
+keepalive = int(os.environ.get('KEEPALIVE_SECONDS', '30'))
+timeout = int(os.environ.get('WORKER_TIMEOUT_SECONDS', '30'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT_SECONDS', '30'))
+
+# Recycle workers after this many requests (0 disables)
+max_requests = int(os.environ.get('MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+preload_app = True
+accesslog = os.environ.get('ACCESS_LOG') or None
+
+
+def when_ready(server):
+    from server import prepare_database, preload_catalog
+
+    try:
+        prepare_database()
+    except Exception as e:
+        # Workers create indexes and seed on startup instead
+        server.log.warning("Database preparation failed: %s", e)
+    try:
+        preload_catalog()
+    except Exception as e:
+        # Workers load the catalog on startup as usual
+        server.log.warning("Catalog preload failed: %s", e)
+    # Keep preloaded objects out of the collector so it does not touch
+    # (and un-share) their pages in the workers
+    gc.freeze()
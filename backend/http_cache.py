@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is the fallback
+    orjson = None
+
+# Default response class for the app and for handler results
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def dumps_json(content) -> bytes:
+    """Compact UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(content, **kwargs) -> Response:
+    """Response for trusted data (dicts, lists, datetimes) without a pydantic pass"""
+    if orjson is None:
+        content = jsonable_encoder(content)
+    return DefaultJSONResponse(content, **kwargs)
+
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Pick the best content-coding from ``available`` allowed by Accept-Encoding"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etags) -> bool:
+    """Weak comparison of an If-None-Match header against known ETags"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+
+@dataclass(frozen=True)
+class EncodedPayload:
+    """A response body serialized once, with precompressed variants and strong ETags"""
+    body: bytes
+    variants: Dict[str, bytes] = field(default_factory=dict)
+    etags: Dict[Optional[str], str] = field(default_factory=dict)
+    media_type: str = "application/json"
+
+    @classmethod
+    def from_bytes(cls, body: bytes, media_type: str = "application/json") -> "EncodedPayload":
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11)
+        # Strong validators differ per content-coding, as the bytes differ
+        etags = {None: f'"{digest}"'}
+        etags.update({encoding: f'"{digest}-{encoding}"' for encoding in variants})
+        return cls(body=body, variants=variants, etags=etags, media_type=media_type)
+
+    @classmethod
+    def from_json(cls, content) -> "EncodedPayload":
+        return cls.from_bytes(dumps_json(content))
+
+    def response(self, request: Request, cache_control: str = "no-cache") -> Response:
+        """Build a 200 or 304 response for ``request`` from the stored bytes"""
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), self.variants)
+        headers = {
+            "ETag": self.etags[encoding],
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), self.etags.values()):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is None:
+            return Response(self.body, media_type=self.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
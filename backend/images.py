@@ -0,0 +1,389 @@
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from http_cache import etag_matches
+from response_cache import LeaderCancelled
+from static_assets import IMMUTABLE_CACHE_CONTROL
+
+try:
+    import PIL  # PIL.Image itself is imported on first use, not at startup
+except ImportError:  # without Pillow, image requests redirect to the original
+    PIL = None
+
+logger = logging.getLogger(__name__)
+
+# Widths offered for srcset; requests are limited to these to bound the cache
+WIDTHS = (160, 320, 480, 640, 960, 1280)
+# Output formats in order of preference: extension -> (Pillow format, media type, quality)
+FORMATS = {
+    "avif": ("AVIF", "image/avif", 50),
+    "webp": ("WEBP", "image/webp", 75),
+    "jpg": ("JPEG", "image/jpeg", 80),
+}
+VARIANT_RE = re.compile(r"^(\d+)(?:\.([a-z]+))?$")
+# Bump when rendering changes so cached variants are not reused
+RENDER_VERSION = 1
+
+
+class ImageSourceError(Exception):
+    """The original image could not be fetched or decoded"""
+
+
+@functools.lru_cache(maxsize=None)
+def available_formats() -> Tuple[str, ...]:
+    """Output formats the installed Pillow can write"""
+    if PIL is None:
+        return ()
+    from PIL import features
+
+    return tuple(extension for extension in FORMATS if extension == "jpg" or features.check(extension))
+
+
+def parse_variant(variant: str) -> Tuple[int, Optional[str]]:
+    """``"480"`` or ``"480.webp"`` -> (width, extension or None); raises ValueError"""
+    match = VARIANT_RE.match(variant)
+    if not match or int(match.group(1)) not in WIDTHS:
+        raise ValueError(f"Unknown image variant {variant!r}; widths are {', '.join(map(str, WIDTHS))}")
+    extension = match.group(2)
+    if extension is not None and extension not in FORMATS:
+        raise ValueError(f"Unknown image format {extension!r}")
+    return int(match.group(1)), extension
+
+
+def negotiate_format(accept: str, available) -> str:
+    """Best format the client accepts, falling back to JPEG"""
+    accept = accept.lower()
+    for extension in available:
+        if FORMATS[extension][1] in accept:
+            return extension
+    return "jpg"
+
+
+def source_version(url: str) -> str:
+    """Short hash of a source URL, used as ``?v=`` to make variant URLs immutable"""
+    return hashlib.sha256(url.encode()).hexdigest()[:12]
+
+
+def srcset(product_id: str, url: str, extension: str) -> str:
+    version = source_version(url)
+    return ", ".join(f"/api/img/{product_id}/{width}.{extension}?v={version} {width}w" for width in WIDTHS)
+
+
+def render_variant(original: bytes, width: int, extension: str) -> bytes:
+    """Resize ``original`` to at most ``width`` pixels wide and encode it; runs in a worker process"""
+    from PIL import Image, ImageOps
+
+    pil_format, _, quality = FORMATS[extension]
+    with Image.open(io.BytesIO(original)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        if extension == "jpg" and has_alpha:
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        output = io.BytesIO()
+        image.save(output, pil_format, quality=quality)
+    return output.getvalue()
+
+
+class DiskCache:
+    """Files under ``root`` limited to ``max_bytes``, evicting the least recently used.
+
+    Recency is kept in memory and persisted through file mtimes, so a restart
+    resumes with the same order. Workers sharing ``root`` each evict on their
+    own view, so a file can disappear under another worker; that is a miss.
+    Each worker rescans the directory every ``rescan_interval`` seconds to
+    count the others' files, so the directory can exceed ``max_bytes`` by
+    what the other workers wrote since their last scan.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, rescan_interval: float = 60.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._scanned_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _scan(self):
+        """Rebuild the index from the files on disk, oldest first; done on first use rather than at import"""
+        self._scanned_at = time.monotonic()
+        files = []
+        if self.root.is_dir():
+            for path in self.root.rglob("*"):
+                if path.name.startswith("."):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:  # evicted by another worker meanwhile
+                    continue
+                if path.is_file():
+                    files.append((stat.st_mtime, path.relative_to(self.root).as_posix(), stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._size = sum(self._entries.values())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            if self._scanned_at is None:
+                self._scan()
+        path = self.root / name
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._size -= self._entries.pop(name, 0)
+            return None
+        with self._lock:
+            self.hits += 1
+            if name not in self._entries:
+                self._size += len(data)
+            self._entries[name] = len(data)
+            self._entries.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, name: str, data: bytes):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers in other workers never see a partial file
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        with self._lock:
+            if self._scanned_at is None or time.monotonic() - self._scanned_at >= self.rescan_interval:
+                self._scan()
+            self._size += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            evicted = []
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                oldest, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(oldest)
+            self.evictions += len(evicted)
+        for oldest in evicted:
+            try:
+                (self.root / oldest).unlink()
+            except FileNotFoundError:
+                pass
+
+
+class HttpImageSource:
+    """Originals fetched over HTTP(S)"""
+
+    def __init__(self, timeout: float = 10.0, max_bytes: int = 20 * 1024 * 1024):
+        self._timeout = timeout
+        self._max_bytes = max_bytes
+        self._client = None
+
+    async def fetch(self, url: str) -> bytes:
+        if urlparse(url).scheme not in ("http", "https"):
+            raise ImageSourceError(f"Unsupported image URL {url!r}")
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=self._timeout, follow_redirects=True)
+        try:
+            async with self._client.stream("GET", url) as response:
+                response.raise_for_status()
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self._max_bytes:
+                        raise ImageSourceError(f"{url} is larger than {self._max_bytes} bytes")
+                    chunks.append(chunk)
+        except ImageSourceError:
+            raise
+        except Exception as e:
+            raise ImageSourceError(f"Could not fetch {url}: {e}") from e
+        return b"".join(chunks)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class DirectoryImageSource:
+    """Originals read from a local mirror: ``https://host/a/b.png`` is ``<root>/a/b.png``"""
+
+    def __init__(self, root: Path):
+        self._root = root.resolve()
+
+    async def fetch(self, url: str) -> bytes:
+        path = (self._root / urlparse(url).path.lstrip("/")).resolve()
+        if not path.is_relative_to(self._root):
+            raise ImageSourceError(f"Image path escapes {self._root}: {url}")
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except OSError as e:
+            raise ImageSourceError(f"Could not read {path}: {e}") from e
+
+    async def close(self):
+        pass
+
+
+@dataclass(frozen=True)
+class ImageVariant:
+    body: bytes
+    extension: str
+    etag: str
+
+    def response(self, request: Request, immutable: bool, negotiated: bool) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else "public, max-age=3600",
+        }
+        if negotiated:
+            headers["Vary"] = "Accept"
+        if etag_matches(request.headers.get("if-none-match"), (self.etag,)):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type=FORMATS[self.extension][1], headers=headers)
+
+
+class ImageProxy:
+    """Resized variants of product images, rendered once and kept in a disk cache.
+
+    The original behind a URL is fetched once and stored under its content
+    hash (``originals/<sha256>``, with ``sources/<url hash>`` pointing to
+    it); variants are named after that hash, width and format
+    (``variants/<sha256[:24]>-r<RENDER_VERSION>-<width>.<ext>``). Resizing and encoding run in
+    a process pool so they neither block the event loop nor hold the GIL.
+    Concurrent requests for the same variant share one render; if the
+    request rendering it is cancelled, one of the waiting requests takes over.
+    """
+
+    def __init__(self, cache: DiskCache, source, workers: int = 2):
+        self.cache = cache
+        self._source = source
+        self._workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.renders = 0
+
+    @property
+    def formats(self) -> Tuple[str, ...]:
+        return available_formats()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.formats)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Created on first use, i.e. in the worker process rather than the gunicorn master.
+        # Render processes start from a forkserver: forking the worker itself would copy
+        # it mid-flight with Motor's and the profiler's threads holding locks.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._pool
+
+    @staticmethod
+    def _pointer_name(url: str) -> str:
+        return f"sources/{hashlib.sha256(url.encode()).hexdigest()}"
+
+    @staticmethod
+    def _variant_name(digest: str, width: int, extension: str) -> str:
+        return f"variants/{digest[:24]}-r{RENDER_VERSION}-{width}.{extension}"
+
+    async def _original(self, url: str, digest: Optional[str]) -> Tuple[str, bytes]:
+        """Content hash and bytes of the image at ``url``, fetching it only when not cached"""
+        if digest is not None:
+            original = await asyncio.to_thread(self.cache.get, f"originals/{digest}")
+            if original is not None:
+                return digest, original
+
+        original = await self._source.fetch(url)
+        digest = hashlib.sha256(original).hexdigest()
+        await asyncio.to_thread(self.cache.put, f"originals/{digest}", original)
+        await asyncio.to_thread(self.cache.put, self._pointer_name(url), digest.encode())
+        return digest, original
+
+    async def variant(self, url: str, width: int, extension: str) -> ImageVariant:
+        key = f"{url}\n{width}.{extension}"
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except LeaderCancelled:
+                return await self.variant(url, width, extension)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._variant(url, width, extension)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Waiting requests retry; the first of them renders the variant
+            future.set_exception(LeaderCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _variant(self, url: str, width: int, extension: str) -> ImageVariant:
+        digest = None
+        pointer = await asyncio.to_thread(self.cache.get, self._pointer_name(url))
+        if pointer is not None:
+            digest = pointer.decode()
+            name = self._variant_name(digest, width, extension)
+            body = await asyncio.to_thread(self.cache.get, name)
+            if body is not None:
+                return ImageVariant(body, extension, f'"{Path(name).name}"')
+
+        digest, original = await self._original(url, digest)
+        name = self._variant_name(digest, width, extension)
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), render_variant, original, width, extension
+            )
+        except Exception as e:
+            raise ImageSourceError(f"Could not render {url} at {width}px as {extension}: {e}") from e
+        self.renders += 1
+        logger.info("Rendered %s from %s (%d -> %d bytes)", name, url, len(original), len(body))
+        await asyncio.to_thread(self.cache.put, name, body)
+        return ImageVariant(body, extension, f'"{Path(name).name}"')
+
+    async def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        await self._source.close()
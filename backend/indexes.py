@@ -0,0 +1,175 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Tuple
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+
+class QueryPlanError(RuntimeError):
+    """A hot query would scan a whole collection"""
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict = field(default_factory=dict)
+    # Earlier indexes on the same keys, dropped once this one is created
+    replaces: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    """A query on a request path that must be answered from an index"""
+    name: str
+    collection: str
+    filter: Dict
+
+
+def cart_indexes(cart_ttl_seconds: int) -> Tuple[IndexSpec, ...]:
+    return (
+        IndexSpec("carts", (("session_id", 1),), {"unique": True, "name": "session_id_unique"}),
+        IndexSpec("carts", (("updated_at", 1),), {"expireAfterSeconds": cart_ttl_seconds, "name": "updated_at_ttl"}),
+        # Incremental cart exports stream in (updated_at, _id) order
+        IndexSpec("carts", (("updated_at", 1), ("_id", 1)), {"name": "updated_at_id"}),
+    )
+
+
+PRODUCT_INDEXES = (
+    IndexSpec("products", (("id", 1),), {"unique": True, "name": "id_unique"}),
+    # Catalog imports and the seed upsert products by name; unique so
+    # concurrent upserts of a new product cannot both insert it
+    IndexSpec("products", (("name", 1),), {"unique": True, "name": "name_unique"}, replaces=("name",)),
+)
+
+ORDER_INDEXES = (
+    IndexSpec("orders", (("id", 1),), {"unique": True, "name": "id_unique"}),
+    # Retried checkouts are answered from this index; orders without a key are left out of it
+    IndexSpec(
+        "orders",
+        (("idempotency_key", 1),),
+        {"unique": True, "partialFilterExpression": {"idempotency_key": {"$exists": True}}, "name": "idempotency_key_unique"},
+    ),
+    IndexSpec("orders", (("session_id", 1), ("created_at", -1)), {"name": "session_id_created_at"}),
+    # The expiry job looks up unpaid orders past their payment window
+    IndexSpec("orders", (("status", 1), ("expires_at", 1)), {"name": "status_expires_at"}),
+)
+
+HOT_QUERIES = (
+    HotQuery("get product by id", "products", {"id": "__probe__"}),
+    HotQuery("get cart by session", "carts", {"session_id": "__probe__"}),
+    HotQuery("update cart line", "carts", {"session_id": "__probe__", "items.product_id": "__probe__"}),
+    HotQuery("get order by id", "orders", {"id": "__probe__"}),
+    HotQuery("replay order by idempotency key", "orders", {"idempotency_key": "__probe__"}),
+    HotQuery("list orders by session", "orders", {"session_id": "__probe__"}),
+    HotQuery("find unpaid orders", "orders", {"status": "awaiting_payment"}),
+)
+
+
+async def ensure_indexes(db, specs) -> List[str]:
+    """Create every index in ``specs``; returns the names that could not be created"""
+    failed = []
+    for spec in specs:
+        try:
+            if spec.replaces:
+                name = await replace_indexes(db, spec)
+            else:
+                name = await db[spec.collection].create_index(list(spec.keys), **spec.options)
+            logger.info("Index %s.%s ready", spec.collection, name)
+        except OperationFailure as e:
+            if e.code == INDEX_OPTIONS_CONFLICT and "expireAfterSeconds" in spec.options:
+                try:
+                    await update_ttl(db, spec)
+                    continue
+                except OperationFailure as retry_error:
+                    e = retry_error
+            # e.g. duplicate keys for a unique index
+            failed.append(f"{spec.collection}.{spec.options.get('name', spec.keys)}")
+            logger.error("Could not create index %s on %s: %s", spec.keys, spec.collection, e)
+    return failed
+
+
+async def replace_indexes(db, spec: IndexSpec) -> str:
+    """Create ``spec`` in place of the indexes it replaces, which are only
+    dropped once it exists, or kept if it cannot be built"""
+    collection = db[spec.collection]
+    existing = await collection.index_information()
+    replaced = {name: info for name, info in existing.items() if name in spec.replaces}
+    try:
+        name = await collection.create_index(list(spec.keys), **spec.options)
+    except OperationFailure as e:
+        if not replaced or e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+            raise
+        # MongoDB keeps one index per key pattern, so the old one has to go first
+        for old_name in replaced:
+            await collection.drop_index(old_name)
+        try:
+            return await collection.create_index(list(spec.keys), **spec.options)
+        except OperationFailure:
+            for old_name, info in replaced.items():
+                options = {key: value for key, value in info.items() if key not in ("key", "v", "ns")}
+                await collection.create_index(info["key"], name=old_name, **options)
+                logger.warning("Restored index %s.%s", spec.collection, old_name)
+            raise
+    for old_name in replaced:
+        await collection.drop_index(old_name)
+    return name
+
+
+async def update_ttl(db, spec: IndexSpec):
+    """Change the expiry of an existing TTL index in place rather than rebuilding it"""
+    await db.command("collMod", spec.collection, index={
+        "keyPattern": dict(spec.keys), "expireAfterSeconds": spec.options["expireAfterSeconds"],
+    })
+    logger.info(
+        "Index %s.%s now expires after %ss",
+        spec.collection, spec.options.get("name", spec.keys), spec.options["expireAfterSeconds"],
+    )
+
+
+def plan_stages(plan: Dict) -> Iterator[str]:
+    """Walk a query plan tree and yield every stage name"""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "stage" in node:
+            yield node["stage"]
+        if "inputStage" in node:
+            stack.append(node["inputStage"])
+        stack.extend(node.get("inputStages", ()))
+        if "queryPlan" in node:
+            stack.append(node["queryPlan"])
+
+
+async def verify_query_plans(db, queries=HOT_QUERIES, strict: bool = False) -> List[str]:
+    """Explain each hot query and report any that would do a COLLSCAN.
+
+    Problems are logged as warnings, or raised as ``QueryPlanError`` when
+    ``strict`` is set, so a missing index is caught at startup rather than as
+    slow requests later.
+    """
+    problems = []
+    for query in queries:
+        try:
+            explained = await db.command(
+                "explain",
+                {"find": query.collection, "filter": query.filter},
+                verbosity="queryPlanner",
+            )
+        except Exception as e:
+            logger.warning("Could not explain '%s': %s", query.name, e)
+            continue
+        winning_plan = explained.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in plan_stages(winning_plan):
+            problems.append(f"{query.name}: COLLSCAN on {query.collection} for {sorted(query.filter)}")
+
+    for problem in problems:
+        logger.warning("Query plan check failed - %s", problem)
+    if problems and strict:
+        raise QueryPlanError("; ".join(problems))
+    return problems
@@ -0,0 +1,323 @@
+import asyncio
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds spent in Mongo commands by the current request. Motor runs pymongo
+# in a thread pool with a copy of the caller's context, so the command
+# listener sees the list the middleware put here.
+request_mongo_time: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "request_mongo_time", default=None
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Observations can come from pymongo's threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = [(labelvalues, list(counts), total[0]) for labelvalues, (counts, total) in self._series.items()]
+        for labelvalues, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, labelvalues, f'le="{format_value(float(bound))}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge(Metric):
+    """Gauge read at scrape time from ``collect``, which returns a number or
+    a mapping of label values to numbers"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._collect = collect
+
+    def samples(self) -> Iterable[str]:
+        value = self._collect()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labelvalues, sample in items:
+            if not isinstance(labelvalues, tuple):
+                labelvalues = (labelvalues,)
+            yield f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(sample)}"
+
+
+class ObservedCounter(Gauge):
+    """Counter maintained elsewhere (e.g. cache hit counts) and read at scrape time"""
+    kind = "counter"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, collect: Callable, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, collect, labelnames))
+
+    def observed_counter(self, name: str, help: str, collect: Callable, labelnames: Sequence[str] = ()) -> ObservedCounter:
+        return self.register(ObservedCounter(name, help, collect, labelnames))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning("Could not collect metric %s: %s", metric.name, e)
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """Per-route HTTP metrics recorded by ``MetricsMiddleware``"""
+
+    def __init__(self, registry: MetricsRegistry):
+        labels = ("method", "route")
+        self.requests = registry.counter("http_requests_total", "HTTP requests", (*labels, "status"))
+        self.latency = registry.histogram("http_request_duration_seconds", "HTTP request latency", labels)
+        self.mongo_time = registry.histogram(
+            "http_request_mongo_seconds", "Time spent in MongoDB commands per HTTP request", labels
+        )
+        self.request_size = registry.histogram(
+            "http_request_size_bytes", "HTTP request body size", labels, buckets=SIZE_BUCKETS
+        )
+        self.response_size = registry.histogram(
+            "http_response_size_bytes", "HTTP response body size", labels, buckets=SIZE_BUCKETS
+        )
+
+
+class RouteTemplates:
+    """Maps a finished request's scope to the path template of the route it matched"""
+
+    UNMATCHED = "unmatched"
+
+    def __init__(self):
+        self._route_paths: Dict[Callable, str] = {}
+
+    def __call__(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return self.UNMATCHED
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            # The router records the matched endpoint in the scope; map it back to its path
+            router = scope.get("router")
+            routes = getattr(router, "routes", ())
+            self._route_paths.update(
+                (route.endpoint, route.path) for route in routes if hasattr(route, "endpoint")
+            )
+            path = self._route_paths.get(endpoint, self.UNMATCHED)
+        return path
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request count, latency, Mongo time and
+    payload sizes, labelled by route template rather than raw path so the
+    number of series stays bounded."""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+        self.route_template = RouteTemplates()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        received = sent = 0
+        mongo_time: List[float] = []
+        token = request_mongo_time.set(mongo_time)
+
+        async def receive_counting():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def send_counting(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counting, send_counting)
+        finally:
+            request_mongo_time.reset(token)
+            labels = (scope["method"], self.route_template(scope))
+            self.metrics.requests.inc(*labels, str(status))
+            self.metrics.latency.observe(time.perf_counter() - started, *labels)
+            self.metrics.mongo_time.observe(sum(mongo_time), *labels)
+            self.metrics.request_size.observe(received, *labels)
+            self.metrics.response_size.observe(sent, *labels)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Driver-reported command durations, per command name"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.duration = registry.histogram(
+            "mongodb_command_duration_seconds", "MongoDB command duration", ("command",)
+        )
+        self.failures = registry.counter("mongodb_command_failures_total", "Failed MongoDB commands", ("command",))
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        self.duration.observe(seconds, event.command_name)
+        request_time = request_mongo_time.get()
+        if request_time is not None:
+            request_time.append(seconds)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+        self.failures.inc(event.command_name)
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires on the event loop.
+
+    Lag is time the loop spent on other work (or blocked) past the point the
+    timer was due, so sustained lag means handlers are starving each other.
+    """
+
+    def __init__(self, registry: MetricsRegistry, interval: float = 0.5):
+        self._interval = interval
+        self.last_lag = 0.0
+        self.lag = registry.histogram(
+            "event_loop_lag_seconds", "Delay of a periodic event loop timer",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+        )
+        registry.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample", lambda: self.last_lag)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _monitor_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self.last_lag = max(0.0, loop.time() - due)
+            self.lag.observe(self.last_lag)
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+AWAITING_PAYMENT = "awaiting_payment"
+PAID = "paid"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+
+# Allowed status changes; a payment that arrives after expiry is still accepted
+TRANSITIONS = {
+    AWAITING_PAYMENT: {PAID, EXPIRED, CANCELLED},
+    EXPIRED: {PAID},
+}
+STATUSES = (AWAITING_PAYMENT, PAID, EXPIRED, CANCELLED)
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused for a different request"""
+
+    def __init__(self, key: str):
+        super().__init__(f"Idempotency-Key {key!r} was already used for a different order")
+        self.key = key
+
+
+def request_fingerprint(*parts) -> str:
+    """Stable hash of the request an Idempotency-Key was first used with"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def new_order(
+    session_id: str,
+    lines: List[dict],
+    total: int,
+    bank: str,
+    qr_url: str,
+    catalog_version: int,
+    payment_ttl: timedelta,
+    idempotency_key: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+) -> dict:
+    """Order document with the cart priced at the current catalog version"""
+    now = datetime.utcnow()
+    order = {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "items": lines,
+        "total": total,
+        "bank": bank,
+        "qr_url": qr_url,
+        "status": AWAITING_PAYMENT,
+        "status_history": [{"status": AWAITING_PAYMENT, "at": now}],
+        "catalog_version": catalog_version,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + payment_ttl,
+    }
+    if idempotency_key is not None:
+        order["idempotency_key"] = idempotency_key
+        order["request_fingerprint"] = fingerprint
+    return order
+
+
+# Orders as returned to clients
+ORDER_PROJECTION = {"_id": 0, "request_fingerprint": 0}
+
+
+async def find_by_idempotency_key(collection, key: str, fingerprint: str) -> Optional[dict]:
+    """The order an earlier request with ``key`` created, if any; a point lookup on a unique index"""
+    stored = await collection.find_one({"idempotency_key": key}, {"_id": 0})
+    if stored is None:
+        return None
+    if stored.pop("request_fingerprint", None) != fingerprint:
+        raise IdempotencyConflict(key)
+    return stored
+
+
+async def create_order(collection, order: dict) -> Tuple[dict, bool]:
+    """Insert ``order``; returns (order, replayed).
+
+    Two requests with the same Idempotency-Key racing past the replay
+    lookup both try the insert; the unique index lets one win and the other
+    is answered with the winner's order.
+    """
+    try:
+        await collection.insert_one(dict(order))
+    except DuplicateKeyError:
+        key = order.get("idempotency_key")
+        stored = await find_by_idempotency_key(collection, key, order["request_fingerprint"]) if key else None
+        if stored is None:
+            raise
+        return stored, True
+    return {name: value for name, value in order.items() if name != "request_fingerprint"}, False
+
+
+def transition(order_id: str, status: str, now: datetime, reason: Optional[str] = None) -> UpdateOne:
+    """Guarded update moving one order to ``status`` from any state allowed to reach it"""
+    sources = [source for source, targets in TRANSITIONS.items() if status in targets]
+    entry = {"status": status, "at": now}
+    if reason:
+        entry["reason"] = reason
+    return UpdateOne(
+        {"id": order_id, "status": {"$in": sources}},
+        {"$set": {"status": status, "updated_at": now}, "$push": {"status_history": entry}},
+    )
+
+
+async def apply_transitions(collection, changes: List[Tuple[str, str]], reason: Optional[str] = None) -> int:
+    """Apply (order id, status) changes in one unordered bulk write; returns how many applied.
+
+    Changes an order's current status does not allow are skipped.
+    """
+    if not changes:
+        return 0
+    now = datetime.utcnow()
+    result = await collection.bulk_write(
+        [transition(order_id, status, now, reason) for order_id, status in changes], ordered=False
+    )
+    return result.modified_count
+
+
+@dataclass
+class ExpiryReport:
+    """Outcome of one order expiry run"""
+    expired: int = 0
+    batches: int = 0
+    duration: float = 0.0
+
+
+class OrderExpiry:
+    """Background job expiring orders whose payment window has elapsed.
+
+    Due orders are found through the ``(status, expires_at)`` index and moved
+    to ``expired`` ``batch_size`` at a time with one bulk write per batch and
+    a ``pause`` between batches, so the cost of a run depends on how many
+    orders are due rather than how many exist.
+    """
+
+    def __init__(self, collection, interval: float = 60.0, batch_size: int = 500, pause: float = 0.1):
+        self._collection = collection
+        self._interval = interval
+        self._batch_size = batch_size
+        self._pause = pause
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[ExpiryReport] = None
+        self.expired = 0
+
+    async def run_once(self) -> ExpiryReport:
+        report = ExpiryReport()
+        started = time.perf_counter()
+        while True:
+            due = await self._collection.find(
+                {"status": AWAITING_PAYMENT, "expires_at": {"$lt": datetime.utcnow()}}, {"_id": 0, "id": 1}
+            ).limit(self._batch_size).to_list(self._batch_size)
+            if not due:
+                break
+            report.expired += await apply_transitions(
+                self._collection, [(order["id"], EXPIRED) for order in due], reason="payment window elapsed"
+            )
+            report.batches += 1
+            if len(due) < self._batch_size:
+                break
+            await asyncio.sleep(self._pause)
+        report.duration = time.perf_counter() - started
+        self.expired += report.expired
+        self.last_report = report
+        if report.expired:
+            logger.info(
+                "Expired %d unpaid orders in %d batches, %.3fs", report.expired, report.batches, report.duration
+            )
+        return report
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._expiry_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _expiry_loop(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Order expiry failed: %s", e)
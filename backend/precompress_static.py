@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Write .gz and .br siblings for compressible files in the React build,
+so the server can send precompressed bytes instead of compressing per request.
+
+Usage: python precompress_static.py static
+"""
+
+import gzip
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".json", ".map", ".svg", ".txt", ".ico", ".xml"}
+MIN_SIZE = 1024
+
+
+def precompress(root: Path) -> int:
+    written = 0
+    for path in root.rglob("*"):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if len(data) < MIN_SIZE:
+            continue
+
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            # Only keep variants that actually save bytes
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    root = Path(sys.argv[1] if len(sys.argv) > 1 else "static")
+    print(f"Wrote {precompress(root)} precompressed files under {root}")
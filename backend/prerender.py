@@ -0,0 +1,98 @@
+import html
+import json
+import re
+from typing import Dict, Optional, Tuple
+
+from http_cache import EncodedPayload
+
+# Fields the catalog page renders on a product card (see services/api.js)
+CARD_FIELDS = ("id", "name", "shortDescription", "price", "deliveryTime", "icon", "imageUrl", "category")
+CATALOG_ROUTES = ("catalog", "services")
+PRODUCT_ROUTE_PREFIX = "product/"
+
+SITE_NAME = "DevService"
+CATALOG_TITLE = f"Каталог услуг — {SITE_NAME}"
+CATALOG_DESCRIPTION = "Каталог услуг по разработке сайтов, приложений и автоматизации бизнеса"
+
+TITLE_RE = re.compile(rb"<title>.*?</title>", re.S)
+DESCRIPTION_RE = re.compile(rb"<meta\s+name=\"description\"[^>]*>", re.S)
+
+
+def embed_json(data) -> str:
+    """JSON that is safe to place inside an inline <script> element"""
+    return (
+        json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+        .replace("\u2028", "\\u2028")
+        .replace("\u2029", "\\u2029")
+    )
+
+
+def render_shell(shell: bytes, initial_data: Dict, title: str, description: str, image: Optional[str] = None) -> bytes:
+    """Inject SEO tags and ``window.__INITIAL_DATA__`` into the index.html shell"""
+    title_tag = f"<title>{html.escape(title)}</title>".encode()
+    description_tag = f'<meta name="description" content="{html.escape(description)}"/>'.encode()
+    page = TITLE_RE.sub(lambda _: title_tag, shell, count=1)
+    page = DESCRIPTION_RE.sub(lambda _: description_tag, page, count=1)
+
+    head = [
+        f'<meta property="og:title" content="{html.escape(title)}"/>',
+        f'<meta property="og:description" content="{html.escape(description)}"/>',
+    ]
+    if image:
+        head.append(f'<meta property="og:image" content="{html.escape(image)}"/>')
+    head.append(f"<script>window.__INITIAL_DATA__={embed_json(initial_data)}</script>")
+    return page.replace(b"</head>", "".join(head).encode() + b"</head>", 1)
+
+
+class PageRenderer:
+    """Prerendered HTML for catalog and product routes.
+
+    Pages are rendered on first request and kept until the catalog version or
+    the index.html shell changes, so each page is built once per version.
+    """
+
+    def __init__(self):
+        self._generation: Optional[Tuple[int, str]] = None
+        self._pages: Dict[str, EncodedPayload] = {}
+
+    def render(self, path: str, shell: bytes, shell_digest: str, catalog) -> Optional[EncodedPayload]:
+        """Page for ``path``, or None when the route has nothing to prerender.
+
+        ``shell`` is the stored index.html body; it is only read to render a
+        page that is not cached yet.
+        """
+        route = path.strip("/")
+        if route not in CATALOG_ROUTES and not (
+            route.startswith(PRODUCT_ROUTE_PREFIX) and catalog.get(route[len(PRODUCT_ROUTE_PREFIX):])
+        ):
+            return None
+
+        generation = (catalog.version, shell_digest)
+        if generation != self._generation:
+            self._pages = {}
+            self._generation = generation
+
+        page = self._pages.get(route)
+        if page is None:
+            page = EncodedPayload.from_bytes(self._render_route(route, shell, catalog), media_type="text/html")
+            self._pages[route] = page
+        return page
+
+    def _render_route(self, route: str, shell: bytes, catalog) -> bytes:
+        if route in CATALOG_ROUTES:
+            products, _, _ = catalog.query(sort="name", fields=CARD_FIELDS)
+            initial_data = {"products": products, "categories": catalog.index.categories}
+            return render_shell(shell, initial_data, CATALOG_TITLE, CATALOG_DESCRIPTION)
+
+        product_id = route[len(PRODUCT_ROUTE_PREFIX):]
+        product = catalog.get(product_id)
+        return render_shell(
+            shell,
+            {"product": catalog.item(product_id)},
+            f"{product.name} — {SITE_NAME}",
+            product.shortDescription,
+            image=product.imageUrl,
+        )
@@ -0,0 +1,207 @@
+import asyncio
+import hmac
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from metrics import RouteTemplates
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+WAITING_FRAME = "(waiting)"
+
+Stack = Tuple[str, ...]
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    # ';' separates frames in the collapsed format
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def thread_stack(frame) -> Stack:
+    """Root-first labels of a thread's call stack"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+def await_stack(coro) -> Stack:
+    """Root-first labels of a suspended task's await chain, ending in ``(waiting)``"""
+    labels = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    labels.append(WAITING_FRAME)
+    return tuple(labels)
+
+
+class RequestProfile:
+    """Stack samples collected for one request"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.samples: Counter = Counter()
+
+    def collapsed(self, root: str) -> str:
+        """Lines in the collapsed-stack format read by flamegraph.pl, speedscope, etc."""
+        root = root.replace(";", ":")
+        return "".join(f"{root};{';'.join(stack)} {count}\n" for stack, count in self.samples.items())
+
+
+class SamplingProfiler:
+    """Samples the stacks of selected asyncio tasks from a background thread.
+
+    Every ``interval`` seconds the thread looks at each tracked task: if its
+    coroutine is running, the event loop thread's stack is recorded (time
+    on CPU, e.g. validation or JSON encoding); otherwise the task's await
+    chain is recorded with a ``(waiting)`` leaf (time waiting, e.g. on
+    Mongo). The thread only wakes while some task is tracked.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self._interval = interval
+        self._tracked: Dict[asyncio.Task, RequestProfile] = {}
+        self._loop_thread_id: Optional[int] = None
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, task: asyncio.Task) -> RequestProfile:
+        self._loop_thread_id = threading.get_ident()
+        profile = self._tracked[task] = RequestProfile(task)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def untrack(self, task: asyncio.Task):
+        self._tracked.pop(task, None)
+        if not self._tracked:
+            self._wakeup.clear()
+
+    def _sample_loop(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self._interval)
+            try:
+                self._sample()
+            except Exception as e:
+                # Tasks can finish mid-walk; drop the sample
+                logger.debug("Profiler sample failed: %s", e)
+
+    def _sample(self):
+        loop_frame = sys._current_frames().get(self._loop_thread_id)
+        running_stack = None
+        for profile in list(self._tracked.values()):
+            coro = profile.task.get_coro()
+            if getattr(coro, "cr_running", False):
+                if running_stack is None:
+                    running_stack = thread_stack(loop_frame)
+                profile.samples[running_stack] += 1
+            else:
+                profile.samples[await_stack(coro)] += 1
+
+
+@dataclass(frozen=True)
+class ProfilingSettings:
+    enabled: bool = False
+    sample_rate: float = 0.01
+    slow_threshold: float = 0.5
+    interval: float = 0.005
+    output_dir: Path = Path("/tmp/profiles")
+    token: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "ProfilingSettings":
+        return cls(
+            enabled=os.environ.get('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes'),
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', cls.sample_rate)),
+            slow_threshold=float(os.environ.get('PROFILE_SLOW_MS', cls.slow_threshold * 1000)) / 1000,
+            interval=float(os.environ.get('PROFILE_INTERVAL_MS', cls.interval * 1000)) / 1000,
+            output_dir=Path(os.environ.get('PROFILE_DIR', str(cls.output_dir))),
+            token=os.environ.get('PROFILE_TOKEN') or None,
+        )
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or self.token is not None
+
+
+class ProfilingMiddleware:
+    """Opt-in ASGI middleware writing collapsed stacks for selected requests.
+
+    With ``PROFILE_ENABLED`` a ``sample_rate`` fraction of requests is
+    profiled, and when ``slow_threshold`` is set every request is sampled
+    but only those slower than the threshold are written. Independently, a
+    request carrying ``X-Profile: <PROFILE_TOKEN>`` is always profiled.
+
+    Each profile goes to ``<output_dir>/<time>-<pid>.<n>-<route>-<ms>ms.folded`` with
+    the method and route template as the root frame, so files can be viewed
+    one by one or concatenated into a per-route flamegraph.
+    """
+
+    def __init__(self, app, settings: ProfilingSettings):
+        self.app = app
+        self.settings = settings
+        self.profiler = SamplingProfiler(settings.interval)
+        self.route_template = RouteTemplates()
+        self._sequence = itertools.count()
+
+    def _requested(self, scope) -> bool:
+        if self.settings.token is None:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.settings.token.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = self._requested(scope)
+        sampled = forced or (self.settings.enabled and random.random() < self.settings.sample_rate)
+        watch_slow = self.settings.enabled and self.settings.slow_threshold > 0
+        if not (sampled or watch_slow):
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        profile = self.profiler.track(task)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.untrack(task)
+            duration = time.perf_counter() - started
+            if profile.samples and (sampled or duration >= self.settings.slow_threshold):
+                root = f"{scope['method']} {self.route_template(scope)}"
+                await asyncio.to_thread(self._write, root, profile, duration)
+
+    def _write(self, root: str, profile: RequestProfile, duration: float):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", root).strip("_")
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.{next(self._sequence)}-{slug}-{int(duration * 1000)}ms.folded"
+        path = self.settings.output_dir / name
+        try:
+            self.settings.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(profile.collapsed(root))
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", path, e)
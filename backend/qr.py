@@ -0,0 +1,62 @@
+import bisect
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+# Every payment tier is a multiple of this amount, so tier -> slot is a division
+TIER_STEP = 500
+
+
+class QRTable:
+    """Immutable bank x amount-tier table of payment QR links.
+
+    Links are stored in one flat tuple indexed by
+    ``bank_index * slots_per_bank + amount // TIER_STEP``, so a lookup is two
+    integer operations and a tuple index, with no nested dict walk.
+    """
+
+    def __init__(self, codes: Dict[str, Dict[int, str]], banks: Iterable[str] = ()):
+        self.banks: Tuple[str, ...] = tuple(dict.fromkeys([*banks, *codes]))
+        self._bank_index = {bank: index for index, bank in enumerate(self.banks)}
+
+        tiers = sorted({amount for amounts in codes.values() for amount in amounts})
+        for amount in tiers:
+            if amount <= 0 or amount % TIER_STEP:
+                raise ValueError(f"QR tier {amount} is not a positive multiple of {TIER_STEP}")
+        self.tiers: Tuple[int, ...] = tuple(tiers)
+        self._tier_set = frozenset(tiers)
+        self._slots_per_bank = (tiers[-1] // TIER_STEP + 1) if tiers else 0
+
+        table = [None] * (len(self.banks) * self._slots_per_bank)
+        for bank, amounts in codes.items():
+            base = self._bank_index[bank] * self._slots_per_bank
+            for amount, url in amounts.items():
+                table[base + amount // TIER_STEP] = sys.intern(url)
+        self._table: Tuple[Optional[str], ...] = tuple(table)
+
+    def is_tier(self, amount: int) -> bool:
+        return amount in self._tier_set
+
+    def nearest_tiers(self, amount: int) -> Tuple[Optional[int], Optional[int]]:
+        """Closest tiers at or below and at or above ``amount``"""
+        position = bisect.bisect_left(self.tiers, amount)
+        lower = self.tiers[position - 1] if position > 0 else None
+        if position < len(self.tiers) and self.tiers[position] == amount:
+            lower = amount
+        upper = self.tiers[position] if position < len(self.tiers) else None
+        return lower, upper
+
+    def get(self, bank: str, amount: int) -> Optional[str]:
+        index = self._bank_index.get(bank)
+        if index is None or amount not in self._tier_set:
+            return None
+        return self._table[index * self._slots_per_bank + amount // TIER_STEP]
+
+    def for_amount(self, amount: int) -> Dict[str, Optional[str]]:
+        """QR link of every bank for one tier; banks without a code map to None"""
+        if amount not in self._tier_set:
+            return {bank: None for bank in self.banks}
+        slot = amount // TIER_STEP
+        return {
+            bank: self._table[index * self._slots_per_bank + slot]
+            for index, bank in enumerate(self.banks)
+        }
@@ -0,0 +1,265 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from http_cache import DefaultJSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderCancelled(Exception):
+    """The request computing an entry for concurrent misses was cancelled"""
+
+
+@dataclass
+class _Flight:
+    """An entry being computed; ``stale`` once an invalidation covered its key"""
+    future: asyncio.Future
+    stale: bool = False
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A successful response reduced to bytes so any backend can store it"""
+    status_code: int
+    media_type: Optional[str]
+    headers: Tuple[Tuple[str, str], ...]
+    body: bytes
+
+    # Recomputed for every response built from the cache
+    SKIPPED_HEADERS = ("content-length", "content-type")
+
+    @classmethod
+    def from_response(cls, response: Response) -> "CachedResponse":
+        headers = tuple(
+            (name, value) for name, value in response.headers.items() if name not in cls.SKIPPED_HEADERS
+        )
+        return cls(response.status_code, response.media_type, headers, response.body)
+
+    def to_response(self) -> Response:
+        return Response(self.body, status_code=self.status_code, headers=dict(self.headers), media_type=self.media_type)
+
+    def to_bytes(self) -> bytes:
+        meta = {"status_code": self.status_code, "media_type": self.media_type, "headers": self.headers}
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        meta, _, body = data.partition(b"\n")
+        meta = json.loads(meta)
+        headers = tuple(tuple(header) for header in meta["headers"])
+        return cls(meta["status_code"], meta["media_type"], headers, body)
+
+
+class MemoryBackend:
+    """Per-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+class RedisBackend:
+    """Shared store for all workers and replicas on any Redis-protocol server"""
+
+    def __init__(self, client, namespace: str = "devservice:cache:"):
+        self._client = client
+        self._namespace = namespace
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBackend":
+        # Imported only when configured: redis is optional and slow to import
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("The redis package is required for a shared response cache")
+        # Fail fast when the server is unreachable; ResponseCache then computes the response
+        return cls(redis_asyncio.from_url(url, socket_connect_timeout=1, socket_timeout=1), **kwargs)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self._namespace + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._client.set(self._namespace + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete_prefix(self, prefix: str) -> int:
+        deleted = 0
+        batch = []
+        async for key in self._client.scan_iter(match=self._namespace + prefix + "*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await self._client.delete(*batch)
+                batch = []
+        if batch:
+            deleted += await self._client.delete(*batch)
+        return deleted
+
+
+class ResponseCache:
+    """Caches handler responses in a pluggable backend.
+
+    Concurrent misses for the same key are collapsed into a single
+    computation (per process), so an expired hot entry is rebuilt once rather
+    than by every request that arrives while it is missing. If the request
+    computing it is cancelled, one of the waiting requests takes over.
+
+    An ``invalidate`` that lands while an entry is being computed marks that
+    computation stale: its result is neither stored nor shared with requests
+    waiting for it, which compute the entry again.
+
+    A backend that fails (e.g. an unreachable Redis) is treated as a miss and
+    counted in ``errors``; requests are then answered by the handler itself.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._in_flight: Dict[str, _Flight] = {}
+
+    def _backend_failed(self, operation: str, error: Exception):
+        self.errors += 1
+        logger.warning("Response cache %s failed: %s", operation, error)
+
+    async def get_or_compute(
+        self, key: str, ttl: float, compute: Callable[[], Awaitable[Response]]
+    ) -> Response:
+        try:
+            data = await self.backend.get(key)
+        except Exception as e:
+            self._backend_failed("read", e)
+            data = None
+        if data is not None:
+            self.hits += 1
+            return CachedResponse.from_bytes(data).to_response()
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                cached = await asyncio.shield(in_flight.future)
+            except LeaderCancelled:
+                return await self.get_or_compute(key, ttl, compute)
+            if in_flight.stale:
+                return await self.get_or_compute(key, ttl, compute)
+            self.hits += 1
+            return cached.to_response()
+
+        self.misses += 1
+        flight = self._in_flight[key] = _Flight(asyncio.get_running_loop().create_future())
+        try:
+            cached = CachedResponse.from_response(await compute())
+            if 200 <= cached.status_code < 300 and not flight.stale:
+                try:
+                    await self.backend.set(key, cached.to_bytes(), ttl)
+                except Exception as e:
+                    self._backend_failed("write", e)
+            flight.future.set_result(cached)
+            return cached.to_response()
+        except asyncio.CancelledError:
+            # Waiting requests retry; the first of them computes the entry
+            flight.future.set_exception(LeaderCancelled(key))
+            flight.future.exception()
+            raise
+        except Exception as e:
+            flight.future.set_exception(e)
+            flight.future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+
+    def cached(self, ttl: float, key: Optional[Callable[..., str]] = None):
+        """Decorator caching an ``api_router`` handler's response for ``ttl`` seconds.
+
+        ``key`` receives the handler's keyword arguments and returns the cache
+        key; by default the key is the handler name plus its non-request
+        arguments. Use key prefixes that ``invalidate`` can target.
+        """
+
+        def decorator(handler):
+            @functools.wraps(handler)
+            async def wrapper(**kwargs):
+                if key is not None:
+                    cache_key = key(**kwargs)
+                else:
+                    arguments = sorted(
+                        (name, value) for name, value in kwargs.items() if not isinstance(value, Request)
+                    )
+                    cache_key = f"{handler.__name__}:{arguments}"
+
+                async def compute() -> Response:
+                    result = await handler(**kwargs)
+                    if isinstance(result, StreamingResponse):
+                        raise TypeError(f"Cannot cache a streaming response from {handler.__name__}")
+                    if isinstance(result, Response):
+                        return result
+                    return DefaultJSONResponse(jsonable_encoder(result))
+
+                return await self.get_or_compute(cache_key, ttl, compute)
+
+            return wrapper
+
+        return decorator
+
+    async def invalidate(self, prefix: str) -> int:
+        """Drop every entry whose key starts with ``prefix``; entries the backend
+        could not drop expire with their TTL"""
+        # Computations already running read data from before the change
+        for key in [key for key in self._in_flight if key.startswith(prefix)]:
+            self._in_flight.pop(key).stale = True
+        try:
+            return await self.backend.delete_prefix(prefix)
+        except Exception as e:
+            self._backend_failed("invalidation", e)
+            return 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def create_backend(url: Optional[str], max_entries: int = 1024):
+    """Shared backend for ``url`` (redis://...), falling back to in-process LRU"""
+    if url:
+        try:
+            return RedisBackend.from_url(url)
+        except Exception as e:
+            logger.warning("Shared response cache unavailable, using in-process LRU: %s", e)
+    return MemoryBackend(max_entries)
@@ -0,0 +1,216 @@
+import copy
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"\w+")
+CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Matches in the name count more than matches deep in the description
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "shortDescription": 2.0,
+    "fullDescription": 1.0,
+}
+
+# Score factor for terms reached only through type-ahead prefix expansion
+PREFIX_MATCH_WEIGHT = 0.6
+
+
+class Stemmer:
+    """Russian/English stemmer with a memo, since the vocabulary is small.
+
+    snowballstemmer imports the stemmers of every language it ships, so it is
+    loaded on the first word rather than when the module is imported.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, str] = {}
+        self._loaded = False
+        self._russian = self._english = None
+
+    def _load(self):
+        self._loaded = True
+        try:
+            import snowballstemmer
+        except ImportError:  # without a stemmer, prefix matching still covers most word forms
+            return
+        self._russian = snowballstemmer.stemmer("russian")
+        self._english = snowballstemmer.stemmer("english")
+
+    def stem(self, word: str) -> str:
+        stem = self._cache.get(word)
+        if stem is None:
+            if not self._loaded:
+                self._load()
+            if self._russian is None:
+                stem = word
+            elif CYRILLIC_RE.search(word):
+                stem = self._russian.stemWord(word)
+            else:
+                stem = self._english.stemWord(word)
+            self._cache[word] = stem
+        return stem
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.casefold().replace("ё", "е"))
+
+
+class PrefixTrie:
+    """Trie over surface words, each mapped to the stem it indexes under"""
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def add(self, word: str, stem: str):
+        node = self._root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = stem
+
+    def discard(self, word: str):
+        path = []
+        node = self._root
+        for char in word:
+            if char not in node:
+                return
+            path.append((node, char))
+            node = node[char]
+        node.pop(None, None)
+        # Prune branches that no longer lead to any word
+        for parent, char in reversed(path):
+            if parent[char]:
+                break
+            del parent[char]
+
+    def copy(self) -> "PrefixTrie":
+        clone = PrefixTrie()
+        clone._root = copy.deepcopy(self._root)
+        return clone
+
+    def stems_with_prefix(self, prefix: str, limit: int = 50) -> Set[str]:
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        stems: Set[str] = set()
+        stack = [node]
+        while stack and len(stems) < limit:
+            node = stack.pop()
+            for key, child in node.items():
+                if key is None:
+                    stems.add(child)
+                else:
+                    stack.append(child)
+        return stems
+
+
+class SearchIndex:
+    """Inverted index over product text fields with stemming and type-ahead.
+
+    Documents are added, replaced and removed one at a time, so a catalog
+    change only re-indexes the products that actually changed. An index
+    that readers may be using is not changed in place: ``copy`` it and
+    update the copy.
+    """
+
+    def __init__(self):
+        self._stemmer = Stemmer()
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._doc_words: Dict[str, Tuple[str, ...]] = {}
+        self._word_counts: Dict[str, int] = defaultdict(int)
+        self._trie = PrefixTrie()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def copy(self) -> "SearchIndex":
+        """Independent index over the same documents; the stemmer memo is shared"""
+        clone = SearchIndex()
+        clone._stemmer = self._stemmer
+        clone._postings.update((term, dict(postings)) for term, postings in self._postings.items())
+        clone._doc_terms = dict(self._doc_terms)
+        clone._doc_words = dict(self._doc_words)
+        clone._word_counts.update(self._word_counts)
+        clone._trie = self._trie.copy()
+        return clone
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: str, fields: Dict[str, str]):
+        """Index ``fields`` for ``doc_id``, replacing any previous version"""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+
+        weights: Dict[str, float] = defaultdict(float)
+        words: Set[str] = set()
+        for field, weight in FIELD_WEIGHTS.items():
+            for word in tokenize(fields.get(field) or ""):
+                weights[self._stemmer.stem(word)] += weight
+                words.add(word)
+
+        for term, weight in weights.items():
+            self._postings[term][doc_id] = weight
+        for word in words:
+            if self._word_counts[word] == 0:
+                self._trie.add(word, self._stemmer.stem(word))
+            self._word_counts[word] += 1
+        self._doc_terms[doc_id] = tuple(weights)
+        self._doc_words[doc_id] = tuple(words)
+
+    def remove(self, doc_id: str):
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        for word in self._doc_words.pop(doc_id, ()):
+            self._word_counts[word] -= 1
+            if self._word_counts[word] == 0:
+                del self._word_counts[word]
+                self._trie.discard(word)
+
+    def _idf(self, term: str) -> float:
+        return math.log(1 + len(self._doc_terms) / len(self._postings[term]))
+
+    def _term_scores(self, word: str, prefix: bool) -> Dict[str, float]:
+        """Best score per document for one query word"""
+        stem = self._stemmer.stem(word)
+        scores: Dict[str, float] = {}
+        if stem in self._postings:
+            idf = self._idf(stem)
+            for doc_id, weight in self._postings[stem].items():
+                scores[doc_id] = weight * idf
+        if prefix:
+            for term in self._trie.stems_with_prefix(word) - {stem}:
+                idf = self._idf(term) * PREFIX_MATCH_WEIGHT
+                for doc_id, weight in self._postings[term].items():
+                    scores[doc_id] = max(scores.get(doc_id, 0.0), weight * idf)
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Rank documents matching every query word; the last word is a prefix"""
+        words = tokenize(query)
+        if not words:
+            return []
+
+        totals: Optional[Dict[str, float]] = None
+        for position, word in enumerate(words):
+            scores = self._term_scores(word, prefix=position == len(words) - 1)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {doc_id: totals[doc_id] + score for doc_id, score in scores.items() if doc_id in totals}
+            if not totals:
+                return []
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+    def matches(self, query: str) -> Set[str]:
+        return {doc_id for doc_id, _ in self.search(query)}
@@ -0,0 +1,46 @@
+import functools
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List
+
+from qr import QRTable
+
+# Seed catalog, bank list and payment QR links; read on first use, not at import
+SEED_PATH = Path(__file__).parent / "data" / "seed.json"
+
+
+@functools.lru_cache(maxsize=None)
+def load() -> dict:
+    with open(SEED_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    # JSON object keys are strings; QR tiers are amounts
+    data["qr_codes"] = {
+        bank: {int(amount): url for amount, url in amounts.items()} for bank, amounts in data["qr_codes"].items()
+    }
+    return data
+
+
+def products() -> List[dict]:
+    """Products upserted into the catalog whenever the seed file changes"""
+    return load()["products"]
+
+
+@functools.lru_cache(maxsize=None)
+def digest() -> str:
+    """Content hash of the seed file, recorded once its products are applied"""
+    return hashlib.sha256(SEED_PATH.read_bytes()).hexdigest()
+
+
+def banks() -> Dict[str, dict]:
+    return load()["banks"]
+
+
+def qr_codes() -> Dict[str, Dict[int, str]]:
+    return load()["qr_codes"]
+
+
+@functools.lru_cache(maxsize=None)
+def qr_table() -> QRTable:
+    """Flat, immutable lookup table built once from the QR links"""
+    return QRTable(qr_codes(), banks())
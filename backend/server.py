@@ -1,31 +1,95 @@
+import asyncio
+import hmac
+import io
 import logging
 import os
+import tempfile
+import time
 import uuid
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import List, Literal, Optional
 
 from dotenv import load_dotenv
-from dotenv import load_dotenv
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from motor.motor_asyncio import AsyncIOMotorClient
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from pymongo import MongoClient
 from pydantic import BaseModel, Field
-from starlette.responses import FileResponse
+
+from carts import CartMaintenance, CartVersionConflict, CartWriteBuffer
+from catalog import SORT_ORDERS, CatalogCache
+from catalog_import import FORMATS as IMPORT_FORMATS, KEYS as IMPORT_KEYS
+from catalog_import import detect_format, import_catalog, read_rows
+from catalog_watch import CATALOG_VERSION_ID, CatalogWatcher
+from database import Database, PoolSettings
+from exports import FORMATS as EXPORT_FORMATS, ExportSpec, InvalidExportCursor, export_batches, stream_export
+from http_cache import DefaultJSONResponse, json_response
+from images import WIDTHS as IMAGE_WIDTHS, DirectoryImageSource, DiskCache, HttpImageSource, ImageProxy
+from images import ImageSourceError, negotiate_format, parse_variant, source_version, srcset
+from indexes import ORDER_INDEXES, PRODUCT_INDEXES, QueryPlanError, cart_indexes, ensure_indexes, verify_query_plans
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    LoopLagMonitor,
+    MetricsMiddleware,
+    MetricsRegistry,
+    MongoCommandMetrics,
+    RequestMetrics,
+)
+from orders import (
+    AWAITING_PAYMENT,
+    ORDER_PROJECTION,
+    IdempotencyConflict,
+    OrderExpiry,
+    apply_transitions,
+    create_order,
+    find_by_idempotency_key,
+    new_order,
+    request_fingerprint,
+)
+from prerender import PageRenderer
+from profiling import ProfilingMiddleware, ProfilingSettings
+from response_cache import ResponseCache, create_backend
+import seed_data
+from static_assets import StaticAssetIndex
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# MongoDB connection (pool settings come from MONGO_* variables, see database.py)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+metrics_registry = MetricsRegistry()
+database = Database.from_env(event_listeners=[MongoCommandMetrics(metrics_registry)])
+client = database.client
+db = database.db
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect and warm the Mongo pool before serving, release everything on shutdown"""
+    async with database.lifespan(attempts=int(os.environ.get('MONGO_CONNECT_ATTEMPTS', '5'))):
+        await startup()
+        try:
+            yield
+        finally:
+            await shutdown()
+
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=DefaultJSONResponse)
+# Opt-in request profiling (PROFILE_ENABLED / PROFILE_TOKEN, see profiling.py)
+profiling_settings = ProfilingSettings.from_env()
+if profiling_settings.active:
+    app.add_middleware(ProfilingMiddleware, settings=profiling_settings)
+app.add_middleware(MetricsMiddleware, metrics=RequestMetrics(metrics_registry))
+loop_lag = LoopLagMonitor(metrics_registry)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -55,845 +119,446 @@ class Cart(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     session_id: str
     items: List[CartItem]
+    version: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
-# QR codes data for different banks and amounts
-QR_CODES = {
-    "sovcombank": {
-        500: "https://qr.nspk.ru/AD200035F0DUH05G8CTO9TU18246VMSC?type=02&bank=100000000013&sum=50000&cur=RUB&crc=8FC7",
-        1000: "https://qr.nspk.ru/AD20001SUJS2BNVC8JQPQ47P7UHLEN8D?type=02&bank=100000000013&sum=100000&cur=RUB&crc=03CF",
-        1500: "https://qr.nspk.ru/BD200027AGDORBUU9LNOKG3RHNJVJ36C?type=02&bank=100000000013&sum=150000&cur=RUB&crc=B501",
-        2000: "https://qr.nspk.ru/AD20005ESSIHKG3U846PN75EISQUVSN0?type=02&bank=100000000013&sum=200000&cur=RUB&crc=75CE",
-        2500: "https://qr.nspk.ru/AD2000283T1SCG1M8JC9265SFAHMBREI?type=02&bank=100000000013&sum=250000&cur=RUB&crc=E079",
-        3000: "https://qr.nspk.ru/AD20003EHA4GJ8V98Q5B0M5FAP2QIUHH?type=02&bank=100000000013&sum=300000&cur=RUB&crc=8E32",
-        3500: "https://qr.nspk.ru/BD20003S0FMJIBBF8F5PF6EJ3N2V22UF?type=02&bank=100000000013&sum=350000&cur=RUB&crc=92E5",
-        4000: "https://qr.nspk.ru/AD200014770NKLJV9LPOA6HENSQFF70S?type=02&bank=100000000013&sum=400000&cur=RUB&crc=CAA4",
-        4500: "https://qr.nspk.ru/AD200010J8SM00P98EBOD1K3A98KRR62?type=02&bank=100000000013&sum=450000&cur=RUB&crc=2A81",
-        5000: "https://qr.nspk.ru/BD20001ECKRBFK6J8KMOP6BHMTCLU83D?type=02&bank=100000000013&sum=500000&cur=RUB&crc=E03C",
-        5500: "https://qr.nspk.ru/BD20004CHNJ4NO3V8P8QJR96Q543OD91?type=02&bank=100000000013&sum=550000&cur=RUB&crc=861D",
-        6000: "https://qr.nspk.ru/BD20002FONGUA01V90OOOI6R2E88JI2S?type=02&bank=100000000013&sum=600000&cur=RUB&crc=D2FD",
-        6500: "https://qr.nspk.ru/BD20001L9DGM854A9M2BHIDCNT8ENQOM?type=02&bank=100000000013&sum=650000&cur=RUB&crc=7EB6",
-        7000: "https://qr.nspk.ru/BD20000KFB69F9L49SO8DQFKRD6UF5ED?type=02&bank=100000000013&sum=700000&cur=RUB&crc=AEAA",
-        7500: "https://qr.nspk.ru/BD2000044JK2M8408E68SR2G979D998H?type=02&bank=100000000013&sum=750000&cur=RUB&crc=C532",
-        8000: "https://qr.nspk.ru/BD20003JN7OE7RQE8PN8T0P0QL2UF249?type=02&bank=100000000013&sum=800000&cur=RUB&crc=8044",
-        8500: "https://qr.nspk.ru/BD200008LQ4MIKAN9VSP3QIMASH1N8BV?type=02&bank=100000000013&sum=850000&cur=RUB&crc=C3F2",
-        9000: "https://qr.nspk.ru/BD200037VI5M70MK8CN86N47MDFVVVTE?type=02&bank=100000000013&sum=900000&cur=RUB&crc=59FA",
-        9500: "https://qr.nspk.ru/BD20007QONN27TLA8Q2R1P3SJLAMKOMA?type=02&bank=100000000013&sum=950000&cur=RUB&crc=B049",
-        10000: "https://qr.nspk.ru/AD20006SSC2J4ALS8JNAOPS8VBV5QR3M?type=02&bank=100000000013&sum=1000000&cur=RUB&crc=1590",
-        10500: "https://qr.nspk.ru/BD2000102GPB37QV93BRTPLFVCUPN5AS?type=02&bank=100000000013&sum=1050000&cur=RUB&crc=78D0",
-        11000: "https://qr.nspk.ru/AD20003QCCDTM1VS9CPPVP4FR72P9SMH?type=02&bank=100000000013&sum=1100000&cur=RUB&crc=9A5F",
-        11500: "https://qr.nspk.ru/AD200072B49SO4AP8NM8PEINO2E9CV5H?type=02&bank=100000000013&sum=1150000&cur=RUB&crc=6F1E",
-        12000: "https://qr.nspk.ru/BD20001460E5AQBA8RRPVNF27SVUH1SM?type=02&bank=100000000013&sum=1200000&cur=RUB&crc=2FA4",
-        12500: "https://qr.nspk.ru/BD20005R5C9ML69B9J5OQO79FRDUMJMJ?type=02&bank=100000000013&sum=1250000&cur=RUB&crc=41F4",
-        13000: "https://qr.nspk.ru/BD20002C2UF9L57595JBL1TP62ISQ4DR?type=02&bank=100000000013&sum=1300000&cur=RUB&crc=32EE",
-        13500: "https://qr.nspk.ru/AD20007EE3SIROEQ8ASRRFR8E4FOO367?type=02&bank=100000000013&sum=1350000&cur=RUB&crc=9A78",
-        14000: "https://qr.nspk.ru/BD20000PCCBRE7I48EDBFIHS0SC6GH07?type=02&bank=100000000013&sum=1400000&cur=RUB&crc=75DA",
-        14500: "https://qr.nspk.ru/BD20005KU77LQ8PC9P5ACJECTK3L1N0L?type=02&bank=100000000013&sum=1450000&cur=RUB&crc=1291",
-        15000: "https://qr.nspk.ru/BD200024M6T0A91L89BBC00E9SORJU59?type=02&bank=100000000013&sum=1500000&cur=RUB&crc=A9CE",
-        16000: "https://qr.nspk.ru/BD20004Q8LU5SPE48TUAPJN0CNADVKFF?type=02&bank=100000000013&sum=1600000&cur=RUB&crc=F216",
-        17000: "https://qr.nspk.ru/BD20004N5AEGLP808B68A2C68U2UEA29?type=02&bank=100000000013&sum=1700000&cur=RUB&crc=0122",
-        18000: "https://qr.nspk.ru/BD200064OGJMLDSR8PG9EF0J7H9C29T5?type=02&bank=100000000013&sum=1800000&cur=RUB&crc=5695",
-        19000: "https://qr.nspk.ru/AD20003DU28GCHVF9AEOE7VL6TQEHKCR?type=02&bank=100000000013&sum=1900000&cur=RUB&crc=E1B8",
-        20000: "https://qr.nspk.ru/AD20007VQNBVL0L09GBQB98BKP8T5RBV?type=02&bank=100000000013&sum=2000000&cur=RUB&crc=1A95",
-        25000: "https://qr.nspk.ru/AD20007KVNVO0AD085MBNFSFI51KQED3?type=02&bank=100000000013&sum=2500000&cur=RUB&crc=F435",
-        30000: "https://qr.nspk.ru/BD2000092NBTIPG79QDON0A7HVG2MG4N?type=02&bank=100000000013&sum=3000000&cur=RUB&crc=EAA8",
-        35000: "https://qr.nspk.ru/BD200074ICL732SD9R68BGKSVI79CJ10?type=02&bank=100000000013&sum=3500000&cur=RUB&crc=6F9B",
-        40000: "https://qr.nspk.ru/AD20000IQ8NI6QFA8MFBGJK2P25KSV2S?type=02&bank=100000000013&sum=4000000&cur=RUB&crc=DECA",
-        45000: "https://qr.nspk.ru/AD20003ASB5IM32H8HI9NIO0E400BE52?type=02&bank=100000000013&sum=4500000&cur=RUB&crc=CD4C",
-        50000: "https://qr.nspk.ru/AD200047UPA31SRG8LGPVNMB6DOH4QRA?type=02&bank=100000000013&sum=5000000&cur=RUB&crc=FEA3"
-    },
-    "sber": {
-        500: "https://b2b.cbrpay.ru/AS2B003EO04CPDQC9UE94HBVHFN6JJ7I",
-        1000: "https://b2b.cbrpay.ru/AS2B001EJU9ICOR482KB5FQKK7AUG8Q5",
-        1500: "https://b2b.cbrpay.ru/AS2B0007NT2VTOPA8IIBA67ISLE9C58D",
-        2000: "https://b2b.cbrpay.ru/AS2B002DGOVF1PIF8VHAC43JDBMF5MVO",
-        2500: "https://b2b.cbrpay.ru/AS2B001KEL5RCAAN8PIQDN4HCNPKLHUS",
-        3000: "https://b2b.cbrpay.ru/AS2B00396N0DM6OR9C4B6CG7E5I13TM7",
-        3500: "https://b2b.cbrpay.ru/AS2B002AE865QOOG82SB51SG3RKG27FN",
-        4000: "https://b2b.cbrpay.ru/AS2B0016GSLE5F3S8GUPTEI5J8SSA0UF",
-        4500: "https://b2b.cbrpay.ru/AS2B003BP5COV7118MTO9DFN6D4D2DER",
-        5000: "https://b2b.cbrpay.ru/AS2B0066AHIJ9D3M9FQRGINAD9C0QJNR",
-        5500: "https://b2b.cbrpay.ru/AS2B0046045VNPSE9S5OH4VL1G7JBNLG",
-        6000: "https://b2b.cbrpay.ru/AS2B004FV1KHOROO8KER2TF3CF76AT7D",
-        6500: "https://b2b.cbrpay.ru/AS2B002KKCLS5ESP9V2R7JA0CT8R0D6A",
-        7000: "https://b2b.cbrpay.ru/AS2B000H0DS7O8KP80KQ4AU37U3MMOE4",
-        7500: "https://b2b.cbrpay.ru/AS2B000C5LFHRHQT8UHPU74U2CV1BGPF",
-        8000: "https://b2b.cbrpay.ru/AS2B001VU749H5PL903RUDC8F03LTA2F",
-        8500: "https://b2b.cbrpay.ru/AS2B0037LAUP1G5J8R6OISMFF5F8J446",
-        9000: "https://b2b.cbrpay.ru/AS2B00758FHDODMT9UVO97V0G96MML1I",
-        9500: "https://b2b.cbrpay.ru/AS2B006S245B11LE8SRQ2O0C751NSREF",
-        10000: "https://b2b.cbrpay.ru/AS2B004CVK5B76CS81IBHOF01FHSFVTC",
-        10500: "https://b2b.cbrpay.ru/AS2B007G22KR2N7U9CJ8825R6U9O4FGK",
-        11000: "https://b2b.cbrpay.ru/AS2B002Q670QCK0292V8RAMK34V37VSE",
-        11500: "https://b2b.cbrpay.ru/AS2B007P7AAHIJNJ97FP8TK4K84P5G95",
-        12000: "https://b2b.cbrpay.ru/AS2B001IG49BFIGO8P9A75J2K1LTBNQP",
-        12500: "https://b2b.cbrpay.ru/AS2B0018JCGV1I24954AB826JERBBV0A",
-        13000: "https://b2b.cbrpay.ru/AS2B003M31JAJ1579F7OMT8Q5LBTSI6C",
-        13500: "https://b2b.cbrpay.ru/AS2B004TKQEU8B8G9J4RQ1754QQU93LN",
-        14000: "https://b2b.cbrpay.ru/AS2B0077SS131JTG9VMBTFHH4NUHO7FJ",
-        14500: "https://b2b.cbrpay.ru/AS2B0011B1C8C1JF92AQRCTI61KKBTGA",
-        15000: "https://b2b.cbrpay.ru/AS2B002CNLVRIARR9HIANGA7NRVP7QQQ",
-        16000: "https://b2b.cbrpay.ru/AS2B00638S6FOHMH9UT8U0P65SFPCUR8",
-        17000: "https://b2b.cbrpay.ru/AS2B0028QOB4M4DO8SV9B5HT41D2R6BA",
-        18000: "https://b2b.cbrpay.ru/AS2B007V9AMHDJDR898OFREK8L79AMA5",
-        19000: "https://b2b.cbrpay.ru/AS2B0061T14PP0C89IGPD0HFHGRB1RH2",
-        20000: "https://b2b.cbrpay.ru/AS2B0014P10SKBUL9SDA24OMFODQFF8H",
-        25000: "https://b2b.cbrpay.ru/AS2B003U5618RV5B882QNC8MGV4F9H9C",
-        30000: "https://b2b.cbrpay.ru/AS2B00192MTUDK2P83V8HP7GI9JTJH34",
-        35000: "https://b2b.cbrpay.ru/AS2B001OMT1HS0EC8IRPLDESUAMHHIGA",
-        40000: "https://b2b.cbrpay.ru/AS2B005AE5FP5297868BQ16D777QJ68P",
-        45000: "https://b2b.cbrpay.ru/AS2B003IHAKLMOCU8FEO5K1MD9K2RIL3",
-        50000: "https://b2b.cbrpay.ru/AS2B002JJJISCA7Q8A4PG4LQSTGRNTNC"
-    },
-    "vtb": {
-        500: "https://b2b.cbrpay.ru/AS2B0044B1P73FAH8JE97DEFN80JEGQR",
-        1000: "https://b2b.cbrpay.ru/AS2B002P6HDIQQEE94L9U1MMTU420UGG",
-        1500: "https://b2b.cbrpay.ru/AS2B00790ASFMOBI90LRV8DAPS6E9B53",
-        2000: "https://b2b.cbrpay.ru/AS2B002S5FEFJ4NM9D8Q7M5PGA1VPR9I",
-        2500: "https://b2b.cbrpay.ru/BS2B004H9I2NEFK280IRIVNVGK8O8QVL",
-        3000: "https://b2b.cbrpay.ru/BS2B005E6QHCPQ429FU8M2EH4CUPGG83",
-        3500: "https://b2b.cbrpay.ru/BS2B0009CR5NPV3H95JPHCFMGGI35CP9",
-        4000: "https://b2b.cbrpay.ru/AS2B005JISMST5O38NURH7VKC9RCBDQ6",
-        4500: "https://b2b.cbrpay.ru/BS2B00181B9VP6RP88EPONR55CV70KMP",
-        5000: "https://b2b.cbrpay.ru/AS2B005GL2G7NFC38ETQOPF8ELI1KKPP",
-        5500: "https://b2b.cbrpay.ru/AS2B003J70EL9T8U955BHDVRAMQ2Q88S",
-        6000: "https://b2b.cbrpay.ru/BS2B00319CDBR3J28ULRCDUN702CADTR",
-        6500: "https://b2b.cbrpay.ru/BS2B006VCOVG3U9097SO8LA8IIU21PTM",
-        7000: "https://b2b.cbrpay.ru/AS2B003T1HM4IJIR81A8I8B17T4I8SJI",
-        7500: "https://b2b.cbrpay.ru/AS2B002H2ER9P60293BQ5E024ISC27CJ",
-        8000: "https://b2b.cbrpay.ru/AS2B000OR6F6LLG09EMB5IN8PLF1TEPA",
-        8500: "https://b2b.cbrpay.ru/AS2B003L17RU8QJ38D0QFR0PCEQCDAU4",
-        9000: "https://b2b.cbrpay.ru/BS2B003GG852C5OF8BNRITH7AN70I1UB",
-        9500: "https://b2b.cbrpay.ru/BS2B000J4HKRM51T85R99IO4JOJV4G0C",
-        10000: "https://b2b.cbrpay.ru/AS2B000N2NVEUQPI86UB38A5OOT82AKO",
-        10500: "https://b2b.cbrpay.ru/BS2B004DDQCMF6HJ90HOV9OBOJ9TE8EL",
-        11000: "https://b2b.cbrpay.ru/AS2B0035R4O978GQ8EG91RTADQ21PFGM",
-        11500: "https://b2b.cbrpay.ru/AS2B0072AE066UMG931P4OPHIF6PN2D2",
-        12000: "https://b2b.cbrpay.ru/BS2B005GMBNSAD3P9Q4ARJOTV0P7N9V2",
-        12500: "https://b2b.cbrpay.ru/AS2B004G4RNDAAKB8JD86OIUOVEQ5UAU",
-        13000: "https://b2b.cbrpay.ru/BS2B0013ECPP2HTD8A28HB2DA2OIUCH7",
-        13500: "https://b2b.cbrpay.ru/BS2B000UGM22ATRK8459CO6FAQ1Q69K7",
-        14000: "https://b2b.cbrpay.ru/AS2B001U5NT750KA8C6ORD3OFPT5P9RQ",
-        14500: "https://b2b.cbrpay.ru/AS2B005UG5CU81JG9A5Q52RLD90Q39HH",
-        15000: "https://b2b.cbrpay.ru/BS2B00610MGSLA0L9HEO8VEMNDMOQ0RB",
-        16000: "https://b2b.cbrpay.ru/BS2B007UQLD59IBT90VBGAJAM7JPARUA",
-        17000: "https://b2b.cbrpay.ru/BS2B000N0G43EC929V0B3NRRVK4LKLQO",
-        18000: "https://b2b.cbrpay.ru/AS2B0006OKLUL8H19DSA5GV9C258S0UJ",
-        19000: "https://b2b.cbrpay.ru/AS2B002TBNFT5SOF80QBA09HNAJ5R4A7",
-        20000: "https://b2b.cbrpay.ru/BS2B002HG8T9RP519L7A0E2HCDR8EDIT",
-        25000: "https://b2b.cbrpay.ru/BS2B00614BC3P02C8IPA1CKVJF32C3NF",
-        30000: "https://b2b.cbrpay.ru/AS2B0051AA1D1J5J9OB8T2O7S1EV27CA",
-        35000: "https://b2b.cbrpay.ru/AS2B0009R9LHNTC88NOBL0LTUQC4RTTN",
-        40000: "https://b2b.cbrpay.ru/BS2B0073SSON68VV8D9O56UGMGGP25HV",
-        45000: "https://b2b.cbrpay.ru/BS2B002M0FS1IT7P8599OHV06780BC70",
-        50000: "https://b2b.cbrpay.ru/AS2B001BQ78EI0AO8LIA7FVD1PR86B9F"
-    },
-    "tbank": {
-        500: "https://b2b.cbrpay.ru/AS2B004QSVRARGL690AOACJUOEFPCUMF",
-        1000: "https://b2b.cbrpay.ru/BS2B005AHRPESB6783OQ5EL1016T9SEK",
-        1500: "https://b2b.cbrpay.ru/AS2B006T2052OUDO8LGO452NESHHHO9B",
-        2000: "https://b2b.cbrpay.ru/AS2B002RQJMNQ92J9E3B6VOJRMB9HG3P",
-        2500: "https://b2b.cbrpay.ru/BS2B0053GLAETCR69PVQR9NKNBS0OLS9",
-        3000: "https://b2b.cbrpay.ru/AS2B00610LB6C9LJ9KLBC84HUCTT4N62",
-        3500: "https://b2b.cbrpay.ru/BS2B001BKU84V2H99VQQ448H764O94DV",
-        4000: "https://b2b.cbrpay.ru/BS2B007UMADOE5IP8C99D31MA4918440",
-        4500: "https://b2b.cbrpay.ru/AS2B0078B1OR8GQN92EPQ58I80V62T1S",
-        5000: "https://b2b.cbrpay.ru/AS2B001IQJ7I36238RHA7DJO4EH3QMUU",
-        5500: "https://b2b.cbrpay.ru/BS2B002CNVL30U2G8K1PV6360V2U3J4N",
-        6000: "https://b2b.cbrpay.ru/BS2B002NDVOKHR3486B8INKF6RE439PA",
-        6500: "https://b2b.cbrpay.ru/AS2B007LTONB5ONK9FCO2HE1I0QO5VAA",
-        7000: "https://b2b.cbrpay.ru/BS2B001KQN192QGI95GBRI9COCQAIT9O",
-        7500: "https://b2b.cbrpay.ru/BS2B0016TA0G143L8NNO9VKAT0CTUEUF",
-        8000: "https://b2b.cbrpay.ru/BS2B000RNPIB3Q3P8589GK9N9NUKPJ9K",
-        8500: "https://b2b.cbrpay.ru/AS2B002EJ25U7Q2D9RDB9IRBJ9DC4CIJ",
-        9000: "https://b2b.cbrpay.ru/AS2B001101027E7J912QIBBHVVLFR10I",
-        9500: "https://b2b.cbrpay.ru/AS2B005QPQAI70888MVPN51ICEQSKO43",
-        10000: "https://b2b.cbrpay.ru/BS2B002U9HTIL3VA8N19KG10A1DJK77T",
-        10500: "https://b2b.cbrpay.ru/AS2B0000MUUBIPLF8B98I9JK8872VIIB",
-        11000: "https://b2b.cbrpay.ru/BS2B00457CVM5EV792JQTSFV6IQPJR3M",
-        11500: "https://b2b.cbrpay.ru/AS2B000I4I7D7PAA87S8OFNOUCGB5NNQ",
-        12000: "https://b2b.cbrpay.ru/AS2B005FCJ18550G940B9M969V4GV75N",
-        12500: "https://b2b.cbrpay.ru/BS2B0043OMMIGM7G9IFB08UKT3HB5QVE",
-        13000: "https://b2b.cbrpay.ru/BS2B001NFM16C36S8UVAIPFQFF9JA2BH",
-        13500: "https://b2b.cbrpay.ru/AS2B007QADPPACBO9HQB5DN24AH3LRF5",
-        14000: "https://b2b.cbrpay.ru/AS2B007QADPPACBO9HQB5DN24AH3LRF5",
-        14500: "https://b2b.cbrpay.ru/BS2B0064P1FEDGS984RQFH0IBQPM18P8",
-        15000: "https://b2b.cbrpay.ru/AS2B004KRPSQNJO59Q9P3P4K7B9Q4LQ1",
-        16000: "https://b2b.cbrpay.ru/AS2B0030GM0LF9LQ9RARDG7H4205D5VB",
-        17000: "https://b2b.cbrpay.ru/AS2B003QBKUDFG3B8LI9LK10HM6OUHBC",
-        18000: "https://b2b.cbrpay.ru/BS2B003BG3E2TGNU84A8HI1R8H97BJ9I",
-        19000: "https://b2b.cbrpay.ru/BS2B001MNPMNA39I8RFQQVFEMTUJ84NG",
-        20000: "https://b2b.cbrpay.ru/AS2B003686HKA12T8F9R3527GMV6GJH9",
-        25000: "https://b2b.cbrpay.ru/BS2B002J2KKDVS5I9MA86FC0P03BO7E0",
-        30000: "https://b2b.cbrpay.ru/AS2B002Q8QT5GMPR8F4RTTCEVQ7L6NS3",
-        35000: "https://b2b.cbrpay.ru/BS2B001FM5QOPQU88T5832M4SNRDHP4F",
-        40000: "https://b2b.cbrpay.ru/BS2B0041J3PK0KTS8JSO1NM1ML3C8AFT",
-        45000: "https://b2b.cbrpay.ru/AS2B007J5IQ04S1L85H929R2UN1496UK",
-        50000: "https://b2b.cbrpay.ru/AS2B001LSRACR5GS99AB47GNCNDA94F9"
-    }
-}
+class CartSave(BaseModel):
+    session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    items: List[CartItem] = []
+    version: Optional[int] = None
 
-BANKS = {
-    "sovcombank": {"name": "Совкомбанк", "icon": "🏦"},
-    "sber": {"name": "Сбер", "icon": "💚"},
-    "vtb": {"name": "ВТБ", "icon": "🔵"},
-    "tbank": {"name": "Т-Банк", "icon": "⚡"}
-}
+
+class CartItemChange(BaseModel):
+    quantity: int = 1
+    version: Optional[int] = None
+
+
+class CartItemAdd(CartItemChange):
+    product_id: str
+
+
+class OrderCreate(BaseModel):
+    session_id: str
+    bank: str
+    # Defaults to the items of the session's cart, at the version the client
+    # last saw (required then, so a change still buffered elsewhere is not missed)
+    items: Optional[List[CartItem]] = None
+    cart_version: Optional[int] = None
+
+
+class OrderStatusChange(BaseModel):
+    order_id: str
+    status: Literal["paid", "cancelled", "expired"]
+
+
+class OrderStatusUpdate(BaseModel):
+    changes: List[OrderStatusChange] = Field(max_length=1000)
+    reason: Optional[str] = None
 
 
 def get_qr_code(bank: str, amount: int) -> str:
     """Get QR code URL for specific bank and amount"""
-    if bank in QR_CODES and amount in QR_CODES[bank]:
-        return QR_CODES[bank][amount]
-    return None
-
-
-# Sample products data with correct pricing
-PRODUCTS_DATA = [
-    {
-            "name": "Простая HTML страница",
-            "shortDescription": "Базовая HTML страница с минимальным дизайном",
-            "fullDescription": "Создание простой HTML страницы с базовым дизайном и основной информацией о компании. Подходит для быстрого старта онлайн присутствия.",
-            "price": 500,
-            "deliveryTime": "1-2 дня",
-            "icon": "📄",
-            "imageUrl": "https://static.tildacdn.com/tild3262-3039-4939-b361-663935326330/20250719_0357____sim.png",
-            "features": ["HTML разметка", "Базовые стили", "Контактная информация"],
-            "technologies": ["HTML5", "CSS3"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Визитка сайт",
-            "shortDescription": "Простой сайт-визитка для малого бизнеса",
-            "fullDescription": "Разработка сайта-визитки с информацией о компании, услугах и контактами. Включает адаптивный дизайн и базовую SEO оптимизацию.",
-            "price": 1000,
-            "deliveryTime": "1-2 дня",
-            "icon": "💼",
-            "imageUrl": "https://static.tildacdn.com/tild6464-3166-4562-b363-343633623532/20250719_0358____sim.png",
-            "features": ["О компании", "Услуги", "Контакты", "Адаптивный дизайн"],
-            "technologies": ["HTML5", "CSS3", "JavaScript"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Лендинг с формой",
-            "shortDescription": "Лендинг страница с формой обратной связи",
-            "fullDescription": "Создание лендинг страницы с призывом к действию и формой для сбора контактов потенциальных клиентов.",
-            "price": 1500,
-            "deliveryTime": "2-3 дня",
-            "icon": "📝",
-            "imageUrl": "https://static.tildacdn.com/stor3033-6238-4636-b430-646562353430/63843752.png",
-            "features": ["Форма обратной связи", "Призыв к действию", "Базовая аналитика"],
-            "technologies": ["HTML5", "CSS3", "JavaScript", "PHP"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Многостраничный сайт",
-            "shortDescription": "Сайт с несколькими страницами и навигацией",
-            "fullDescription": "Разработка многостраничного сайта с навигацией, несколькими разделами и базовой системой управления контентом.",
-            "price": 2000,
-            "deliveryTime": "3-4 дня",
-            "icon": "🌐",
-            "imageUrl": "https://static.tildacdn.com/stor3761-3665-4831-b530-353134323764/93401530.png",
-            "features": ["Навигационное меню", "Несколько страниц", "Галерея изображений"],
-            "technologies": ["HTML5", "CSS3", "JavaScript"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Сайт с CMS",
-            "shortDescription": "Сайт с системой управления контентом",
-            "fullDescription": "Создание сайта с простой системой управления контентом для самостоятельного редактирования информации.",
-            "price": 2500,
-            "deliveryTime": "4-5 дней",
-            "icon": "⚙️",
-            "imageUrl": "https://static.tildacdn.com/tild3135-3466-4630-b932-663164646565/20250719_0400_____si.png",
-            "features": ["Система управления", "Редактор контента", "Загрузка изображений"],
-            "technologies": ["WordPress", "PHP", "MySQL"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Портфолио сайт",
-            "shortDescription": "Сайт-портфолио для демонстрации работ",
-            "fullDescription": "Разработка портфолио сайта для демонстрации работ и услуг с галереей проектов и описаниями.",
-            "price": 3000,
-            "deliveryTime": "4-5 дней",
-            "icon": "🎨",
-            "imageUrl": "https://static.tildacdn.com/tild3361-6635-4230-a638-663630326661/20250719_0359____sim.png",
-            "features": ["Галерея работ", "Описания проектов", "Контактная форма"],
-            "technologies": ["HTML5", "CSS3", "JavaScript"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Блог сайт",
-            "shortDescription": "Сайт для ведения блога и публикаций",
-            "fullDescription": "Создание блог-сайта с возможностью публикации статей, комментариев и подписки на обновления.",
-            "price": 3500,
-            "deliveryTime": "5-6 дней",
-            "icon": "📰",
-            "imageUrl": "https://static.tildacdn.com/stor6137-6261-4164-a461-643232623932/21775521.png",
-            "features": ["Система публикаций", "Комментарии", "Поиск по блогу"],
-            "technologies": ["WordPress", "PHP", "MySQL"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Каталог товаров",
-            "shortDescription": "Сайт-каталог с товарами без покупки",
-            "fullDescription": "Разработка каталога товаров с фильтрацией, поиском и детальными страницами продуктов без функций покупки.",
-            "price": 4000,
-            "deliveryTime": "6-7 дней",
-            "icon": "📋",
-            "imageUrl": "https://static.tildacdn.com/stor3132-6635-4365-a336-343664343038/15311280.png",
-            "features": ["Каталог товаров", "Система фильтров", "Поиск", "Детальные страницы"],
-            "technologies": ["PHP", "MySQL", "JavaScript"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Форум сайт",
-            "shortDescription": "Простой форум для обсуждений",
-            "fullDescription": "Создание форума с регистрацией пользователей, созданием тем и системой комментариев.",
-            "price": 4500,
-            "deliveryTime": "7-8 дней",
-            "icon": "💬",
-            "imageUrl": "https://static.tildacdn.com/stor6339-3837-4265-a639-316436316466/96992312.png",
-            "features": ["Регистрация пользователей", "Создание тем", "Система комментариев"],
-            "technologies": ["PHP", "MySQL", "JavaScript"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Новостной сайт",
-            "shortDescription": "Сайт для публикации новостей",
-            "fullDescription": "Разработка новостного сайта с категориями новостей, поиском и админ-панелью для управления.",
-            "price": 5000,
-            "deliveryTime": "7-8 дней",
-            "icon": "📺",
-            "imageUrl": "https://static.tildacdn.com/stor3938-6561-4131-a634-333063303364/92873101.png",
-            "features": ["Категории новостей", "Админ-панель", "Поиск новостей"],
-            "technologies": ["WordPress", "PHP", "MySQL"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Интеграция с API",
-            "shortDescription": "Подключение внешних сервисов через API",
-            "fullDescription": "Интеграция сайта с внешними API сервисами для получения данных или отправки информации.",
-            "price": 5500,
-            "deliveryTime": "3-4 дня",
-            "icon": "🔗",
-            "imageUrl": "https://static.tildacdn.com/stor3136-3864-4664-b930-353330343964/95301302.png",
-            "features": ["API интеграция", "Обработка данных", "Синхронизация"],
-            "technologies": ["PHP", "cURL", "JSON"],
-            "category": "Интеграции"
-        },
-        {
-            "name": "Мобильная адаптация",
-            "shortDescription": "Адаптация сайта под мобильные устройства",
-            "fullDescription": "Адаптация существующего сайта для корректного отображения на мобильных устройствах и планшетах.",
-            "price": 6000,
-            "deliveryTime": "4-5 дней",
-            "icon": "📱",
-            "imageUrl": "https://static.tildacdn.com/stor3263-3936-4532-a139-356366386335/74316926.png",
-            "features": ["Мобильная версия", "Адаптивный дизайн", "Оптимизация скорости"],
-            "technologies": ["CSS3", "JavaScript", "Bootstrap"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "SEO оптимизация",
-            "shortDescription": "Оптимизация сайта для поисковых систем",
-            "fullDescription": "Комплексная SEO оптимизация сайта для улучшения позиций в поисковых системах.",
-            "price": 6500,
-            "deliveryTime": "5-6 дней",
-            "icon": "📈",
-            "imageUrl": "https://static.tildacdn.com/stor6264-3263-4539-b065-363233393231/13045211.png",
-            "features": ["Мета-теги", "Карта сайта", "Оптимизация контента"],
-            "technologies": ["HTML5", "Google Analytics", "Яндекс.Метрика"],
-            "category": "Маркетинг"
-        },
-        {
-            "name": "Интернет-магазин базовый",
-            "shortDescription": "Простой интернет-магазин с корзиной",
-            "fullDescription": "Создание базового интернет-магазина с каталогом, корзиной и простой системой заказов.",
-            "price": 7000,
-            "deliveryTime": "8-10 дней",
-            "icon": "🛒",
-            "imageUrl": "https://static.tildacdn.com/stor3162-3532-4733-b836-343063366234/89969513.png",
-            "features": ["Каталог товаров", "Корзина", "Оформление заказов"],
-            "technologies": ["PHP", "MySQL", "JavaScript"],
-            "category": "E-commerce"
-        },
-        {
-            "name": "Система регистрации",
-            "shortDescription": "Система регистрации и авторизации пользователей",
-            "fullDescription": "Разработка системы регистрации пользователей с личным кабинетом и управлением профилем.",
-            "price": 7500,
-            "deliveryTime": "5-6 дней",
-            "icon": "👤",
-            "imageUrl": "https://static.tildacdn.com/stor6232-3335-4430-a235-386135346339/87774497.png",
-            "features": ["Регистрация", "Авторизация", "Личный кабинет"],
-            "technologies": ["PHP", "MySQL", "Sessions"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Чат-бот для сайта",
-            "shortDescription": "Простой чат-бот для сайта",
-            "fullDescription": "Создание чат-бота для автоматических ответов на вопросы посетителей сайта.",
-            "price": 8000,
-            "deliveryTime": "4-5 дней",
-            "icon": "🤖",
-            "imageUrl": "https://static.tildacdn.com/stor6161-3734-4431-b063-616332663630/22565964.png",
-            "features": ["Автоответы", "Интеграция с сайтом", "Настройка диалогов"],
-            "technologies": ["JavaScript", "PHP", "MySQL"],
-            "category": "Автоматизация"
-        },
-        {
-            "name": "Галерея изображений",
-            "shortDescription": "Фотогалерея с загрузкой изображений",
-            "fullDescription": "Создание галереи изображений с возможностью загрузки, сортировки и просмотра фотографий.",
-            "price": 8500,
-            "deliveryTime": "6-7 дней",
-            "icon": "🖼️",
-            "imageUrl": "https://static.tildacdn.com/stor3565-6266-4266-a561-363036353838/15171739.png",
-            "features": ["Загрузка изображений", "Сортировка", "Просмотр в полном размере"],
-            "technologies": ["PHP", "JavaScript", "CSS3"],
-            "category": "Веб-разработка"
-        },
-        {
-            "name": "Система бронирования",
-            "shortDescription": "Простая система онлайн бронирования",
-            "fullDescription": "Разработка системы онлайн бронирования услуг или времени с календарем и уведомлениями.",
-            "price": 9000,
-            "deliveryTime": "7-8 дней",
-            "icon": "📅",
-            "imageUrl": "https://static.tildacdn.com/stor6230-3333-4234-a430-396662643166/71760452.png",
-            "features": ["Календарь", "Бронирование времени", "Email уведомления"],
-            "technologies": ["PHP", "JavaScript", "MySQL"],
-            "category": "Системы управления"
-        },
-        {
-            "name": "Интеграция с соцсетями",
-            "shortDescription": "Подключение к социальным сетям",
-            "fullDescription": "Интеграция сайта с социальными сетями для авторизации и публикации контента.",
-            "price": 9500,
-            "deliveryTime": "5-6 дней",
-            "icon": "📱",
-            "imageUrl": "https://static.tildacdn.com/tild3266-6461-4133-a261-613436326561/20250719_0338_____si.png",
-            "features": ["Социальная авторизация", "Публикация в соцсети", "Виджеты"],
-            "technologies": ["JavaScript", "OAuth", "API"],
-            "category": "Интеграции"
-        },
-        {
-            "name": "Многоязычный сайт",
-            "shortDescription": "Сайт с поддержкой нескольких языков",
-            "fullDescription": "Создание многоязычного сайта с переключением языков и переводом контента.",
-            "price": 10000,
-            "deliveryTime": "8-9 дней",
-            "icon": "🌍",
-            "imageUrl": "https://static.tildacdn.com/tild3662-6532-4461-b132-396531343831/20250719_0350____sim.png",
-            "features": ["Переключение языков", "Перевод контента", "SEO для языков"],
-            "technologies": ["PHP", "MySQL", "JavaScript"],
-            "category": "Локализация"
-        },
-     {
-            "name": "Одностраничный React SPA",
-            "shortDescription": "Быстрый промо‑SPA на React",
-            "fullDescription": "Разработка современного одностраничного приложения на React с роутингом без перезагрузки и оптимизацией Core Web Vitals.",
-            "price": 10500,
-            "deliveryTime": "4‑6 дней",
-            "icon": "⚛️",
-            "imageUrl": "https://static.tildacdn.com/tild6639-6635-4431-a239-356132363062/20250719_0305____sim.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild6639-6635-4431-a239-356132363062/20250719_0305____sim.png",
-                "https://static.tildacdn.com/tild6266-6461-4133-a261-613436326561/20250719_0338_____si.png"
-            ],
-            "features": ["React Router", "Ленивая подгрузка", "Пререндер для SEO"],
-            "technologies": ["React", "Vite", "TypeScript"],
-            "category": "Веб‑разработка"
-        },
-        {
-            "name": "UX/UI аудит сайта",
-            "shortDescription": "Экспресс‑аудит удобства интерфейса",
-            "fullDescription": "Проводим экспертную оценку интерфейса по методике Nielsen, готовим отчёт с приоритетами улучшений и UI‑гайд.",
-            "price": 11000,
-            "deliveryTime": "3‑4 дня",
-            "icon": "🔍",
-            "imageUrl": "https://static.tildacdn.com/stor3933-3836-4237-b137-326362326338/19324104.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3933-3836-4237-b137-326362326338/19324104.png",
-                "https://static.tildacdn.com/stor3932-3630-4334-b239-363039323661/29594603.png"
-            ],
-            "features": ["Heuristic evaluation", "User‑flow карта", "UI kit рекомендации"],
-            "technologies": ["Figma", "Hotjar", "Google Analytics"],
-            "category": "Аналитика"
-        },
-        {
-            "name": "Каталог с 3D‑просмотром",
-            "shortDescription": "Каталог товаров c 3D‑viewer",
-            "fullDescription": "Разработка каталога, где каждый товар демонстрируется в интерактивном 3D‑просмотре (GLTF/GLB).",
-            "price": 11500,
-            "deliveryTime": "5‑7 дней",
-            "icon": "🧊",
-            "imageUrl": "https://static.tildacdn.com/stor6335-6461-4530-b561-393339346238/85806164.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor6335-6461-4530-b561-393339346238/85806164.png",
-                "https://static.tildacdn.com/stor6664-3064-4461-b736-313933353939/17425531.png"
-            ],
-            "features": ["3D model embed", "Сенсорное управление", "Оптимизация текстур"],
-            "technologies": ["Three.js", "GLTF", "JavaScript"],
-            "category": "E‑commerce"
-        },
-        {
-            "name": "Импорт в Shopify",
-            "shortDescription": "Миграция каталога в Shopify",
-            "fullDescription": "Подготавливаем CSV, импортируем товары, настраиваем категории и оптимизируем изображения для Shopify.",
-            "price": 12000,
-            "deliveryTime": "4‑5 дней",
-            "icon": "🛍️",
-            "imageUrl": "https://static.tildacdn.com/stor3964-3536-4864-a439-373565363735/89268780.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3964-3536-4864-a439-373565363735/89268780.png",
-                "https://static.tildacdn.com/stor3333-3534-4639-a231-356631616234/82449965.png"
-            ],
-            "features": ["CSV импорт", "Image optimization", "Category mapping"],
-            "technologies": ["Shopify API", "Python", "Liquid"],
-            "category": "Интеграции"
-        },
-        {
-            "name": "Маркетплейс MVP",
-            "shortDescription": "Мини‑маркетплейс для теста гипотезы",
-            "fullDescription": "Запуск ядра маркетплейса: кабинеты продавцов, модерация товаров и базовые заказы.",
-            "price": 12500,
-            "deliveryTime": "7‑9 дней",
-            "icon": "🛒",
-            "imageUrl": "https://static.tildacdn.com/tild6534-3132-4265-b966-356464666561/20250719_0307___simp.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild6534-3132-4265-b966-356464666561/20250719_0307___simp.png",
-                "https://static.tildacdn.com/tild3235-6565-4737-a339-376665613364/20250719_0340___CI_C.png"
-            ],
-            "features": ["Seller accounts", "Product moderation", "Order tracking"],
-            "technologies": ["Django", "PostgreSQL", "Celery"],
-            "category": "E‑commerce"
-        },
-        {
-            "name": "PWA‑приложение",
-            "shortDescription": "Прогрессивное веб‑приложение",
-            "fullDescription": "Добавляем офлайн‑режим, push‑уведомления и установку на главный экран для вашего сайта.",
-            "price": 13000,
-            "deliveryTime": "5‑6 дней",
-            "icon": "📲",
-            "imageUrl": "https://static.tildacdn.com/tild3662-6532-4461-b132-396531343831/20250719_0308___simp.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild3662-6532-4461-b132-396531343831/20250719_0308___simp.png",
-                "https://static.tildacdn.com/tild6638-3536-4735-b232-306532333134/20250719_0325___simp.png"
-            ],
-            "features": ["Service Worker", "Push notifications", "Offline cache"],
-            "technologies": ["Workbox", "TypeScript", "Vite"],
-            "category": "Веб‑разработка"
-        },
-        {
-            "name": "Интерактивная инфографика",
-            "shortDescription": "Динамические графики для отчётов",
-            "fullDescription": "Создаём интерактивные графики с фильтрами и анимацией для презентации данных.",
-            "price": 13500,
-            "deliveryTime": "5‑6 дней",
-            "icon": "📊",
-            "imageUrl": "https://static.tildacdn.com/tild3565-6133-4061-b934-326632663862/20250719_0309___a_si.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild3565-6133-4061-b934-326632663862/20250719_0309___a_si.png",
-                "https://static.tildacdn.com/stor3736-6430-4166-a335-393061393438/68875476.png"
-            ],
-            "features": ["Chart.js", "Фильтры", "Адаптивный дизайн"],
-            "technologies": ["Chart.js", "Vue 3", "TypeScript"],
-            "category": "Презентации"
-        },
-        {
-            "name": "Голосовой ассистент",
-            "shortDescription": "Ассистент на сайте для голосовых команд",
-            "fullDescription": "Интегрируем распознавание речи и синтез ответов, повышая доступность интерфейса.",
-            "price": 14000,
-            "deliveryTime": "6‑7 дней",
-            "icon": "🎙️",
-            "imageUrl": "https://static.tildacdn.com/stor3238-6135-4362-b865-316433653263/49713888.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3238-6135-4362-b865-316433653263/49713888.png",
-                "https://static.tildacdn.com/tild3336-6366-4234-b933-663462386636/20250719_0342_____si.png"
-            ],
-            "features": ["Speech Recognition", "Text‑to‑Speech", "Фолбэк‑чат"],
-            "technologies": ["Web Speech API", "JavaScript", "Python FastAPI"],
-            "category": "Доступность"
-        },
-        {
-            "name": "Облачный медиасервер",
-            "shortDescription": "Стриминговый сервер под ключ",
-            "fullDescription": "Настраиваем медиасервер с HLS‑стримингом, адаптивным битрейтом и панелью управления.",
-            "price": 14500,
-            "deliveryTime": "7‑9 дней",
-            "icon": "📡",
-            "imageUrl": "https://static.tildacdn.com/stor3536-3962-4036-b139-613466646430/60390468.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3536-3962-4036-b139-613466646430/60390468.png",
-                "https://static.tildacdn.com/tild3166-6263-4134-b730-306261663636/20250719_0341____API.png"
-            ],
-            "features": ["HLS streaming", "Adaptive bitrate", "Admin dashboard"],
-            "technologies": ["Nginx RTMP", "FFmpeg", "React"],
-            "category": "Медиа"
-        },
-        {
-            "name": "Микросервисный MVP",
-            "shortDescription": "Базовая микросервисная архитектура",
-            "fullDescription": "Проектируем и разворачиваем набор микросервисов в Docker с REST API и документацией Swagger.",
-            "price": 16000,
-            "deliveryTime": "8‑10 дней",
-            "icon": "🔗",
-            "imageUrl": "https://static.tildacdn.com/tild3436-3366-4061-b335-613663623466/20250719_0310__Agile.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild3436-3366-4061-b335-613663623466/20250719_0310__Agile.png",
-                "https://static.tildacdn.com/stor3963-3230-4236-b761-333532303962/28297582.png"
-            ],
-            "features": ["Docker Compose", "REST API", "Swagger Docs"],
-            "technologies": ["Python FastAPI", "Docker", "PostgreSQL"],
-            "category": "Архитектура"
-        },
-        {
-            "name": "CI/CD автоматизация",
-            "shortDescription": "Пайплайн деплоймента без рук",
-            "fullDescription": "Настраиваем GitHub Actions: тесты, сборка, деплой и откат к стабильной версии.",
-            "price": 17000,
-            "deliveryTime": "4‑5 дней",
-            "icon": "🚚",
-            "imageUrl": "https://static.tildacdn.com/tild3866-3439-4663-b063-323934373139/20250719_0312____sim.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild3866-3439-4663-b063-323934373139/20250719_0312____sim.png",
-                "https://static.tildacdn.com/tild3938-6239-4431-b265-353734356136/20250719_0343____sim.png"
-            ],
-            "features": ["GitHub Actions", "Auto deploy", "Rollback"],
-            "technologies": ["YAML", "Docker", "Kubernetes"],
-            "category": "DevOps"
-        },
-        {
-            "name": "Чат‑сервер высокой нагрузки",
-            "shortDescription": "Realtime чат 50k RPS",
-            "fullDescription": "Разворачиваем WebSocket‑сервер с горизонтальным масштабированием и хранением истории сообщений.",
-            "price": 18000,
-            "deliveryTime": "9‑12 дней",
-            "icon": "💬",
-            "imageUrl": "https://static.tildacdn.com/stor3134-6666-4431-b566-616130393262/12721519.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3134-6666-4431-b566-616130393262/12721519.png",
-                "https://static.tildacdn.com/stor3662-6466-4930-b166-636539616536/37109528.png"
-            ],
-            "features": ["WebSocket", "Rate limiting", "Message history"],
-            "technologies": ["Go", "Redis", "NATS"],
-            "category": "Коммуникации"
-        },
-        {
-            "name": "Дашборд аналитики данных",
-            "shortDescription": "Realtime BI дашборд",
-            "fullDescription": "Создаём дашборд с живыми метриками, экспортом CSV и разграничением прав доступа.",
-            "price": 19000,
-            "deliveryTime": "8‑10 дней",
-            "icon": "📈",
-            "imageUrl": "https://static.tildacdn.com/tild6363-3466-4637-a364-386135633636/20250719_0313_____si.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild6363-3466-4637-a364-386135633636/20250719_0313_____si.png",
-                "https://static.tildacdn.com/stor6661-3765-4430-a362-363838643734/97635607.png"
-            ],
-            "features": ["Live charts", "Export CSV", "RBAC"],
-            "technologies": ["Vue 3", "D3.js", "ClickHouse"],
-            "category": "Аналитика"
-        },
-        {
-            "name": "WebView‑мобильное приложение",
-            "shortDescription": "Нативные сборки iOS/Android",
-            "fullDescription": "Упаковываем ваш сайт в нативное приложение с push‑уведомлениями и публикацией в сторах.",
-            "price": 20000,
-            "deliveryTime": "10‑12 дней",
-            "icon": "📱",
-            "imageUrl": "https://static.tildacdn.com/stor3033-6262-4237-a666-373731353230/30102704.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3033-6262-4237-a666-373731353230/30102704.png",
-                "https://static.tildacdn.com/tild3133-3064-4138-b830-383037646165/20250719_0344____sim.png"
-            ],
-            "features": ["iOS build", "Android build", "Push service"],
-            "technologies": ["Flutter", "Dart", "Firebase"],
-            "category": "Мобильная разработка"
-        },
-        {
-            "name": "Headless e‑commerce",
-            "shortDescription": "Продвинутый интернет‑магазин",
-            "fullDescription": "Next.js фронтенд + Strapi бэкенд, Stripe платежи и поиск Algolia — готово к росту трафика.",
-            "price": 25000,
-            "deliveryTime": "14‑18 дней",
-            "icon": "🛍️",
-            "imageUrl": "https://static.tildacdn.com/tild3335-3831-4330-a362-373332626237/20250719_0314____sim.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild3335-3831-4330-a362-373332626237/20250719_0314____sim.png",
-                "https://static.tildacdn.com/tild3264-6438-4038-b961-323536303039/20250719_0345____sim.png"
-            ],
-            "features": ["Next.js", "Stripe", "Algolia search"],
-            "technologies": ["Next.js", "Strapi", "PostgreSQL"],
-            "category": "E‑commerce"
-        },
-        {
-            "name": "ML рекомендательная система",
-            "shortDescription": "Персональные рекомендации",
-            "fullDescription": "Настраиваем коллаборативную фильтрацию, REST API выдачи и периодическое переобучение.",
-            "price": 30000,
-            "deliveryTime": "20‑25 дней",
-            "icon": "🤖",
-            "imageUrl": "https://static.tildacdn.com/stor6535-3762-4630-b263-333362663539/16548988.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor6535-3762-4630-b263-333362663539/16548988.png",
-                "https://static.tildacdn.com/stor3464-3734-4937-b464-666536373238/37218240.png"
-            ],
-            "features": ["Collaborative filtering", "API", "Retraining script"],
-            "technologies": ["Python", "TensorFlow", "Docker"],
-            "category": "Machine Learning"
-        },
-        {
-            "name": "Big Data платформа analytics",
-            "shortDescription": "Аналитика на терабайтах данных",
-            "fullDescription": "Разворачиваем кластер Spark, строим ETL‑поток и готовим дашборды в Superset.",
-            "price": 35000,
-            "deliveryTime": "25‑30 дней",
-            "icon": "🗄️",
-            "imageUrl": "https://static.tildacdn.com/stor6335-3837-4732-a332-623833633566/23030493.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor6335-3837-4732-a332-623833633566/23030493.png",
-                "https://static.tildacdn.com/tild3732-3133-4263-b436-663034343933/20250719_0348____sim.png"
-            ],
-            "features": ["Spark cluster", "ETL pipeline", "Superset"],
-            "technologies": ["Apache Spark", "Airflow", "Parquet"],
-            "category": "Big Data"
-        },
-        {
-            "name": "Корпоративный портал с SSO",
-            "shortDescription": "Интранет с единой авторизацией",
-            "fullDescription": "Разрабатываем портал с LDAP/Keycloak‑SSO, модулем документов и иерархией ролей.",
-            "price": 40000,
-            "deliveryTime": "25‑30 дней",
-            "icon": "🏢",
-            "imageUrl": "https://static.tildacdn.com/stor3164-3936-4631-b862-663937626333/45295033.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor3164-3936-4631-b862-663937626333/45295033.png",
-                "https://static.tildacdn.com/stor3930-3365-4564-b035-376661306461/23368363.png"
-            ],
-            "features": ["Keycloak SSO", "Документооборот", "Ролевые модели"],
-            "technologies": ["Java", "Spring Boot", "Keycloak"],
-            "category": "Корпоративные системы"
-        },
-        {
-            "name": "AR‑каталог продукции",
-            "shortDescription": "Каталог в дополненной реальности",
-            "fullDescription": "Модели USDZ/GLB, markerless AR, аналитика взаимодействий — товар оживает у клиента дома.",
-            "price": 45000,
-            "deliveryTime": "30‑35 дней",
-            "icon": "🕶️",
-            "imageUrl": "https://static.tildacdn.com/stor6633-3531-4366-a361-613433323064/32377880.png",
-            "gallery": [
-                "https://static.tildacdn.com/stor6633-3531-4366-a361-613433323064/32377880.png",
-                "https://static.tildacdn.com/tild3264-3830-4235-a534-623533333137/20250719_0349__CI_CD.png"
-            ],
-            "features": ["USDZ/GLB", "Markerless AR", "Usage analytics"],
-            "technologies": ["ARKit", "Three.js", "Swift"],
-            "category": "AR/VR"
-        },
-        {
-            "name": "Цифровая трансформация под ключ",
-            "shortDescription": "Комплексная модернизация процессов",
-            "fullDescription": "Аудит процессов, дорожная карта и внедрение ИТ‑решений для роста эффективности бизнеса.",
-            "price": 50000,
-            "deliveryTime": "40‑45 дней",
-            "icon": "🌐",
-            "imageUrl": "https://static.tildacdn.com/tild3838-6631-4331-b661-626366373033/20250719_0324____sim.png",
-            "gallery": [
-                "https://static.tildacdn.com/tild3838-6631-4331-b661-626366373033/20250719_0324____sim.png",
-                "https://static.tildacdn.com/stor3234-6662-4531-b963-343234333533/89066987.png"
-            ],
-            "features": ["Process audit", "Roadmap", "Implementation"],
-            "technologies": ["BPMN", "Python", "Kubernetes"],
-            "category": "Консалтинг"
-        }
-]
-
-
-async def initialize_products():
-    """Initialize products in database if they don't exist"""
+    return seed_data.qr_table().get(bank, amount)
+
+
+def validate_qr_amount(amount: int, status_code: int = 404):
+    """Reject amounts that are not a payment tier before looking anything up"""
+    qr_table = seed_data.qr_table()
+    if qr_table.is_tier(amount):
+        return
+    lower, upper = qr_table.nearest_tiers(amount)
+    nearest = [tier for tier in (lower, upper) if tier is not None]
+    raise HTTPException(
+        status_code=status_code,
+        detail=f"No QR code tier for amount {amount}; nearest tiers: {', '.join(map(str, nearest))}",
+    )
+
+
+# Carts untouched this long are deleted by CartMaintenance in rate-limited
+# batches; the TTL index only deletes what is left a margin later, e.g. while
+# the maintenance job is not running
+CART_MAX_AGE = timedelta(days=float(os.environ.get('CART_MAX_AGE_DAYS', '14')))
+CART_TTL_MARGIN = timedelta(days=1)
+
+
+async def initialize_indexes(target=None) -> bool:
+    """Ensure the indexes behind every hot query exist and are actually used.
+
+    With QUERY_PLAN_STRICT set, a missing index or a query plan that scans a
+    whole collection fails startup instead of being logged.
+    """
+    target = db if target is None else target
+    cart_ttl_seconds = int((CART_MAX_AGE + CART_TTL_MARGIN).total_seconds())
+    strict = os.environ.get('QUERY_PLAN_STRICT', '').lower() in ('1', 'true', 'yes')
     try:
-        # Check if products already exist
-        existing_count = await db.products.count_documents({})
-        if existing_count > 0:
-            print(f"Products already exist in database: {existing_count}")
-            return
-
-        # Insert products with UUIDs
-        products_with_ids = []
-        for product_data in PRODUCTS_DATA:
-            product = Product(**product_data)
-            products_with_ids.append(product.dict())
-
-        await db.products.insert_many(products_with_ids)
-        print(f"Inserted {len(products_with_ids)} products into database")
+        failed = await ensure_indexes(target, PRODUCT_INDEXES + cart_indexes(cart_ttl_seconds) + ORDER_INDEXES)
     except Exception as e:
-        print(f"Error initializing products: {e}")
+        logger.error("Error creating indexes: %s", e)
+        return False
+    if failed:
+        logger.error("Missing indexes: %s", ", ".join(failed))
+        if strict:
+            raise QueryPlanError(f"Could not create indexes: {', '.join(failed)}")
+    await verify_query_plans(target, strict=strict)
+    return True
+
+
+async def initialize_products(target=None) -> bool:
+    """Upsert the seed products by name whenever data/seed.json changes.
+
+    Products added or edited through a catalog import are left alone until
+    the seed file itself changes again.
+    """
+    target = db if target is None else target
+    try:
+        digest = seed_data.digest()
+        applied = await target.catalog_version.find_one({"_id": "seed"})
+        if applied and applied.get("digest") == digest:
+            logger.info("Seed catalog already applied")
+            return True
+
+        report = await import_catalog(target, Product, enumerate(seed_data.products(), 1))
+        await target.catalog_version.update_one(
+            {"_id": "seed"}, {"$set": {"digest": digest, "applied_at": datetime.utcnow()}}, upsert=True
+        )
+        logger.info(
+            "Seed catalog applied: %s inserted, %s updated, %s unchanged",
+            report.inserted, report.updated, report.unchanged,
+        )
+        if report.changed:
+            catalog_cache.invalidate()
+        return not report.failed
+    except Exception as e:
+        logger.error("Error initializing products: %s", e)
+        return False
+
+
+# Set in the gunicorn master once indexes and seed are in place; forked workers inherit it
+database_prepared = False
+
+
+def prepare_database():
+    """Create indexes and apply the seed once, before gunicorn forks the workers.
+
+    Seeding from every worker's startup would race N upserts of the same
+    products. Uses its own short-lived client so the app's Motor client is
+    first used, and bound to an event loop, inside the workers.
+    """
+    global database_prepared
+
+    async def prepare() -> bool:
+        setup = Database(mongo_url, os.environ['DB_NAME'], PoolSettings(min_pool_size=0))
+        try:
+            return await initialize_indexes(setup.db) and await initialize_products(setup.db)
+        finally:
+            setup.close()
+
+    database_prepared = asyncio.run(prepare())
+
+
+# Response cache shared by handlers; set RESPONSE_CACHE_URL=redis://... to share it between workers
+response_cache = ResponseCache(create_backend(
+    os.environ.get('RESPONSE_CACHE_URL'),
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1024')),
+))
+CATALOG_QUERY_TTL_SECONDS = float(os.environ.get('CATALOG_QUERY_CACHE_TTL_SECONDS', '300'))
+
+# In-memory catalog served by the product endpoints, refreshed in the background
+catalog_cache = CatalogCache(
+    db.products,
+    Product,
+    refresh_interval=float(os.environ.get('CATALOG_REFRESH_SECONDS', '60')),
+    versions=db.catalog_version,
+)
+
+# Reloads the catalog within about a second when any worker, replica or tool
+# writes products: change stream on replica sets, else polls catalog_version
+catalog_watcher = CatalogWatcher(
+    db.products,
+    db.catalog_version,
+    catalog_cache.invalidate,
+    loaded_version=lambda: catalog_cache.source_version,
+    mode=os.environ.get('CATALOG_WATCH', 'auto'),
+    poll_interval=float(os.environ.get('CATALOG_WATCH_POLL_SECONDS', '1')),
+)
+
+
+async def invalidate_catalog_responses(version: int):
+    await response_cache.invalidate("products:")
+
+
+def preload_catalog():
+    """Load the catalog with a blocking client before workers are forked.
+
+    Called from the gunicorn master (see gunicorn.conf.py) so every worker
+    starts with the same snapshot and QR table in copy-on-write memory.
+    """
+    sync_client = MongoClient(mongo_url, serverSelectionTimeoutMS=5000)
+    try:
+        database = sync_client[os.environ['DB_NAME']]
+        version = database.catalog_version.find_one({"_id": CATALOG_VERSION_ID}, {"version": 1})
+        documents = list(database.products.find({}, {"_id": 0}).sort("id", 1))
+    finally:
+        sync_client.close()
+    catalog_cache.install(documents, source_version=version["version"] if version else 0)
+    seed_data.qr_table()
+
+
+async def initialize_catalog_cache():
+    """Load the catalog into memory and start the background refresher"""
+    catalog_cache.add_listener(invalidate_catalog_responses)
+    try:
+        await catalog_cache.refresh()
+    except Exception as e:
+        logger.error("Error loading catalog cache: %s", e)
+    catalog_cache.start()
+
+def parse_cursor(cursor: Optional[str]) -> int:
+    """Decode the opaque pagination cursor handed out in X-Next-Cursor"""
+    if cursor is None:
+        return 0
+    try:
+        offset = int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated field projection against the Product model"""
+    if fields is None:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in Product.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
 
 @api_router.get("/products", response_model=List[Product])
-async def get_products():
-    """Get all products"""
+async def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    q: Optional[str] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """Get products, optionally filtered, sorted, paginated and projected"""
+    if sort is not None and sort not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort order: {sort}")
+    offset = parse_cursor(cursor)
+    projection = parse_fields(fields)
+
     try:
-        products = await db.products.find().to_list(1000)
-        return [Product(**product) for product in products]
+        catalog = await catalog_cache.current()
+        if not request.query_params:
+            # Body, gzip/br variants and ETag are built once per catalog version
+            return catalog.payload.response(request)
+
+        async def run_query():
+            items, total, next_offset = catalog.query(
+                offset=offset,
+                limit=limit,
+                fields=projection,
+                category=category,
+                min_price=min_price,
+                max_price=max_price,
+                q=q,
+                sort=sort,
+            )
+            headers = {"X-Total-Count": str(total)}
+            if next_offset is not None:
+                headers["X-Next-Cursor"] = str(next_offset)
+            return DefaultJSONResponse(items, headers=headers)
+
+        # Keyed by catalog content hash, so workers sharing a backend never mix versions
+        cache_key = f"products:{catalog.payload.etags[None]}:{sorted(request.query_params.multi_items())}"
+        return await response_cache.get_or_compute(cache_key, CATALOG_QUERY_TTL_SECONDS, run_query)
     except Exception as e:
-        print(f"Error fetching products: {e}")
+        logger.error("Error fetching products: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching products")
 
+@api_router.get("/products/search")
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    fields: Optional[str] = None,
+):
+    """Full-text search over product names and descriptions, best matches first"""
+    projection = parse_fields(fields)
+    try:
+        catalog = await catalog_cache.current()
+        results = []
+        for product_id, score in catalog.search.search(q, limit=limit):
+            item = catalog.item(product_id, projection)
+            if item is None:
+                continue
+            results.append({**item, "score": round(score, 4)})
+        return DefaultJSONResponse({"query": q, "results": results})
+    except Exception as e:
+        logger.error("Error searching products: %s", e)
+        raise HTTPException(status_code=500, detail="Error searching products")
+
+@api_router.get("/products/categories")
+async def get_categories():
+    """Get the list of product categories"""
+    try:
+        catalog = await catalog_cache.current()
+        return {"categories": catalog.index.categories}
+    except Exception as e:
+        logger.error("Error fetching categories: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching categories")
+
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get product by ID"""
     try:
-        product = await db.products.find_one({"id": product_id})
-        if not product:
+        catalog = await catalog_cache.current()
+        payload = catalog.product_payload(product_id)
+        if not payload:
             raise HTTPException(status_code=404, detail="Product not found")
-        return Product(**product)
+        return payload.response(request)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error fetching product: {e}")
+        logger.error("Error fetching product: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching product")
 
 
+# Coalesces bursts of cart edits into one Mongo write per session
+cart_buffer = CartWriteBuffer(
+    db.carts,
+    window=float(os.environ.get('CART_WRITE_WINDOW_MS', '300')) / 1000,
+)
+
+
+# Deletes abandoned and empty carts in rate-limited batches
+cart_maintenance = CartMaintenance(
+    db.carts,
+    max_age=CART_MAX_AGE,
+    empty_grace=timedelta(hours=float(os.environ.get('CART_EMPTY_GRACE_HOURS', '1'))),
+    interval=float(os.environ.get('CART_MAINTENANCE_INTERVAL_SECONDS', '3600')),
+    batch_size=int(os.environ.get('CART_MAINTENANCE_BATCH_SIZE', '500')),
+    pause=float(os.environ.get('CART_MAINTENANCE_PAUSE_MS', '100')) / 1000,
+)
+
+
+async def apply_cart_change(session_id: str, change, expected_version: Optional[int]) -> dict:
+    """Queue a cart change and report the new version, mapping conflicts to 409"""
+    try:
+        version = await cart_buffer.apply(session_id, change, expected_version)
+    except CartVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "success", "session_id": session_id, "version": version}
+
+
 @api_router.post("/cart/save")
-async def save_cart(cart_data: dict):
+async def save_cart(cart_data: CartSave):
     """Save cart to database"""
     try:
-        session_id = cart_data.get("session_id", str(uuid.uuid4()))
-        items = cart_data.get("items", [])
+        items = {}
+        for item in cart_data.items:
+            items[item.product_id] = items.get(item.product_id, 0) + item.quantity
+        return await apply_cart_change(
+            cart_data.session_id,
+            lambda pending: pending.replace(items),
+            cart_data.version,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error saving cart: %s", e)
+        raise HTTPException(status_code=500, detail="Error saving cart")
 
-        cart = Cart(
-            session_id=session_id,
-            items=[CartItem(**item) for item in items]
+@api_router.post("/cart/{session_id}/items")
+async def add_cart_item(session_id: str, change: CartItemAdd):
+    """Add a quantity of a product to the cart"""
+    try:
+        return await apply_cart_change(
+            session_id,
+            lambda pending: pending.add(change.product_id, change.quantity),
+            change.version,
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error updating cart: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating cart")
 
-        # Update or insert cart
-        await db.carts.replace_one(
-            {"session_id": session_id},
-            cart.model_dump(),
-            upsert=True
+@api_router.put("/cart/{session_id}/items/{product_id}")
+async def set_cart_item_quantity(session_id: str, product_id: str, change: CartItemChange):
+    """Set the quantity of a cart line; zero or less removes it"""
+    try:
+        return await apply_cart_change(
+            session_id,
+            lambda pending: pending.set_quantity(product_id, change.quantity),
+            change.version,
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error updating cart: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating cart")
 
-        return {"status": "success", "session_id": session_id}
+@api_router.delete("/cart/{session_id}/items/{product_id}")
+async def remove_cart_item(session_id: str, product_id: str, version: Optional[int] = None):
+    """Remove a product from the cart"""
+    try:
+        return await apply_cart_change(
+            session_id,
+            lambda pending: pending.remove(product_id),
+            version,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error saving cart: {e}")
-        raise HTTPException(status_code=500, detail="Error saving cart")
+        logger.error("Error updating cart: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating cart")
 
+# Not response-cached: per-session, one indexed read, and an in-process cache
+# would keep serving a cart other workers have since changed
 @api_router.get("/cart/{session_id}")
-async def get_cart(session_id: str):
-    """Get cart by session ID"""
+async def get_cart(session_id: str, expand: bool = False, version: Optional[int] = None):
+    """Get cart by session ID; with expand=true, include prices and the total.
+
+    Changes still buffered by this worker are written first. Pass the last
+    ``version`` a cart change returned to also see changes buffered by
+    another worker (409 if it is not stored within two write windows).
+    """
     try:
-        cart = await db.carts.find_one({"session_id": session_id})
-        if not cart:
-            return {"items": []}
-        return Cart(**cart)
+        # Carts are only written through CartWriteBuffer, so the stored
+        # document is returned as is rather than re-validated through Cart
+        cart = await cart_buffer.read(session_id, {"_id": 0, "write_id": 0}, min_version=version)
+        if not expand:
+            if not cart:
+                return json_response({"items": []})
+            cart.setdefault("version", 0)
+            return json_response(cart)
+
+        # Prices come from the in-memory catalog, so pricing costs no extra queries
+        catalog = await catalog_cache.current()
+        cart = cart or {}
+        lines, total, missing = catalog.price_items(cart.get("items", []))
+        return json_response({
+            "session_id": session_id,
+            "version": cart.get("version", 0),
+            "items": lines,
+            "total": total,
+            "missing_product_ids": missing,
+            "catalog_version": catalog.version,
+        })
+    except CartVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        print(f"Error fetching cart: {e}")
+        logger.error("Error fetching cart: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching cart")
 
 
@@ -901,6 +566,9 @@ async def get_cart(session_id: str):
 async def get_qr_code_endpoint(bank: str, amount: int):
     """Get QR code URL for specific bank and amount"""
     try:
+        if bank not in seed_data.banks():
+            raise HTTPException(status_code=404, detail="Bank not found")
+        validate_qr_amount(amount)
         qr_url = get_qr_code(bank, amount)
         if not qr_url:
             raise HTTPException(status_code=404, detail="QR code not found for this bank and amount")
@@ -908,18 +576,377 @@ async def get_qr_code_endpoint(bank: str, amount: int):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting QR code: {e}")
+        logger.error("Error getting QR code: %s", e)
         raise HTTPException(status_code=500, detail="Error getting QR code")
 
+@api_router.get("/qr-codes/{amount}")
+async def get_qr_codes_endpoint(amount: int):
+    """Get QR code URLs of every bank for one amount"""
+    try:
+        validate_qr_amount(amount)
+        return {"amount": amount, "qr_codes": seed_data.qr_table().for_amount(amount)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting QR codes: %s", e)
+        raise HTTPException(status_code=500, detail="Error getting QR codes")
+
+ORDER_PAYMENT_TTL = timedelta(minutes=float(os.environ.get('ORDER_PAYMENT_TTL_MINUTES', '30')))
+ORDER_POLL_SECONDS = float(os.environ.get('ORDER_POLL_SECONDS', '1'))
+ORDER_MAX_WAIT_SECONDS = 30
+
+orders_created = metrics_registry.counter(
+    "orders_created_total", "Order creation requests by outcome (created, replayed)", ("result",)
+)
+
+# Expires unpaid orders in batches once their payment window has elapsed
+order_expiry = OrderExpiry(
+    db.orders,
+    interval=float(os.environ.get('ORDER_EXPIRY_INTERVAL_SECONDS', '60')),
+    batch_size=int(os.environ.get('ORDER_EXPIRY_BATCH_SIZE', '500')),
+)
+
+
+def order_response(order: dict, status_code: int = 200, replayed: bool = False) -> Response:
+    headers = {"Cache-Control": "no-store"}
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return json_response(order, status_code=status_code, headers=headers)
+
+
+@api_router.post("/orders")
+async def create_order_endpoint(
+    order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+):
+    """Snapshot a cart at current catalog prices and assign its payment QR code.
+
+    Ordering the session's cart takes the ``cart_version`` the client last
+    saw; 409 if the stored cart is at another version.
+
+    Requests repeating an ``Idempotency-Key`` get the order the first one
+    created (200 with ``Idempotent-Replayed: true``) instead of a new order;
+    reusing a key for a different request is rejected with 422.
+    """
+    try:
+        fingerprint = None
+        if idempotency_key is not None:
+            fingerprint = request_fingerprint(order_data.model_dump())
+            # Retries are answered before the cart is read or priced again
+            stored = await find_by_idempotency_key(db.orders, idempotency_key, fingerprint)
+            if stored is not None:
+                orders_created.inc("replayed")
+                return order_response(stored, replayed=True)
+
+        if order_data.bank not in seed_data.banks():
+            raise HTTPException(status_code=404, detail="Bank not found")
+        if order_data.items is None:
+            if order_data.cart_version is None:
+                raise HTTPException(status_code=422, detail="cart_version is required to order the session's cart")
+            cart = await cart_buffer.read(
+                order_data.session_id, {"_id": 0, "items": 1, "version": 1}, min_version=order_data.cart_version
+            )
+            stored_version = (cart or {}).get("version") or 0
+            if stored_version != order_data.cart_version:
+                raise CartVersionConflict(order_data.cart_version, stored_version)
+            items = (cart or {}).get("items", [])
+        else:
+            quantities = {}
+            for item in order_data.items:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            items = [
+                {"product_id": product_id, "quantity": quantity}
+                for product_id, quantity in quantities.items() if quantity > 0
+            ]
+        if not items:
+            raise HTTPException(status_code=422, detail="Cart is empty")
+
+        catalog = await catalog_cache.current()
+        lines, total, missing = catalog.price_items(items)
+        if missing:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Some products are no longer available", "missing_product_ids": missing},
+            )
+        validate_qr_amount(total, status_code=422)
+        qr_url = get_qr_code(order_data.bank, total)
+        if not qr_url:
+            raise HTTPException(status_code=422, detail="QR code not found for this bank and amount")
+
+        order, replayed = await create_order(db.orders, new_order(
+            order_data.session_id, lines, total, order_data.bank, qr_url, catalog.version,
+            ORDER_PAYMENT_TTL, idempotency_key=idempotency_key, fingerprint=fingerprint,
+        ))
+        orders_created.inc("replayed" if replayed else "created")
+        return order_response(order, status_code=200 if replayed else 201, replayed=replayed)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except CartVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating order: %s", e)
+        raise HTTPException(status_code=500, detail="Error creating order")
+
+
+@api_router.get("/orders")
+async def list_orders(session_id: str, limit: int = Query(20, ge=1, le=100)):
+    """Most recent orders of a session"""
+    try:
+        orders = await db.orders.find({"session_id": session_id}, ORDER_PROJECTION).sort(
+            "created_at", -1
+        ).limit(limit).to_list(limit)
+        return json_response({"session_id": session_id, "orders": orders}, headers={"Cache-Control": "no-store"})
+    except Exception as e:
+        logger.error("Error listing orders: %s", e)
+        raise HTTPException(status_code=500, detail="Error listing orders")
+
+
+@api_router.get("/orders/{order_id}")
+async def get_order(order_id: str, wait: float = Query(0, ge=0, le=ORDER_MAX_WAIT_SECONDS)):
+    """Get an order; with ``wait``, hold the request up to that many seconds until it leaves awaiting_payment.
+
+    Checkout pages long-poll this instead of hammering it: each waiting
+    request re-reads one document by its unique id every ORDER_POLL_SECONDS.
+    """
+    try:
+        deadline = time.monotonic() + wait
+        while True:
+            order = await db.orders.find_one({"id": order_id}, ORDER_PROJECTION)
+            if order is None:
+                raise HTTPException(status_code=404, detail="Order not found")
+            remaining = deadline - time.monotonic()
+            if order["status"] != AWAITING_PAYMENT or remaining <= 0:
+                return order_response(order)
+            await asyncio.sleep(min(ORDER_POLL_SECONDS, remaining))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching order: %s", e)
+        raise HTTPException(status_code=500, detail="Error fetching order")
+
+
+# Resized product images; IMAGE_SOURCE_DIR reads originals from a local mirror instead of the CDN
+image_proxy = ImageProxy(
+    DiskCache(
+        Path(os.environ.get('IMAGE_CACHE_DIR', '/tmp/image-cache')),
+        max_bytes=int(float(os.environ.get('IMAGE_CACHE_MAX_MB', '512')) * 1024 * 1024),
+        rescan_interval=float(os.environ.get('IMAGE_CACHE_RESCAN_SECONDS', '60')),
+    ),
+    DirectoryImageSource(Path(os.environ['IMAGE_SOURCE_DIR'])) if os.environ.get('IMAGE_SOURCE_DIR') else HttpImageSource(),
+    workers=int(os.environ.get('IMAGE_WORKERS', '2')),
+)
+
+
+async def product_image_url(product_id: str) -> str:
+    catalog = await catalog_cache.current()
+    product = catalog.get(product_id)
+    if product is None or not product.imageUrl:
+        raise HTTPException(status_code=404, detail="Product image not found")
+    return product.imageUrl
+
+
+@api_router.get("/img/{product_id}")
+async def product_image_srcset(product_id: str):
+    """srcset strings per format for a product's image, with immutable versioned URLs"""
+    url = await product_image_url(product_id)
+    return {
+        "widths": list(IMAGE_WIDTHS),
+        "srcset": {extension: srcset(product_id, url, extension) for extension in image_proxy.formats},
+        "original": url,
+    }
+
+
+@api_router.get("/img/{product_id}/{variant}")
+async def product_image(product_id: str, variant: str, request: Request, v: Optional[str] = None):
+    """A product image resized to one of IMAGE_WIDTHS, e.g. 480.webp, or 480 to negotiate the format"""
+    try:
+        width, extension = parse_variant(variant)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    url = await product_image_url(product_id)
+    if not image_proxy.available:
+        return RedirectResponse(url, status_code=307)
+    negotiated = extension is None
+    if negotiated:
+        extension = negotiate_format(request.headers.get("accept", ""), image_proxy.formats)
+    if extension not in image_proxy.formats:
+        raise HTTPException(status_code=404, detail=f"Image format {extension} is not available")
+
+    try:
+        image = await image_proxy.variant(url, width, extension)
+    except ImageSourceError as e:
+        logger.warning("Error serving image for %s: %s", product_id, e)
+        raise HTTPException(status_code=502, detail="Product image unavailable")
+    # Versioned URLs change whenever imageUrl does, so they can be cached forever
+    return image.response(request, immutable=v == source_version(url), negotiated=negotiated)
+
+
 @api_router.get("/banks")
 async def get_banks():
     """Get available banks"""
-    return {"banks": BANKS}
+    return {"banks": seed_data.banks()}
+
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def require_admin(request: Request):
+    """Check for ``Authorization: Bearer <ADMIN_TOKEN>``"""
+    supplied = request.headers.get("authorization", "").encode()
+    if ADMIN_TOKEN is None or not hmac.compare_digest(supplied, f"Bearer {ADMIN_TOKEN}".encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@api_router.post("/admin/catalog/import")
+async def import_catalog_endpoint(
+    request: Request,
+    format: Optional[str] = None,
+    key: str = "name",
+    dry_run: bool = False,
+    chunk_size: int = Query(500, ge=1, le=10000),
+):
+    """Upsert products from a JSON array, NDJSON or CSV request body (see catalog_import.py)"""
+    require_admin(request)
+    format = format or detect_format(content_type=request.headers.get("content-type"))
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format; pass format={'|'.join(IMPORT_FORMATS)}")
+    if key not in IMPORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unknown key: {key}")
+
+    try:
+        # Large feeds go to a temporary file rather than staying in memory
+        with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as body:
+            async for chunk in request.stream():
+                body.write(chunk)
+            body.seek(0)
+            with io.TextIOWrapper(body, encoding="utf-8-sig", newline="") as text:
+                report = await import_catalog(
+                    db, Product, read_rows(text, format, Product), key=key, chunk_size=chunk_size, dry_run=dry_run
+                )
+    except Exception as e:
+        logger.error("Error importing catalog: %s", e)
+        raise HTTPException(status_code=500, detail="Error importing catalog")
+
+    if report.changed:
+        catalog_cache.invalidate()
+    if report.stopped:
+        raise HTTPException(status_code=400, detail=report.as_dict())
+    return report.as_dict()
+
+
+EXPORTS = {
+    "products": ExportSpec("products", tuple(Product.model_fields)),
+    "carts": ExportSpec(
+        "carts", ("id", "session_id", "version", "items", "created_at", "updated_at"), order=("updated_at", "_id")
+    ),
+}
+
+
+@api_router.get("/admin/export/{collection}")
+async def export_collection(
+    collection: str,
+    request: Request,
+    format: str = "ndjson",
+    batch_size: int = Query(500, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+):
+    """Stream a whole collection as NDJSON or CSV.
+
+    Every row carries a ``_cursor``; pass the last one received as ``cursor``
+    to resume an interrupted export. Carts are ordered by ``updated_at``, so
+    ``since`` (or a cursor kept from a previous run) exports only carts
+    changed after it.
+    """
+    require_admin(request)
+    spec = EXPORTS.get(collection)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {collection}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format; pass format={'|'.join(EXPORT_FORMATS)}")
+    if since is not None and not spec.incremental:
+        raise HTTPException(status_code=400, detail=f"{collection} has no updated_at to export since")
+    if cursor:
+        try:
+            spec.resume_filter(cursor)
+        except InvalidExportCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    batches = export_batches(db[spec.collection], spec, batch_size=batch_size, cursor=cursor, since=since)
+    return StreamingResponse(
+        stream_export(batches, spec, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{collection}.{format}"', "Cache-Control": "no-store"},
+    )
+
+@api_router.post("/admin/orders/status")
+async def update_order_statuses(update: OrderStatusUpdate, request: Request):
+    """Record payments and cancellations matched by support, in one bulk write.
+
+    Changes the current status does not allow (e.g. cancelling a paid order)
+    and unknown order ids are counted as skipped.
+    """
+    require_admin(request)
+    try:
+        # A later change for the same order wins
+        changes = {change.order_id: change.status for change in update.changes}
+        applied = await apply_transitions(db.orders, list(changes.items()), reason=update.reason)
+    except Exception as e:
+        logger.error("Error updating order statuses: %s", e)
+        raise HTTPException(status_code=500, detail="Error updating order statuses")
+    return {"requested": len(changes), "applied": applied, "skipped": len(changes) - applied}
 
 # Root endpoint
+@api_router.get("/health")
+async def health():
+    """Mongo reachability and connection pool utilization"""
+    try:
+        latency = await database.ping()
+    except Exception as e:
+        return DefaultJSONResponse(status_code=503, content={"status": "unavailable", "error": str(e), "pool": database.stats()})
+    return {"status": "ok", "mongo_ping_ms": round(latency * 1000, 2), "pool": database.stats()}
+
+
 @api_router.get("/")
 async def root():
-    return {"message": "DevServices API is running", "products_count": len(PRODUCTS_DATA)}
+    return {"message": "DevServices API is running", "products_count": len(seed_data.products())}
+
+metrics_registry.observed_counter("response_cache_hits_total", "Response cache hits", lambda: response_cache.hits)
+metrics_registry.observed_counter("response_cache_misses_total", "Response cache misses", lambda: response_cache.misses)
+metrics_registry.observed_counter("response_cache_errors_total", "Response cache backend failures", lambda: response_cache.errors)
+metrics_registry.gauge("response_cache_hit_ratio", "Response cache hit ratio since start", lambda: response_cache.hit_ratio)
+metrics_registry.observed_counter("image_cache_hits_total", "Image disk cache hits", lambda: image_proxy.cache.hits)
+metrics_registry.observed_counter("image_cache_misses_total", "Image disk cache misses", lambda: image_proxy.cache.misses)
+metrics_registry.observed_counter("image_renders_total", "Image variants rendered", lambda: image_proxy.renders)
+metrics_registry.gauge("image_cache_bytes", "Size of the image disk cache", lambda: image_proxy.cache.size)
+metrics_registry.gauge("catalog_version", "Version of the in-memory catalog snapshot", lambda: catalog_cache.version)
+metrics_registry.observed_counter(
+    "catalog_change_notifications_total",
+    "Catalog changes reported by the change stream or catalog_version polling",
+    lambda: catalog_watcher.notifications,
+)
+metrics_registry.observed_counter(
+    "cart_write_conflicts_total", "Cart change sets dropped because another process changed the cart first",
+    lambda: cart_buffer.conflicts,
+)
+metrics_registry.observed_counter("orders_expired_total", "Unpaid orders expired", lambda: order_expiry.expired)
+metrics_registry.gauge(
+    "mongodb_pool",
+    "MongoDB connection pool state (open, checked_out, waiting, ...)",
+    database.stats,
+    labelnames=("stat",),
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -933,81 +960,100 @@ app.include_router(api_router)
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 
-print(f"Looking for static files in: {STATIC_DIR}")
-print(f"Static directory exists: {STATIC_DIR.exists()}")
+static_assets = None
+page_renderer = PageRenderer()
 if STATIC_DIR.exists():
-    print(f"Contents: {list(STATIC_DIR.iterdir())}")
+    # Build files are loaded into memory once; requests are served from the table
+    static_assets = StaticAssetIndex(STATIC_DIR)
+    logger.info("Loaded %d static files from %s", len(static_assets), STATIC_DIR)
 
-if STATIC_DIR.exists():
-    react_static_dir = STATIC_DIR / "static"
-    if react_static_dir.exists():
-        print(f"Found React static files in: {react_static_dir}")
-        app.mount("/static", StaticFiles(directory=react_static_dir), name="static")
-    else:
-        print(f"Warning: React static directory not found at {react_static_dir}")
+
+    @app.get("/static/{path:path}")
+    async def react_static(path: str, request: Request):
+        asset = static_assets.get(f"static/{path}")
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return asset.response(request)
 
 
     @app.get("/favicon.ico")
-    async def favicon():
-        favicon_path = STATIC_DIR / "favicon.ico"
-        if favicon_path.exists():
-            return FileResponse(favicon_path)
+    async def favicon(request: Request):
+        asset = static_assets.get("favicon.ico")
+        if asset:
+            return asset.response(request)
         raise HTTPException(status_code=404, detail="Favicon not found")
 
 
     @app.get("/manifest.json")
-    async def manifest():
-        manifest_path = STATIC_DIR / "manifest.json"
-        if manifest_path.exists():
-            return FileResponse(manifest_path)
+    async def manifest(request: Request):
+        asset = static_assets.get("manifest.json")
+        if asset:
+            return asset.response(request)
         raise HTTPException(status_code=404, detail="Manifest not found")
 
 
     @app.get("/robots.txt")
-    async def robots():
-        robots_path = STATIC_DIR / "robots.txt"
-        if robots_path.exists():
-            return FileResponse(robots_path)
-        return FileResponse(STATIC_DIR / "index.html")
+    async def robots(request: Request):
+        asset = static_assets.get("robots.txt") or static_assets.get("index.html")
+        if asset:
+            return asset.response(request)
+        raise HTTPException(status_code=404, detail="Application not found")
 
 
     @app.get("/{path:path}")
-    async def serve_react_app(path: str):
+    async def serve_react_app(path: str, request: Request):
         if path.startswith("api/"):
             raise HTTPException(status_code=404, detail="API endpoint not found")
 
-        file_path = STATIC_DIR / path
-        if file_path.is_file():
-            return FileResponse(file_path)
+        asset = static_assets.get(path)
+        if asset:
+            return asset.response(request)
 
-        index_path = STATIC_DIR / "index.html"
-        if index_path.exists():
-            return FileResponse(index_path)
+        shell = static_assets.get("index.html")
+        if not shell:
+            raise HTTPException(status_code=404, detail="Application not found")
 
-        raise HTTPException(status_code=404, detail="Application not found")
+        # Catalog and product routes get their data inlined into the shell
+        try:
+            catalog = await catalog_cache.current()
+            page = page_renderer.render(path, shell.bodies[None], shell.digest, catalog)
+        except Exception as e:
+            logger.error("Error prerendering %s: %s", path, e)
+            page = None
+        if page:
+            return page.response(request)
+        return shell.response(request)
 
 else:
-    print(f"Warning: Static directory not found at {STATIC_DIR}")
+    logger.warning("Static directory not found at %s", STATIC_DIR)
     @app.get("/{path:path}")
     async def no_static_fallback(path: str):
         if path.startswith("api/"):
             raise HTTPException(status_code=404, detail="API endpoint not found")
         return {"error": "Static files not found. Please build the frontend first."}
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup"""
-    await initialize_products()
+async def startup():
+    """Initialize database and background tasks once Mongo is reachable"""
+    loop_lag.start()
+    if not database_prepared:
+        await initialize_indexes()
+        await initialize_products()
+    await initialize_catalog_cache()
+    catalog_watcher.start()
+    cart_buffer.start()
+    cart_maintenance.start()
+    order_expiry.start()
+    if static_assets is not None:
+        static_assets.start(float(os.environ.get('STATIC_POLL_SECONDS', '5')))
 
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def shutdown():
+    await cart_maintenance.stop()
+    await order_expiry.stop()
+    if static_assets is not None:
+        await static_assets.stop()
+    await cart_buffer.stop()
+    await catalog_watcher.stop()
+    await catalog_cache.stop()
+    await image_proxy.stop()
+    await loop_lag.stop()
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from http_cache import etag_matches, negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+# Build output under static/static/ has content hashes in its file names
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Precompressed siblings written at build time by precompress_static.py
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+
+def encode_headers(headers: Dict[str, str]) -> RawHeaders:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+
+class PrebuiltResponse(Response):
+    """Response whose body and raw headers were built ahead of time"""
+
+    def __init__(self, body: bytes, raw_headers: RawHeaders, status_code: int = 200):
+        self.status_code = status_code
+        self.body = body
+        self.media_type = None
+        self.background = None
+        # Copied so that middleware adding headers never touches the shared list
+        self.raw_headers = list(raw_headers)
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """One servable file, held in memory with its variants and prebuilt headers"""
+    signature: Tuple
+    digest: str
+    bodies: Dict[Optional[str], bytes] = field(default_factory=dict)
+    headers: Dict[Optional[str], RawHeaders] = field(default_factory=dict)
+    not_modified_headers: Dict[Optional[str], RawHeaders] = field(default_factory=dict)
+
+    @property
+    def etags(self) -> List[str]:
+        return [self.etag(encoding) for encoding in self.bodies]
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.digest}"' if encoding is None else f'"{self.digest}-{encoding}"'
+
+    def response(self, request: Request) -> Response:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), self.bodies)
+        if etag_matches(request.headers.get("if-none-match"), self.etags):
+            return PrebuiltResponse(b"", self.not_modified_headers[encoding], status_code=304)
+
+        return PrebuiltResponse(self.bodies[encoding], self.headers[encoding])
+
+
+def file_signature(path: Path) -> Tuple:
+    """Cheap change detector for a file and its precompressed siblings"""
+    signature = []
+    for candidate in (path, *(path.with_name(path.name + suffix) for suffix in PRECOMPRESSED_SUFFIXES.values())):
+        try:
+            stat = candidate.stat()
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class StaticAssetIndex:
+    """Table of every file in the React build, keyed by URL path.
+
+    Files are read once and served from prebuilt responses, so a request
+    costs a dict lookup and no filesystem syscalls. A background poller
+    re-stats the build directory and reloads only files whose mtime or size
+    changed.
+
+    Bodies are copied into memory rather than memory-mapped: a replaced
+    file's map could only be closed once no response streams it, and a file
+    truncated in place under a live map kills the worker with SIGBUS. Loaded
+    in the gunicorn master, the copies are shared copy-on-write.
+    """
+
+    def __init__(self, root: Path, immutable_prefix: str = "static/"):
+        self.root = root
+        self._immutable_prefix = immutable_prefix
+        self._assets: Dict[str, StaticAsset] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.scan()
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def __contains__(self, url_path: str) -> bool:
+        return url_path in self._assets
+
+    def get(self, url_path: str) -> Optional[StaticAsset]:
+        return self._assets.get(url_path)
+
+    def scan(self) -> int:
+        """Sync the table with the files on disk; returns how many were (re)loaded"""
+        assets = {}
+        loaded = 0
+        for path in self.root.rglob("*"):
+            if not path.is_file():
+                continue
+            if path.suffix in PRECOMPRESSED_SUFFIXES.values() and path.with_suffix("").is_file():
+                continue  # served as a variant of the uncompressed file
+            url_path = path.relative_to(self.root).as_posix()
+            signature = file_signature(path)
+            previous = self._assets.get(url_path)
+            if previous is not None and previous.signature == signature:
+                assets[url_path] = previous
+                continue
+            try:
+                assets[url_path] = self._load_asset(url_path, path, signature)
+                loaded += 1
+            except OSError as e:
+                # The file changed underneath us; pick it up on the next pass
+                logger.warning("Could not load static file %s: %s", path, e)
+        self._assets = assets
+        return loaded
+
+    def _load_asset(self, url_path: str, path: Path, signature: Tuple) -> StaticAsset:
+        stat = path.stat()
+        identity = path.read_bytes()
+        digest = hashlib.sha256(identity).hexdigest()[:32]
+
+        bodies: Dict[Optional[str], bytes] = {None: identity}
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                bodies[encoding] = variant.read_bytes()
+
+        if url_path.startswith(self._immutable_prefix):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            cache_control = REVALIDATE_CACHE_CONTROL
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if media_type.startswith("text/"):
+            media_type += "; charset=utf-8"
+
+        headers, not_modified_headers = {}, {}
+        for encoding, body in bodies.items():
+            common = {
+                "etag": f'"{digest}"' if encoding is None else f'"{digest}-{encoding}"',
+                "cache-control": cache_control,
+            }
+            if len(bodies) > 1:
+                common["vary"] = "Accept-Encoding"
+            full = {
+                **common,
+                "content-type": media_type,
+                "content-length": str(len(body)),
+                "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            }
+            if encoding is not None:
+                full["content-encoding"] = encoding
+            headers[encoding] = encode_headers(full)
+            not_modified_headers[encoding] = encode_headers(common)
+
+        return StaticAsset(
+            signature=signature,
+            digest=digest,
+            bodies=bodies,
+            headers=headers,
+            not_modified_headers=not_modified_headers,
+        )
+
+    def start(self, interval: float):
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._poll_loop(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                loaded = await asyncio.to_thread(self.scan)
+            except Exception as e:
+                logger.warning("Static file rescan failed: %s", e)
+                continue
+            if loaded:
+                logger.info("Reloaded %d changed static files", loaded)
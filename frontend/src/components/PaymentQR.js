@@ -1,10 +1,12 @@
 import React, { useState, useEffect, useCallback } from 'react';
-import { getBanks, getQRCode } from '../services/api';
+import { getBanks, getQRCodes } from '../services/api';
 
 const PaymentQR = ({ amount, onClose }) => {
   const [banks, setBanks] = useState({});
   const [selectedBank, setSelectedBank] = useState('');
   const [qrData, setQrData] = useState(null);
+  // Ссылки всех банков на сумму загружаются одним запросом
+  const [qrCodes, setQrCodes] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
 
@@ -31,24 +33,17 @@ const PaymentQR = ({ amount, onClose }) => {
   // Генерация QR — мемоизированный колбэк, чтобы корректно выставить зависимости
   const fetchQRCode = useCallback(
       async (payAmount) => {
-        if (!selectedBank) {
-          setError('Выберите банк');
-          return;
-        }
-
         setLoading(true);
         setError('');
-        setQrData(null);
+        setQrCodes(null);
 
         try {
-          const data = await getQRCode(selectedBank, payAmount);
-          setQrData(data);
+          const data = await getQRCodes(payAmount);
+          setQrCodes(data);
         } catch (err) {
-          console.error('Error fetching QR code:', err);
+          console.error('Error fetching QR codes:', err);
           if (err.response?.status === 404) {
-            setError(
-                `QR-код для банка "${banks[selectedBank]?.name}" на сумму ${payAmount}₽ не найден`
-            );
+            setError(`QR-код на сумму ${payAmount}₽ не найден`);
           } else {
             setError('Ошибка загрузки QR-кода');
           }
@@ -56,19 +51,34 @@ const PaymentQR = ({ amount, onClose }) => {
           setLoading(false);
         }
       },
-      [banks, selectedBank]
+      []
   );
 
-  // Автовызов генерации при выборе банка или изменении фиксированной суммы
+  // Автовызов генерации при изменении фиксированной суммы
   useEffect(() => {
-    if (selectedBank && amount) {
+    if (amount) {
       fetchQRCode(amount);
     }
-  }, [selectedBank, amount, fetchQRCode]);
+  }, [amount, fetchQRCode]);
+
+  // Смена банка не требует запроса к серверу
+  useEffect(() => {
+    if (!qrCodes || !selectedBank) {
+      setQrData(null);
+      return;
+    }
+    const qrUrl = qrCodes[selectedBank];
+    if (qrUrl) {
+      setQrData({ qr_url: qrUrl, bank: selectedBank, amount });
+      setError('');
+    } else {
+      setQrData(null);
+      setError(`QR-код для банка "${banks[selectedBank]?.name}" на сумму ${amount}₽ не найден`);
+    }
+  }, [qrCodes, selectedBank, amount, banks]);
 
   const handleBankChange = (bank) => {
     setSelectedBank(bank);
-    setQrData(null);
   };
 
   const generateQRImageUrl = (qrUrl) =>
@@ -1,56 +1,77 @@
-import { useState, useMemo } from 'react';
+import { useState, useEffect } from 'react';
+import { CARD_FIELDS, getCategories, queryProducts, takeInitialData } from '../services/api';
 
-export const useProductFilters = (products) => {
+const SEARCH_DEBOUNCE_MS = 250;
+
+export const useProductFilters = () => {
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedCategory, setSelectedCategory] = useState('all');
   const [priceRange, setPriceRange] = useState('all');
   const [sortBy, setSortBy] = useState('name');
+  const [categories, setCategories] = useState([]);
+  const [filteredProducts, setFilteredProducts] = useState([]);
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState(null);
 
-  const categories = useMemo(() => {
-    const uniqueCategories = [...new Set(products.map(product => product.category))];
-    return uniqueCategories.sort();
-  }, [products]);
+  useEffect(() => {
+    const initialCategories = takeInitialData('categories');
+    if (initialCategories) {
+      setCategories(initialCategories);
+      return;
+    }
+    getCategories()
+      .then(setCategories)
+      .catch((err) => console.error('Error fetching categories:', err));
+  }, []);
 
-  const filteredProducts = useMemo(() => {
-    let filtered = products;
+  useEffect(() => {
+    // Сервер уже встроил в страницу список с фильтрами по умолчанию
+    const initialProducts = takeInitialData('products');
+    const isDefaultQuery = !searchTerm && selectedCategory === 'all' && priceRange === 'all' && sortBy === 'name';
+    if (initialProducts && isDefaultQuery) {
+      setFilteredProducts(initialProducts);
+      setLoading(false);
+      return undefined;
+    }
 
+    const params = { sort: sortBy, fields: CARD_FIELDS.join(',') };
     if (searchTerm) {
-      filtered = filtered.filter(product =>
-        product.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        product.shortDescription.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        product.fullDescription.toLowerCase().includes(searchTerm.toLowerCase())
-      );
+      params.q = searchTerm;
     }
-
     if (selectedCategory !== 'all') {
-      filtered = filtered.filter(product => product.category === selectedCategory);
+      params.category = selectedCategory;
     }
-
     if (priceRange !== 'all') {
       const [min, max] = priceRange.split('-').map(Number);
-      filtered = filtered.filter(product => product.price >= min && product.price <= max);
+      params.min_price = min;
+      params.max_price = max;
     }
 
-    switch (sortBy) {
-      case 'price-asc':
-        filtered.sort((a, b) => a.price - b.price);
-        break;
-      case 'price-desc':
-        filtered.sort((a, b) => b.price - a.price);
-        break;
-      case 'name':
-        filtered.sort((a, b) => a.name.localeCompare(b.name, 'ru'));
-        break;
-      case 'popular':
-        // For now, just sort by price desc as popularity placeholder
-        filtered.sort((a, b) => b.price - a.price);
-        break;
-      default:
-        break;
-    }
+    // Не отправляем запрос на каждое нажатие клавиши в поиске
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const { items } = await queryProducts(params);
+        if (!cancelled) {
+          setFilteredProducts(items);
+          setError(null);
+        }
+      } catch (err) {
+        if (!cancelled) {
+          setError('Ошибка загрузки продуктов');
+        }
+      } finally {
+        if (!cancelled) {
+          setLoading(false);
+        }
+      }
+    }, searchTerm ? SEARCH_DEBOUNCE_MS : 0);
 
-    return filtered;
-  }, [products, searchTerm, selectedCategory, priceRange, sortBy]);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, selectedCategory, priceRange, sortBy]);
 
   return {
     searchTerm,
@@ -62,6 +83,8 @@ export const useProductFilters = (products) => {
     sortBy,
     setSortBy,
     categories,
-    filteredProducts
+    filteredProducts,
+    loading,
+    error
   };
-};
\ No newline at end of file
+};
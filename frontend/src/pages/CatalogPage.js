@@ -1,14 +1,9 @@
-import React, { useState, useEffect } from 'react';
+import React from 'react';
 import ProductCard from '../components/ProductCard';
 import ProductFilters from '../components/ProductFilters';
 import { useProductFilters } from '../hooks/useProductFilters';
-import { getProducts } from '../services/api';
 
 const CatalogPage = () => {
-  const [products, setProducts] = useState([]);
-  const [loading, setLoading] = useState(true);
-  const [error, setError] = useState(null);
-
   const {
     searchTerm,
     setSearchTerm,
@@ -19,24 +14,10 @@ const CatalogPage = () => {
     sortBy,
     setSortBy,
     categories,
-    filteredProducts
-  } = useProductFilters(products);
-
-  useEffect(() => {
-    const fetchProducts = async () => {
-      try {
-        const data = await getProducts();
-        setProducts(data);
-      } catch (err) {
-        setError('Ошибка загрузки продуктов');
-        console.error('Error fetching products:', err);
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchProducts();
-  }, []);
+    filteredProducts,
+    loading,
+    error
+  } = useProductFilters();
 
   if (loading) {
     return (
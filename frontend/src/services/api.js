@@ -8,6 +8,18 @@ const API = `${BACKEND_URL}/api`;
 console.log('Backend URL:', BACKEND_URL);
 console.log('API URL:', API);
 
+// Данные, которые сервер встроил в HTML первой загруженной страницы.
+// Каждое значение отдаётся один раз, дальше работают обычные запросы.
+export const takeInitialData = (key) => {
+  const data = window.__INITIAL_DATA__;
+  if (!data || data[key] === undefined) {
+    return undefined;
+  }
+  const value = data[key];
+  delete data[key];
+  return value;
+};
+
 // Products API
 export const getProducts = async () => {
   try {
@@ -19,7 +31,39 @@ export const getProducts = async () => {
   }
 };
 
+// Поля, которые нужны карточке товара в каталоге
+export const CARD_FIELDS = ['id', 'name', 'shortDescription', 'price', 'deliveryTime', 'icon', 'imageUrl', 'category'];
+
+// Фильтрация, сортировка и пагинация выполняются на сервере
+export const queryProducts = async (params = {}) => {
+  try {
+    const response = await axios.get(`${API}/products`, { params });
+    return {
+      items: response.data,
+      total: Number(response.headers['x-total-count'] ?? response.data.length),
+      nextCursor: response.headers['x-next-cursor'] ?? null
+    };
+  } catch (error) {
+    console.error('Error querying products:', error);
+    throw error;
+  }
+};
+
+export const getCategories = async () => {
+  try {
+    const response = await axios.get(`${API}/products/categories`);
+    return response.data.categories;
+  } catch (error) {
+    console.error('Error fetching categories:', error);
+    throw error;
+  }
+};
+
 export const getProduct = async (productId) => {
+  const initialProduct = takeInitialData('product');
+  if (initialProduct && initialProduct.id === productId) {
+    return initialProduct;
+  }
   try {
     const response = await axios.get(`${API}/products/${productId}`);
     return response.data;
@@ -70,4 +114,15 @@ export const getQRCode = async (bank, amount) => {
     console.error('Error fetching QR code:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+
+// QR-коды всех банков на одну сумму одним запросом
+export const getQRCodes = async (amount) => {
+  try {
+    const response = await axios.get(`${API}/qr-codes/${amount}`);
+    return response.data.qr_codes;
+  } catch (error) {
+    console.error('Error fetching QR codes:', error);
+    throw error;
+  }
+};
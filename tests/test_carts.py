@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from carts import CartVersionConflict, CartWriteBuffer
+from indexes import cart_indexes, ensure_indexes
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def carts(db):
+    await ensure_indexes(db, cart_indexes(86400))
+    return db.carts
+
+
+async def stored(carts, session_id="s"):
+    return await carts.find_one({"session_id": session_id}, {"_id": 0})
+
+
+def items(cart):
+    return {item["product_id"]: item["quantity"] for item in cart["items"]}
+
+
+class FailingCollection:
+    """Fails the next ``failures`` bulk writes, then delegates to the real collection"""
+
+    def __init__(self, collection, failures=1):
+        self._collection = collection
+        self.failures = failures
+
+    async def bulk_write(self, operations, **options):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection reset")
+        return await self._collection.bulk_write(operations, **options)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+class BlockingCollection:
+    """Holds the first ``limit`` bulk writes (every one by default) until ``release`` is set"""
+
+    def __init__(self, collection, limit=None):
+        self._collection = collection
+        self.limit = limit
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def bulk_write(self, operations, **options):
+        if self.limit is None or self.limit > 0:
+            if self.limit is not None:
+                self.limit -= 1
+            self.started.set()
+            await self.release.wait()
+        return await self._collection.bulk_write(operations, **options)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+async def test_changes_are_merged_into_one_write(carts):
+    buffer = CartWriteBuffer(carts)
+    assert await buffer.apply("s", lambda cart: cart.replace({"a": 1, "b": 2})) == 1
+    assert await buffer.apply("s", lambda cart: cart.add("a", 2)) == 2
+    assert await buffer.apply("s", lambda cart: cart.remove("b")) == 3
+    assert await stored(carts) is None
+
+    await buffer.flush()
+    cart = await stored(carts)
+    assert items(cart) == {"a": 3}
+    assert cart["version"] == 3
+
+
+async def test_deltas_apply_to_the_stored_cart(carts):
+    buffer = CartWriteBuffer(carts)
+    await buffer.apply("s", lambda cart: cart.replace({"a": 1, "b": 1, "c": 1}))
+    await buffer.flush()
+
+    await buffer.apply("s", lambda cart: cart.add("a", 1))
+    await buffer.apply("s", lambda cart: cart.set_quantity("b", 5))
+    await buffer.apply("s", lambda cart: cart.add("c", -1))
+    await buffer.apply("s", lambda cart: cart.add("d", 2))
+    await buffer.flush()
+
+    cart = await stored(carts)
+    assert items(cart) == {"a": 2, "b": 5, "d": 2}
+    assert cart["version"] == 5
+
+
+async def test_stale_version_is_a_conflict(carts):
+    buffer = CartWriteBuffer(carts)
+    await buffer.apply("s", lambda cart: cart.add("a", 1))
+    await buffer.flush()
+
+    with pytest.raises(CartVersionConflict) as conflict:
+        await buffer.apply("s", lambda cart: cart.add("a", 1), expected_version=0)
+    assert conflict.value.current == 1
+    assert await buffer.apply("s", lambda cart: cart.add("a", 1), expected_version=1) == 2
+
+
+@pytest.mark.parametrize("existing", [False, True])
+async def test_write_from_another_process_wins(carts, existing):
+    # Two workers accept edits of the same cart version before either is written
+    first, second = CartWriteBuffer(carts), CartWriteBuffer(carts)
+    if existing:
+        await first.apply("s", lambda cart: cart.replace({"a": 1}))
+        await first.flush()
+    base = (await stored(carts))["version"] if existing else 0
+
+    assert await first.apply("s", lambda cart: cart.add("b", 1), expected_version=base) == base + 1
+    assert await second.apply("s", lambda cart: cart.add("c", 1), expected_version=base) == base + 1
+    await first.flush()
+    await second.flush()
+
+    cart = await stored(carts)
+    assert items(cart) == ({"a": 1, "b": 1} if existing else {"b": 1})
+    assert second.conflicts == 1
+    # Both clients were told version base + 1; both have to reload
+    for buffer in (first, second):
+        with pytest.raises(CartVersionConflict):
+            await buffer.apply("s", lambda cart: cart.add("c", 1), expected_version=base + 1)
+    assert await second.apply("s", lambda cart: cart.add("c", 1), expected_version=cart["version"]) == base + 3
+
+
+async def test_changes_on_top_of_a_rejected_write_are_dropped(carts):
+    first = CartWriteBuffer(carts)
+    await first.apply("s", lambda cart: cart.add("a", 1))
+    await first.flush()
+
+    blocking = BlockingCollection(carts)
+    second = CartWriteBuffer(blocking)
+    await second.apply("s", lambda cart: cart.add("b", 1), expected_version=1)
+    flush = asyncio.create_task(second.flush())
+    await blocking.started.wait()
+    await second.apply("s", lambda cart: cart.add("c", 1), expected_version=2)
+
+    await first.apply("s", lambda cart: cart.add("a", 1), expected_version=1)
+    await first.flush()
+    blocking.release.set()
+    await flush
+    await second.flush()
+
+    cart = await stored(carts)
+    assert items(cart) == {"a": 2}
+    assert second.conflicts == 1
+    with pytest.raises(CartVersionConflict):
+        await second.apply("s", lambda cart: cart.add("c", 1), expected_version=3)
+
+
+async def test_failed_write_is_retried_with_later_changes(carts):
+    failing = FailingCollection(carts)
+    buffer = CartWriteBuffer(failing)
+    await buffer.apply("s", lambda cart: cart.replace({"a": 1}))
+    await buffer.flush()
+    assert await stored(carts) is None
+    assert await buffer.current_version("s") == 1
+
+    assert await buffer.apply("s", lambda cart: cart.add("b", 2), expected_version=1) == 2
+    await buffer.flush()
+
+    cart = await stored(carts)
+    assert items(cart) == {"a": 1, "b": 2}
+    assert cart["version"] == 2
+    assert buffer.conflicts == 0
+
+
+async def test_version_stays_current_while_a_write_is_in_flight(carts):
+    blocking = BlockingCollection(carts)
+    buffer = CartWriteBuffer(blocking)
+    await buffer.apply("s", lambda cart: cart.add("a", 1))
+    flush = asyncio.create_task(buffer.flush())
+    await blocking.started.wait()
+
+    assert await buffer.current_version("s") == 1
+    assert await buffer.apply("s", lambda cart: cart.add("a", 1), expected_version=1) == 2
+    blocking.release.set()
+    await flush
+    await buffer.flush()
+
+    cart = await stored(carts)
+    assert items(cart) == {"a": 2}
+    assert cart["version"] == 2
+
+
+async def test_flushing_a_session_waits_only_for_its_own_writes(carts):
+    blocking = BlockingCollection(carts, limit=1)
+    buffer = CartWriteBuffer(blocking)
+    await buffer.apply("a", lambda cart: cart.add("x", 1))
+    flush = asyncio.create_task(buffer.flush())
+    await blocking.started.wait()
+
+    await buffer.apply("b", lambda cart: cart.add("x", 1))
+    await asyncio.wait_for(buffer.flush_session("b"), 1)
+    await asyncio.wait_for(buffer.flush_session("c"), 1)
+    assert await stored(carts, "b") is not None
+
+    # The write of "a" already in flight is waited for
+    waiting = asyncio.create_task(buffer.flush_session("a"))
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    blocking.release.set()
+    await waiting
+    assert await stored(carts, "a") is not None
+    await flush
+
+
+async def test_read_waits_for_changes_buffered_by_another_process(carts):
+    first, second = CartWriteBuffer(carts, window=0.05), CartWriteBuffer(carts, window=0.05)
+    version = await first.apply("s", lambda cart: cart.add("a", 1))
+
+    assert await second.read("s", {"_id": 0}) is None
+    read = asyncio.create_task(second.read("s", {"_id": 0}, min_version=version))
+    await asyncio.sleep(0.02)
+    await first.flush()
+    assert items(await read) == {"a": 1}
+
+    with pytest.raises(CartVersionConflict) as conflict:
+        await second.read("s", {"_id": 0}, min_version=version + 1)
+    assert conflict.value.current == version
@@ -0,0 +1,120 @@
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from catalog import CatalogCache, CatalogIndex
+
+pytestmark = pytest.mark.anyio
+
+
+class Product(BaseModel):
+    id: str
+    name: str
+    price: int
+    category: str
+    shortDescription: str = ""
+    fullDescription: str = ""
+    icon: Optional[str] = None
+
+
+PRODUCTS = [
+    {"id": "a", "name": "shop", "price": 300, "category": "web"},
+    {"id": "b", "name": "Bot", "price": 100, "category": "bots"},
+    {"id": "c", "name": "landing", "price": 200, "category": "web"},
+    {"id": "d", "name": "Admin", "price": 200, "category": "web"},
+    {"id": "e", "name": "crm", "price": 500, "category": "apps"},
+]
+
+
+@pytest.fixture
+def index():
+    return CatalogIndex(tuple(Product(**product) for product in PRODUCTS))
+
+
+@pytest.fixture
+async def catalog():
+    cache = CatalogCache(None, Product)
+    cache.install(PRODUCTS)
+    return await cache.current()
+
+
+def ids(positions):
+    return [PRODUCTS[position]["id"] for position in positions]
+
+
+@pytest.mark.parametrize("min_price, max_price, expected", [
+    (None, None, {"a", "b", "c", "d", "e"}),
+    (200, 300, {"a", "c", "d"}),
+    (201, 499, {"a"}),
+    (None, 199, {"b"}),
+    (500, None, {"e"}),
+    (501, None, set()),
+    (300, 200, set()),
+])
+def test_price_range_bounds_are_inclusive(index, min_price, max_price, expected):
+    assert set(ids(index.price_range(min_price, max_price))) == expected
+
+
+def test_price_order_is_stable_for_equal_prices(index):
+    assert ids(index.price_range(200, 200)) == ["c", "d"]
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({}, ["a", "b", "c", "d", "e"]),
+    ({"category": "web"}, ["a", "c", "d"]),
+    ({"category": "web", "max_price": 250}, ["c", "d"]),
+    ({"category": "web", "min_price": 250, "max_price": 400}, ["a"]),
+    ({"category": "apps", "max_price": 400}, []),
+    ({"category": "unknown"}, []),
+    ({"matching": ["e", "c", "missing"]}, ["c", "e"]),
+    ({"matching": [], "category": "web"}, []),
+    ({"matching": ["a", "b", "c"], "category": "web", "min_price": 250}, ["a"]),
+])
+def test_filters_combine(index, filters, expected):
+    assert ids(index.select(**filters)) == expected
+
+
+@pytest.mark.parametrize("sort, expected", [
+    ("name", ["d", "b", "e", "c", "a"]),
+    ("price-asc", ["b", "c", "d", "a", "e"]),
+    ("price-desc", ["e", "a", "d", "c", "b"]),
+    (None, ["a", "b", "c", "d", "e"]),
+])
+def test_sort_orders(index, sort, expected):
+    assert ids(index.select(sort=sort)) == expected
+
+
+def test_filtered_results_keep_the_sort_order(index):
+    assert ids(index.select(category="web", sort="price-desc")) == ["a", "d", "c"]
+    assert ids(index.select(category="web", sort="name")) == ["d", "c", "a"]
+
+
+async def test_pages_cover_every_match_once(catalog):
+    seen, offset = [], 0
+    while offset is not None:
+        items, total, offset = catalog.query(offset=offset, limit=2, sort="price-asc", max_price=400)
+        assert total == 4
+        seen.extend(item["id"] for item in items)
+    assert seen == ["b", "c", "d", "a"]
+
+
+async def test_offset_past_the_end_is_an_empty_last_page(catalog):
+    assert catalog.query(offset=10, limit=2) == ([], 5, None)
+
+
+async def test_fields_always_include_the_id(catalog):
+    items, _, _ = catalog.query(fields=["price"], category="apps")
+    assert items == [{"id": "e", "price": 500}]
+
+
+async def test_reload_ignores_the_order_documents_come_back_in(db):
+    await db.products.insert_many([dict(product) for product in PRODUCTS])
+    cache = CatalogCache(db.products, Product)
+    assert await cache.refresh() == 1
+
+    # Rewriting a product moves it to the end of the natural order
+    await db.products.delete_one({"id": "a"})
+    await db.products.insert_one(dict(PRODUCTS[0]))
+    assert await cache.refresh() == 1
+    assert [product.id for product in (await cache.current()).products] == ["a", "b", "c", "d", "e"]
@@ -0,0 +1,123 @@
+import io
+import uuid
+from typing import List
+
+import pytest
+from pydantic import BaseModel, Field
+
+from catalog_import import CatalogImporter, ImportFormatError, import_catalog, iter_csv, iter_json, iter_ndjson
+from catalog_watch import CATALOG_VERSION_ID
+from indexes import PRODUCT_INDEXES, ensure_indexes
+
+pytestmark = pytest.mark.anyio
+
+
+class Product(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    price: int
+    features: List[str] = []
+
+
+def rows(*products):
+    return list(enumerate(products, 1))
+
+
+@pytest.fixture
+async def products(db):
+    await ensure_indexes(db, PRODUCT_INDEXES)
+    await db.products.insert_many([
+        {"id": "a", "name": "Landing", "price": 100, "features": ["one"]},
+        {"id": "b", "name": "Shop", "price": 200, "features": []},
+    ])
+    return db.products
+
+
+async def stored(products):
+    return {document["name"]: document async for document in products.find({}, {"_id": 0})}
+
+
+def test_json_is_read_one_element_at_a_time():
+    text = io.StringIO(' [ {"name": "a]"}, {"b": [1, {"c": "}"}]} ,\n{"d": 1} ] ')
+    assert [row for _, row in iter_json(text, read_size=3)] == [{"name": "a]"}, {"b": [1, {"c": "}"}]}, {"d": 1}]
+
+
+@pytest.mark.parametrize("feed", ['{"name": "a"}', '[{"name": "a"}, {"name":'])
+def test_unreadable_json_stops_the_feed(feed):
+    with pytest.raises(ImportFormatError):
+        list(iter_json(io.StringIO(feed), read_size=4))
+
+
+def test_csv_list_fields():
+    feed = io.StringIO('name,features,price\nA,"x| y",10\nB,"[""q""]",\n')
+    assert list(iter_csv(feed, ["features"])) == [
+        (2, {"name": "A", "features": ["x", "y"], "price": "10"}),
+        (3, {"name": "B", "features": ["q"]}),
+    ]
+
+
+def test_undecodable_ndjson_line_is_passed_on():
+    (_, first), (number, second) = iter_ndjson(io.StringIO('{"name": "a"}\n\n{oops\n'))
+    assert first == {"name": "a"}
+    assert number == 3 and isinstance(second, ValueError)
+
+
+async def test_only_changes_are_written(products):
+    report = await CatalogImporter(products, Product).run(rows(
+        {"name": "Landing", "price": 100, "features": ["one"]},
+        {"name": "Shop", "price": 250},
+        {"name": "Blog", "price": 300, "features": ["two"]},
+        {"name": "Broken"},
+        {"name": "Blog", "price": 350},
+    ))
+
+    assert (report.rows, report.inserted, report.updated, report.unchanged) == (5, 1, 1, 1)
+    assert (report.invalid, report.duplicates, report.failed) == (1, 1, 0)
+    assert report.errors[0].startswith("row 4: price")
+    catalog = await stored(products)
+    assert catalog["Shop"]["price"] == 250 and catalog["Shop"]["id"] == "b"
+    # The later row for the same name wins
+    assert catalog["Blog"]["price"] == 350
+
+
+async def test_dry_run_writes_nothing(products):
+    report = await CatalogImporter(products, Product, dry_run=True).run(rows(
+        {"name": "Shop", "price": 250}, {"name": "Blog", "price": 300},
+    ))
+    assert (report.inserted, report.updated) == (1, 1)
+    assert not report.changed
+    assert set(await stored(products)) == {"Landing", "Shop"}
+
+
+async def test_write_errors_name_the_failing_row(products):
+    # Matched by id, "c" takes a name another product already has; the
+    # unchanged row before it has no write operation
+    report = await CatalogImporter(products, Product, key="id").run(rows(
+        {"id": "a", "name": "Landing", "price": 100, "features": ["one"]},
+        {"id": "b", "name": "Shop", "price": 210},
+        {"id": "c", "name": "Landing", "price": 300},
+    ))
+    assert (report.updated, report.unchanged, report.failed) == (1, 1, 1)
+    assert len(report.errors) == 1 and report.errors[0].startswith("id 'c':")
+
+
+async def test_rows_before_a_format_error_are_applied(products):
+    feed = io.StringIO('[{"name": "Blog", "price": 300}, {"name": "Shop", "price": 260}, {"name":')
+    report = await CatalogImporter(products, Product, chunk_size=1).run(iter_json(feed, read_size=8))
+    assert report.stopped
+    assert (report.inserted, report.updated) == (1, 1)
+
+
+async def test_import_bumps_the_catalog_version(db, products):
+    await import_catalog(db, Product, rows({"name": "Landing", "price": 100, "features": ["one"]}))
+    assert await db.catalog_version.find_one({"_id": CATALOG_VERSION_ID}) is None
+
+    await import_catalog(db, Product, rows({"name": "Blog", "price": 300}))
+    assert (await db.catalog_version.find_one({"_id": CATALOG_VERSION_ID}))["version"] == 1
+
+
+async def test_name_index_is_replaced_by_a_unique_one(db):
+    await db.products.create_index("name", name="name")
+    await ensure_indexes(db, PRODUCT_INDEXES)
+    indexes = await db.products.index_information()
+    assert "name" not in indexes and indexes["name_unique"]["unique"]
@@ -0,0 +1,69 @@
+import pytest
+from pydantic import BaseModel
+
+from catalog import CatalogCache
+from catalog_watch import CatalogWatcher, bump_catalog_version
+
+pytestmark = pytest.mark.anyio
+
+
+class Product(BaseModel):
+    id: str
+    name: str
+    price: int = 100
+    category: str = "web"
+
+
+class Changes:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+
+
+@pytest.fixture
+async def cache(db):
+    await db.products.insert_one({"id": "a", "name": "Shop"})
+    cache = CatalogCache(db.products, Product, versions=db.catalog_version)
+    await cache.refresh()
+    return cache
+
+
+async def test_reload_records_the_catalog_version_it_read(db, cache):
+    assert cache.source_version == 0
+    await bump_catalog_version(db.catalog_version)
+    await cache.refresh()
+    assert cache.source_version == 1
+
+
+async def test_first_poll_reports_writes_since_the_catalog_was_loaded(db, cache):
+    await bump_catalog_version(db.catalog_version)
+    changes = Changes()
+    watcher = CatalogWatcher(db.products, db.catalog_version, changes, loaded_version=lambda: cache.source_version)
+
+    await watcher.poll_once()
+    assert changes.count == 1
+    await watcher.poll_once()
+    assert changes.count == 1
+    await bump_catalog_version(db.catalog_version)
+    await watcher.poll_once()
+    assert changes.count == 2
+
+
+async def test_first_poll_is_quiet_when_the_catalog_is_current(db, cache):
+    changes = Changes()
+    watcher = CatalogWatcher(db.products, db.catalog_version, changes, loaded_version=lambda: cache.source_version)
+    await watcher.poll_once()
+    assert changes.count == 0
+
+
+async def test_without_a_loaded_version_the_first_poll_is_the_baseline(db):
+    await bump_catalog_version(db.catalog_version)
+    changes = Changes()
+    watcher = CatalogWatcher(db.products, db.catalog_version, changes)
+    await watcher.poll_once()
+    assert changes.count == 0
+    await bump_catalog_version(db.catalog_version)
+    await watcher.poll_once()
+    assert changes.count == 1
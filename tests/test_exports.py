@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from exports import CURSOR_FIELD, ExportSpec, InvalidExportCursor, export_batches, stream_export
+
+pytestmark = pytest.mark.anyio
+
+PRODUCTS = ExportSpec("products", ("id", "name", "features"))
+CARTS = ExportSpec("carts", ("id", "items", "updated_at"), order=("updated_at", "_id"))
+START = datetime(2026, 1, 1)
+
+
+async def rows(collection, spec, **options):
+    return [row async for batch in export_batches(collection, spec, **options) for row in batch]
+
+
+async def resumed(collection, spec, stop_after):
+    """Rows of an export interrupted after every ``stop_after`` rows and resumed from the last cursor"""
+    exported, cursor = [], None
+    while True:
+        batch = (await rows(collection, spec, batch_size=2, cursor=cursor))[:stop_after]
+        if not batch:
+            return exported
+        exported.extend(batch)
+        cursor = batch[-1][CURSOR_FIELD]
+
+
+@pytest.fixture
+async def products(db):
+    await db.products.insert_many([{"id": str(n), "name": f"p{n}", "features": ["a", "b"]} for n in range(7)])
+    return db.products
+
+
+@pytest.fixture
+async def carts(db):
+    # Several carts share each updated_at, so resuming relies on the _id tie-break
+    await db.carts.insert_many([
+        {"_id": ObjectId(), "id": str(n), "items": [], "updated_at": START + timedelta(seconds=n // 3)}
+        for n in range(8)
+    ])
+    # Inserted last but updated first
+    await db.carts.insert_one({"id": "old", "items": [], "updated_at": START - timedelta(days=1)})
+    return db.carts
+
+
+@pytest.mark.parametrize("stop_after", [1, 2, 3])
+async def test_resumed_product_export_has_no_gaps_or_duplicates(products, stop_after):
+    full = await rows(products, PRODUCTS)
+    assert [row["id"] for row in full] == [str(n) for n in range(7)]
+    assert await resumed(products, PRODUCTS, stop_after) == full
+
+
+@pytest.mark.parametrize("stop_after", [1, 2, 4])
+async def test_resumed_cart_export_has_no_gaps_or_duplicates(carts, stop_after):
+    full = await rows(carts, CARTS)
+    assert [row["id"] for row in full] == ["old", *map(str, range(8))]
+    assert await resumed(carts, CARTS, stop_after) == full
+
+
+async def test_since_exports_only_later_changes(carts):
+    exported = await rows(carts, CARTS, since=START + timedelta(seconds=2))
+    assert [row["id"] for row in exported] == ["6", "7"]
+
+
+async def test_batches_hold_at_most_batch_size_rows(products):
+    sizes = [len(batch) async for batch in export_batches(products, PRODUCTS, batch_size=3)]
+    assert sizes == [3, 3, 1]
+
+
+@pytest.mark.parametrize("spec, cursor", [
+    (CARTS, "not-a-cursor"),
+    (CARTS, "2026-13-01T00:00:00_abc"),
+])
+def test_malformed_cursors_are_rejected(spec, cursor):
+    with pytest.raises(InvalidExportCursor):
+        spec.resume_filter(cursor)
+
+
+def test_object_ids_resume_as_object_ids():
+    object_id = ObjectId()
+    assert PRODUCTS.resume_filter(str(object_id)) == {"_id": {"$gt": object_id}}
+    # Any other string is an id of its own
+    assert PRODUCTS.resume_filter("twelve chars") == {"_id": {"$gt": "twelve chars"}}
+
+
+async def test_ndjson_and_csv_rows(products):
+    async def body(format):
+        batches = export_batches(products, PRODUCTS, batch_size=3)
+        return b"".join([chunk async for chunk in stream_export(batches, PRODUCTS, format)]).decode()
+
+    lines = (await body("ndjson")).splitlines()
+    assert len(lines) == 7
+    first = json.loads(lines[0])
+    assert (first["id"], first["features"], first[CURSOR_FIELD]) == ("0", ["a", "b"], first["_id"])
+
+    csv_lines = (await body("csv")).splitlines()
+    assert csv_lines[0] == "_id,id,name,features,_cursor"
+    assert csv_lines[1].split(",")[1:4] == ["0", "p0", "a|b"]
+    assert len(csv_lines) == 8
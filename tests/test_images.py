@@ -0,0 +1,77 @@
+import asyncio
+import io
+
+import pytest
+
+from images import DiskCache, ImageProxy
+
+
+@pytest.fixture
+def png():
+    Image = pytest.importorskip("PIL.Image")
+    output = io.BytesIO()
+    Image.new("RGB", (64, 32), "red").save(output, "PNG")
+    return output.getvalue()
+
+
+class BlockingSource:
+    """Serves one image; holds each fetch until ``release`` is set"""
+
+    def __init__(self, data):
+        self.data = data
+        self.fetches = 0
+        self.release = asyncio.Event()
+
+    async def fetch(self, url):
+        self.fetches += 1
+        await self.release.wait()
+        return self.data
+
+    async def close(self):
+        pass
+
+
+def test_eviction_drops_the_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1234", b"1234")
+    assert cache.size == 8
+
+
+def test_rescan_counts_files_of_other_workers(tmp_path):
+    first = DiskCache(tmp_path, max_bytes=10, rescan_interval=0)
+    second = DiskCache(tmp_path, max_bytes=10, rescan_interval=0)
+    first.put("a", b"1234")
+    second.put("b", b"1234")
+    first.put("c", b"1234")
+
+    assert not (tmp_path / "a").exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["b", "c"]
+    assert first.size == 8
+
+
+@pytest.mark.anyio
+async def test_waiting_request_takes_over_from_a_cancelled_render(tmp_path, png):
+    source = BlockingSource(png)
+    proxy = ImageProxy(DiskCache(tmp_path, max_bytes=1 << 20), source, workers=1)
+    try:
+        leader = asyncio.create_task(proxy.variant("https://cdn/a.png", 160, "jpg"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(proxy.variant("https://cdn/a.png", 160, "jpg")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        source.release.set()
+        variants = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert len({variant.etag for variant in variants}) == 1
+        assert (source.fetches, proxy.renders) == (2, 1)
+    finally:
+        await proxy.stop()
@@ -0,0 +1,53 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+from indexes import INDEX_OPTIONS_CONFLICT, PRODUCT_INDEXES, ensure_indexes
+
+pytestmark = pytest.mark.anyio
+
+
+class OneIndexPerKeys:
+    """Rejects a second index on the same keys, as MongoDB does and mongomock doesn't"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def create_index(self, keys, **options):
+        for name, info in (await self._collection.index_information()).items():
+            if list(info["key"]) == list(keys) and name != options.get("name"):
+                raise OperationFailure(f"Index already exists with a different name: {name}", INDEX_OPTIONS_CONFLICT)
+        return await self._collection.create_index(keys, **options)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+class Database:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return OneIndexPerKeys(self._db[name])
+
+
+@pytest.fixture(params=["mongomock", "one index per keys"])
+def target(request, db):
+    return db if request.param == "mongomock" else Database(db)
+
+
+async def test_replaced_index_is_dropped_once_the_new_one_exists(db, target):
+    await db.products.create_index("name", name="name")
+    assert await ensure_indexes(target, PRODUCT_INDEXES) == []
+
+    indexes = await db.products.index_information()
+    assert "name" not in indexes and indexes["name_unique"]["unique"]
+
+
+async def test_replaced_index_is_kept_when_the_new_one_cannot_be_built(db, target):
+    await db.products.insert_many([{"id": "a", "name": "Shop"}, {"id": "b", "name": "Shop"}])
+    await db.products.create_index("name", name="name")
+
+    assert await ensure_indexes(target, PRODUCT_INDEXES) == ["products.name_unique"]
+    indexes = await db.products.index_information()
+    assert "name_unique" not in indexes
+    assert indexes["name"]["key"] == [("name", 1)]
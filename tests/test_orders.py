@@ -0,0 +1,185 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from indexes import ORDER_INDEXES, ensure_indexes
+from orders import (
+    AWAITING_PAYMENT,
+    CANCELLED,
+    EXPIRED,
+    PAID,
+    IdempotencyConflict,
+    OrderExpiry,
+    apply_transitions,
+    create_order,
+    find_by_idempotency_key,
+    new_order,
+    request_fingerprint,
+)
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+async def orders(db):
+    await ensure_indexes(db, ORDER_INDEXES)
+    return db.orders
+
+
+def order(session_id="s", key=None, ttl=timedelta(minutes=30)):
+    fingerprint = request_fingerprint({"session_id": session_id}) if key else None
+    return new_order(session_id, [], 1000, "bank", "https://qr", 1, ttl, idempotency_key=key, fingerprint=fingerprint)
+
+
+async def status(orders, order_id):
+    return (await orders.find_one({"id": order_id}))["status"]
+
+
+@pytest.mark.anyio
+async def test_retry_replays_the_stored_order(orders):
+    created, replayed = await create_order(orders, order(key="k"))
+    assert not replayed
+    assert "request_fingerprint" not in created
+
+    retry = order(key="k")
+    assert (await find_by_idempotency_key(orders, "k", retry["request_fingerprint"]))["id"] == created["id"]
+    stored, replayed = await create_order(orders, retry)
+    assert replayed and stored["id"] == created["id"]
+    assert "request_fingerprint" not in stored
+    assert await orders.count_documents({}) == 1
+
+
+@pytest.mark.anyio
+async def test_key_reused_for_another_request_is_a_conflict(orders):
+    await create_order(orders, order(key="k"))
+    with pytest.raises(IdempotencyConflict):
+        await find_by_idempotency_key(orders, "k", order(session_id="other", key="k")["request_fingerprint"])
+    with pytest.raises(IdempotencyConflict):
+        await create_order(orders, order(session_id="other", key="k"))
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_with_one_key_create_one_order(orders):
+    results = await asyncio.gather(*(create_order(orders, order(key="k")) for _ in range(5)))
+    assert len({stored["id"] for stored, _ in results}) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+    assert await orders.count_documents({}) == 1
+
+
+@pytest.mark.anyio
+async def test_orders_without_a_key_are_independent(orders):
+    await create_order(orders, order())
+    await create_order(orders, order())
+    assert await orders.count_documents({}) == 2
+
+
+@pytest.mark.anyio
+async def test_transitions_follow_the_allowed_statuses(orders):
+    first, _ = await create_order(orders, order())
+    second, _ = await create_order(orders, order())
+
+    applied = await apply_transitions(orders, [(first["id"], PAID), (second["id"], CANCELLED), ("missing", PAID)])
+    assert applied == 2
+    # A paid order cannot be cancelled or expired
+    assert await apply_transitions(orders, [(first["id"], CANCELLED), (first["id"], EXPIRED)]) == 0
+    assert await status(orders, first["id"]) == PAID
+
+    stored = await orders.find_one({"id": second["id"]})
+    assert [entry["status"] for entry in stored["status_history"]] == [AWAITING_PAYMENT, CANCELLED]
+
+
+@pytest.mark.anyio
+async def test_expiry_works_through_due_orders_in_batches(orders):
+    due = [(await create_order(orders, order(ttl=timedelta(seconds=-1))))[0] for _ in range(5)]
+    fresh, _ = await create_order(orders, order())
+
+    expiry = OrderExpiry(orders, batch_size=2, pause=0)
+    report = await expiry.run_once()
+    assert (report.expired, report.batches) == (5, 3)
+    assert {await status(orders, item["id"]) for item in due} == {EXPIRED}
+    assert await status(orders, fresh["id"]) == AWAITING_PAYMENT
+
+    # A payment that arrives late is still recorded
+    assert await apply_transitions(orders, [(due[0]["id"], PAID)]) == 1
+    assert (await expiry.run_once()).expired == 0
+
+
+@pytest.fixture(scope="module")
+def api():
+    import database
+    from fastapi.testclient import TestClient
+
+    # server reads its settings and creates its client at import
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in (
+            ("MONGO_URL", "mongodb://localhost:27017"),
+            ("DB_NAME", "test"),
+            ("ADMIN_TOKEN", ADMIN_TOKEN),
+            ("MONGO_MIN_POOL_SIZE", "0"),
+            ("CATALOG_WATCH", "off"),
+        ):
+            patch.setenv(name, value)
+        patch.setattr(database, "AsyncIOMotorClient", AsyncMongoMockClient)
+        import server
+
+        with TestClient(server.app) as client:
+            yield client
+
+
+@pytest.fixture
+def product(api):
+    import seed_data
+
+    tiers = seed_data.qr_table()
+    bank = next(iter(seed_data.banks()))
+    products = api.get("/api/products").json()
+    product = next(item for item in products if tiers.is_tier(item["price"]) and tiers.get(bank, item["price"]))
+    return bank, product
+
+
+def test_api_replays_retries_and_rejects_reused_keys(api, product):
+    bank, product = product
+    body = {"session_id": "api", "bank": bank, "items": [{"product_id": product["id"], "quantity": 1}]}
+
+    created = api.post("/api/orders", json=body, headers={"Idempotency-Key": "api-1"})
+    assert created.status_code == 201
+    assert created.json()["total"] == product["price"]
+
+    retry = api.post("/api/orders", json=body, headers={"Idempotency-Key": "api-1"})
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json()["id"] == created.json()["id"]
+
+    reused = api.post("/api/orders", json={**body, "session_id": "other"}, headers={"Idempotency-Key": "api-1"})
+    assert reused.status_code == 422
+
+
+def test_api_reports_paid_orders_to_waiting_clients(api, product):
+    bank, product = product
+    body = {"session_id": "api", "bank": bank, "items": [{"product_id": product["id"], "quantity": 1}]}
+    order_id = api.post("/api/orders", json=body).json()["id"]
+    assert api.get(f"/api/orders/{order_id}").json()["status"] == AWAITING_PAYMENT
+
+    changes = {"changes": [{"order_id": order_id, "status": "paid"}, {"order_id": "missing", "status": "paid"}]}
+    assert api.post("/api/admin/orders/status", json=changes).status_code == 403
+    update = api.post("/api/admin/orders/status", json=changes, headers={"Authorization": f"Bearer {ADMIN_TOKEN}"})
+    assert update.json() == {"requested": 2, "applied": 1, "skipped": 1}
+    assert api.get(f"/api/orders/{order_id}?wait=5").json()["status"] == PAID
+
+
+def test_api_orders_the_cart_version_the_client_saw(api, product):
+    bank, product = product
+    change = api.post("/api/cart/cart-order/items", json={"product_id": product["id"], "quantity": 1})
+    version = change.json()["version"]
+    body = {"session_id": "cart-order", "bank": bank}
+
+    assert api.post("/api/orders", json=body).status_code == 422
+    assert api.post("/api/orders", json={**body, "cart_version": version + 1}).status_code == 409
+    created = api.post("/api/orders", json={**body, "cart_version": version})
+    assert created.status_code == 201
+    assert created.json()["total"] == product["price"]
+
+    api.post("/api/cart/cart-order/items", json={"product_id": product["id"], "quantity": 1})
+    assert api.post("/api/orders", json={**body, "cart_version": version}).status_code == 409
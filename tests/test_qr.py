@@ -0,0 +1,77 @@
+import pytest
+
+import seed_data
+from qr import QRTable
+
+CODES = {
+    "sber": {500: "https://qr/sber/500", 1500: "https://qr/sber/1500"},
+    "tinkoff": {1500: "https://qr/tinkoff/1500", 3000: "https://qr/tinkoff/3000"},
+}
+
+
+@pytest.fixture
+def table():
+    # "alfa" is a known bank without any QR links
+    return QRTable(CODES, banks=("alfa", "sber"))
+
+
+def test_lookup_of_every_stored_link(table):
+    for bank, amounts in CODES.items():
+        for amount, url in amounts.items():
+            assert table.get(bank, amount) == url
+
+
+@pytest.mark.parametrize("bank, amount", [
+    ("unknown", 1500),
+    ("alfa", 1500),
+    ("sber", 3000),  # a tier, but not for this bank
+    ("sber", 1000),  # a multiple of the step, but not a tier
+    ("sber", 1499),
+    ("sber", 0),
+    ("sber", -500),
+    ("sber", 10 ** 9),
+])
+def test_missing_links_are_none(table, bank, amount):
+    assert table.get(bank, amount) is None
+
+
+def test_tiers_are_the_amounts_of_any_bank(table):
+    assert table.tiers == (500, 1500, 3000)
+    assert table.banks == ("alfa", "sber", "tinkoff")
+    assert [amount for amount in (0, 500, 1000, 1500, 2999, 3000, 3500) if table.is_tier(amount)] == [500, 1500, 3000]
+
+
+@pytest.mark.parametrize("amount, expected", [
+    (1500, (1500, 1500)),
+    (1000, (500, 1500)),
+    (1, (None, 500)),
+    (-100, (None, 500)),
+    (3001, (3000, None)),
+    (500, (500, 500)),
+])
+def test_nearest_tiers(table, amount, expected):
+    assert table.nearest_tiers(amount) == expected
+
+
+def test_for_amount_lists_every_bank(table):
+    assert table.for_amount(1500) == {"alfa": None, "sber": "https://qr/sber/1500", "tinkoff": "https://qr/tinkoff/1500"}
+    assert table.for_amount(1000) == {"alfa": None, "sber": None, "tinkoff": None}
+
+
+@pytest.mark.parametrize("amount", [0, -500, 750])
+def test_tiers_must_be_positive_multiples_of_the_step(amount):
+    with pytest.raises(ValueError):
+        QRTable({"sber": {amount: "https://qr"}})
+
+
+def test_empty_table():
+    table = QRTable({}, banks=("sber",))
+    assert table.get("sber", 500) is None
+    assert table.nearest_tiers(500) == (None, None)
+
+
+def test_seed_table_matches_the_seed_links():
+    table = seed_data.qr_table()
+    for bank, amounts in seed_data.qr_codes().items():
+        for amount, url in amounts.items():
+            assert table.get(bank, amount) == url
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from fnmatch import fnmatchcase
+
+import pytest
+from starlette.responses import Response
+
+from response_cache import MemoryBackend, RedisBackend, ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio client calls RedisBackend makes"""
+
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def set(self, key, value, px):
+        self.entries[key] = (value, time.monotonic() + px / 1000)
+
+    async def scan_iter(self, match, count):
+        for key in [key for key in self.entries if fnmatchcase(key, match)]:
+            yield key
+
+    async def delete(self, *keys):
+        return sum(self.entries.pop(key, None) is not None for key in keys)
+
+
+class UnreachableRedis:
+    async def get(self, key):
+        raise ConnectionError("Connection refused")
+
+    set = delete = get
+
+    async def scan_iter(self, match, count):
+        raise ConnectionError("Connection refused")
+        yield
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    return ResponseCache(MemoryBackend() if request.param == "memory" else RedisBackend(FakeRedis()))
+
+
+class Handler:
+    """Counts computations; ``release`` holds them until set"""
+
+    def __init__(self, body=b"{}", status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return Response(self.body, status_code=self.status_code, media_type="application/json")
+
+
+async def test_concurrent_misses_compute_once(cache):
+    handler = Handler(b'{"n": 1}')
+    handler.release.clear()
+    requests = [asyncio.create_task(cache.get_or_compute("k", 60, handler)) for _ in range(10)]
+    await asyncio.sleep(0)
+    handler.release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert handler.calls == 1
+    assert {response.body for response in responses} == {b'{"n": 1}'}
+    assert (cache.misses, cache.hits) == (1, 9)
+
+
+async def test_entries_are_served_until_they_expire(cache):
+    handler = Handler()
+    await cache.get_or_compute("k", 0.05, handler)
+    await cache.get_or_compute("k", 0.05, handler)
+    assert handler.calls == 1
+
+    await asyncio.sleep(0.06)
+    await cache.get_or_compute("k", 0.05, handler)
+    assert handler.calls == 2
+
+
+async def test_error_responses_are_not_cached(cache):
+    handler = Handler(status_code=404)
+    await cache.get_or_compute("k", 60, handler)
+    await cache.get_or_compute("k", 60, handler)
+    assert handler.calls == 2
+
+
+async def test_invalidate_drops_keys_by_prefix(cache):
+    handlers = {key: Handler() for key in ("cart:a:0", "cart:a:1", "cart:ab:0", "products:1")}
+    for key, handler in handlers.items():
+        await cache.get_or_compute(key, 60, handler)
+
+    assert await cache.invalidate("cart:a:") == 2
+    for key, handler in handlers.items():
+        await cache.get_or_compute(key, 60, handler)
+    assert {key: handler.calls for key, handler in handlers.items()} == {
+        "cart:a:0": 2, "cart:a:1": 2, "cart:ab:0": 1, "products:1": 1,
+    }
+
+
+async def test_waiting_request_takes_over_from_a_cancelled_one(cache):
+    first, second = Handler(b"first"), Handler(b"second")
+    first.release.clear()
+    leader = asyncio.create_task(cache.get_or_compute("k", 60, first))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(cache.get_or_compute("k", 60, second)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    responses = await asyncio.gather(*followers)
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert second.calls == 1
+    assert {response.body for response in responses} == {b"second"}
+
+
+async def test_invalidation_during_a_computation_discards_its_result(cache):
+    version = {"n": 1}
+    handler = Handler()
+    handler.release.clear()
+
+    async def read():
+        body = f'{{"version": {version["n"]}}}'.encode()
+        await handler()
+        return Response(body, media_type="application/json")
+
+    leader = asyncio.create_task(cache.get_or_compute("cart:s:0", 60, read))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.get_or_compute("cart:s:0", 60, read))
+    await asyncio.sleep(0)
+
+    version["n"] = 2
+    await cache.invalidate("cart:s:")
+    handler.release.set()
+    await leader
+    assert (await follower).body == b'{"version": 2}'
+    assert (await cache.get_or_compute("cart:s:0", 60, read)).body == b'{"version": 2}'
+    assert handler.calls == 2
+
+
+async def test_handler_errors_reach_waiting_requests(cache):
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(cache.get_or_compute("k", 60, failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_unreachable_backend_falls_back_to_the_handler():
+    cache = ResponseCache(RedisBackend(UnreachableRedis()))
+    handler = Handler(b"fresh")
+
+    response = await cache.get_or_compute("k", 60, handler)
+    assert response.body == b"fresh"
+    assert await cache.invalidate("k") == 0
+    # Read and write of the miss, then the invalidation
+    assert cache.errors == 3
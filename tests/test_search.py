@@ -0,0 +1,91 @@
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from catalog import CatalogCache
+from search import SearchIndex, tokenize
+
+
+class Product(BaseModel):
+    id: str
+    name: str
+    shortDescription: str = ""
+    fullDescription: str = ""
+    price: int = 100
+    category: str = "web"
+    icon: Optional[str] = None
+
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def index(**documents):
+    search = SearchIndex()
+    for doc_id, name in documents.items():
+        search.add(doc_id, {"name": name})
+    return search
+
+
+def test_tokens_are_casefolded_words():
+    assert tokenize("Лендинг для ЁЛКИ, e-shop!") == ["лендинг", "для", "елки", "e", "shop"]
+
+
+def test_word_forms_match_through_the_stem():
+    search = index(shop="Интернет-магазины под ключ", landing="Landing pages")
+    assert ids(search.search("магазин")) == ["shop"]
+    assert ids(search.search("магазинов")) == ["shop"]
+    # Not the last word, so not matched as a prefix
+    assert ids(search.search("page landing")) == ["landing"]
+
+
+def test_last_word_matches_as_a_prefix():
+    search = index(shop="Интернет-магазин", bot="Телеграм-бот", portal="Интернет-портал")
+    assert sorted(ids(search.search("интер"))) == ["portal", "shop"]
+    assert ids(search.search("интернет маг")) == ["shop"]
+    # Only the last word is a prefix
+    assert ids(search.search("интер магазин")) == []
+
+
+def test_name_matches_rank_above_description_matches():
+    search = SearchIndex()
+    search.add("described", {"name": "Сайт", "fullDescription": "Бот для магазина"})
+    search.add("named", {"name": "Бот"})
+    assert ids(search.search("бот")) == ["named", "described"]
+
+
+def test_updated_documents_are_reindexed():
+    search = index(a="Лендинг", b="Лендинг и бот")
+    search.add("a", {"name": "Чат-бот"})
+    assert sorted(ids(search.search("бот"))) == ["a", "b"]
+    assert ids(search.search("лендинг")) == ["b"]
+
+    search.remove("b")
+    assert "b" not in search and len(search) == 1
+    assert ids(search.search("лен")) == []
+    search.add("b", {"name": "Лендинг"})
+    assert ids(search.search("лен")) == ["b"]
+
+
+def test_copy_is_independent():
+    search = index(a="Лендинг")
+    clone = search.copy()
+    clone.add("b", {"name": "Лендинг"})
+    clone.remove("a")
+    assert ids(search.search("лен")) == ["a"]
+    assert ids(clone.search("лен")) == ["b"]
+
+
+@pytest.mark.anyio
+async def test_older_snapshots_keep_their_search_results():
+    cache = CatalogCache(None, Product)
+    cache.install([{"id": "a", "name": "Лендинг"}])
+    old = await cache.current()
+    cache.install([{"id": "a", "name": "Чат-бот"}, {"id": "b", "name": "Лендинг"}])
+    new = await cache.current()
+
+    assert old.search.matches("лендинг") == {"a"}
+    assert old.search.matches("бот") == set()
+    assert new.search.matches("лендинг") == {"b"}
+    assert new.search.matches("бот") == {"a"}
@@ -0,0 +1,67 @@
+import gzip
+import os
+
+import pytest
+from starlette.requests import Request
+
+from static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, StaticAssetIndex
+
+
+def request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def headers(response):
+    return {name.decode(): value.decode() for name, value in response.raw_headers}
+
+
+@pytest.fixture
+def build(tmp_path):
+    (tmp_path / "static").mkdir()
+    (tmp_path / "index.html").write_bytes(b"<html>shell</html>")
+    bundle = b"console.log(1);" * 100000
+    (tmp_path / "static" / "main.js").write_bytes(bundle)
+    (tmp_path / "static" / "main.js.gz").write_bytes(gzip.compress(bundle))
+    return tmp_path
+
+
+def test_files_are_served_with_their_variants(build):
+    index = StaticAssetIndex(build)
+    assert len(index) == 2 and "static/main.js.gz" not in index
+
+    asset = index.get("static/main.js")
+    plain = asset.response(request())
+    compressed = asset.response(request(accept_encoding="gzip, br"))
+    assert plain.body == (build / "static" / "main.js").read_bytes()
+    assert gzip.decompress(compressed.body) == plain.body
+    assert headers(compressed)["content-encoding"] == "gzip"
+    assert headers(plain)["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert headers(index.get("index.html").response(request()))["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+    etag = headers(plain)["etag"]
+    assert asset.response(request(if_none_match=etag)).status_code == 304
+
+
+def test_rescan_reloads_changed_files_only(build):
+    index = StaticAssetIndex(build)
+    shell, bundle = index.get("index.html"), index.get("static/main.js")
+
+    # Truncated and rewritten in place, as a copy over the old build does
+    with open(build / "static" / "main.js", "r+b") as f:
+        f.truncate(0)
+        f.write(b"console.log(2);")
+    os.utime(build / "static" / "main.js", ns=(0, 0))
+
+    assert index.scan() == 1
+    assert index.get("index.html") is shell
+    assert index.get("static/main.js").response(request()).body == b"console.log(2);"
+    # Responses built from the previous asset stay intact
+    assert len(bundle.response(request()).body) == len(b"console.log(1);") * 100000
+
+
+def test_removed_files_are_dropped(build):
+    index = StaticAssetIndex(build)
+    (build / "index.html").unlink()
+    index.scan()
+    assert "index.html" not in index